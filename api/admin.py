@@ -8,13 +8,13 @@ class UserModelAdmin(admin.ModelAdmin):
     list_display = ('id', 'username', 'email', 'created_date', 'total_posts', 'total_followers', 'total_following')
     list_display_links = ('id', 'username')
     search_fields = ('username', 'email')
-    list_filter = ('username',)
+    list_filter = ('username', 'is_staff')
     ordering = ('-id',)
     readonly_fields = ('id', 'password', 'created_date', 'total_posts', 'total_followers', 'total_following')
     
     fieldsets = (
         ('User Information', {
-            'fields': ('id', 'username', 'email', 'profile_info')
+            'fields': ('id', 'username', 'email', 'profile_info', 'is_staff')
         }),
         ('Statistics', {
             'fields': ('total_posts', 'total_followers', 'total_following', 'created_date')
@@ -31,18 +31,18 @@ class UserModelAdmin(admin.ModelAdmin):
     created_date.short_description = 'Registration Info'
     
     def total_posts(self, obj):
-        """Count total posts by user"""
-        return obj.posts.count()
+        """Total posts by user (denormalized counter)"""
+        return obj.posts_count
     total_posts.short_description = 'Total Posts'
     
     def total_followers(self, obj):
-        """Count total followers"""
-        return obj.followers.count()
+        """Total followers (denormalized counter)"""
+        return obj.followers_count
     total_followers.short_description = 'Followers'
     
     def total_following(self, obj):
-        """Count total following"""
-        return obj.following.count()
+        """Total following (denormalized counter)"""
+        return obj.following_count
     total_following.short_description = 'Following'
     
     # Custom action to create new user
@@ -1,6 +1,6 @@
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from .jwt_provider import get_user_from_token
+from .jwt_provider import verify_access_token, get_user_from_payload
 
 
 class JWTAuthentication(BaseAuthentication):
@@ -35,13 +35,20 @@ class JWTAuthentication(BaseAuthentication):
     def authenticate_credentials(self, token):
         """
         Validate the token and return the user.
+
+        The token is decoded exactly once; its claims become ``request.auth``
+        so views can read them without decoding again.
         """
-        user = get_user_from_token(token)
+        payload = verify_access_token(token)
+        if payload is None:
+            raise AuthenticationFailed('Invalid or expired token')
+
+        user = get_user_from_payload(payload)
         
         if not user:
             raise AuthenticationFailed('Invalid or expired token')
         
-        return (user, None)
+        return (user, payload)
     
     def authenticate_header(self, request):
         """
@@ -0,0 +1,214 @@
+"""Two-tier cache: a per-process LRU/TTL dict in front of ``django.core.cache``.
+
+Reads try the local tier first and only go to Redis for keys it does not
+hold; keys Redis does not have are remembered locally as misses for
+``NEGATIVE_TTL`` seconds, which makes "is this token blacklisted?" checks
+(almost always "no") free after the first request.
+
+Writes and deletes go to Redis and publish the key on a pub/sub channel. Every
+process runs a daemon thread subscribed to that channel that evicts the key
+from its local tier, so a logout or a ban is visible in all workers within
+milliseconds. The local TTLs bound staleness should a message ever be lost.
+
+Configured through the ``HOT_CACHE`` setting::
+
+    HOT_CACHE = {
+        'MAX_ENTRIES': 10000,   # per process
+        'LOCAL_TTL': 30,        # seconds a positive entry is trusted locally
+        'NEGATIVE_TTL': 5,      # seconds a miss is trusted locally
+        'PUBSUB': True,         # cross-worker invalidation (Redis backends only)
+    }
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+
+from .profiling import span
+
+logger = logging.getLogger("api")
+
+INVALIDATION_CHANNEL = 'hot-cache:invalidate'
+
+_MISSING = object()
+_NEGATIVE = object()
+
+
+class LocalLRUCache:
+    """Thread-safe bounded mapping whose entries expire after a TTL."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    def __init__(self, max_entries=10000, local_ttl=30, negative_ttl=5, pubsub=True):
+        self.local = LocalLRUCache(max_entries)
+        self.local_ttl = local_ttl
+        self.negative_ttl = negative_ttl
+        self.pubsub = pubsub
+        self._listener_pid = None
+        self._lock = threading.Lock()
+        self._stats = {'local_hits': 0, 'remote_hits': 0, 'misses': 0}
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        """Return ``{key: value}`` for the keys found in either tier."""
+        found = {}
+        remote_keys = []
+        local_hits = 0
+        for key in keys:
+            value = self.local.get(key)
+            if value is _MISSING:
+                remote_keys.append(key)
+                continue
+            local_hits += 1
+            if value is not _NEGATIVE:
+                found[key] = value
+
+        remote_hits = 0
+        if remote_keys:
+            self._ensure_listener()
+            with span('cache'):
+                remote = shared_cache.get_many(remote_keys)
+            for key in remote_keys:
+                if key in remote:
+                    remote_hits += 1
+                    found[key] = remote[key]
+                    self.local.set(key, remote[key], self.local_ttl)
+                else:
+                    self.local.set(key, _NEGATIVE, self.negative_ttl)
+
+        with self._lock:
+            self._stats['local_hits'] += local_hits
+            self._stats['remote_hits'] += remote_hits
+            self._stats['misses'] += len(remote_keys) - remote_hits
+        return found
+
+    def set(self, key, value, timeout):
+        with span('cache'):
+            shared_cache.set(key, value, timeout)
+        ttl = self.local_ttl if timeout is None else min(self.local_ttl, timeout)
+        self.local.set(key, value, ttl)
+        self._publish(key)
+
+    def delete(self, key):
+        with span('cache'):
+            shared_cache.delete(key)
+        self.local.delete(key)
+        self._publish(key)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['local_entries'] = len(self.local)
+        return stats
+
+    # ----- cross-worker invalidation -----
+
+    def _redis(self):
+        if not self.pubsub:
+            return None
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection("default")
+        except (ImportError, NotImplementedError):
+            # not a django_redis backend: local TTLs are the only bound
+            self.pubsub = False
+            return None
+
+    def _publish(self, key):
+        redis = self._redis()
+        if redis is None:
+            return
+        try:
+            redis.publish(INVALIDATION_CHANNEL, f"{self._origin()}|{key}")
+        except Exception as e:
+            logger.warning(f"Hot cache invalidation publish failed: {e}")
+
+    def _origin(self):
+        # lets a listener skip the invalidations its own process published
+        return f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+
+    def _ensure_listener(self):
+        # one listener per process; forked workers start their own
+        pid = os.getpid()
+        if self._listener_pid == pid or not self.pubsub:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+        self.local.clear()
+        threading.Thread(target=self._listen, name='hot-cache-invalidation', daemon=True).start()
+
+    def _listen(self):
+        while True:
+            redis = self._redis()
+            if redis is None:
+                return
+            try:
+                origin = self._origin()
+                pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # messages published while we were not subscribed are lost
+                self.local.clear()
+                for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    data = message['data']
+                    sender, _, key = (data.decode() if isinstance(data, bytes) else data).partition('|')
+                    if sender != origin:
+                        self.local.delete(key)
+            except Exception as e:
+                logger.warning(f"Hot cache invalidation listener reconnecting: {e}")
+                time.sleep(1)
+
+
+_config = getattr(settings, 'HOT_CACHE', {})
+
+hot_cache = TwoTierCache(
+    max_entries=_config.get('MAX_ENTRIES', 10000),
+    local_ttl=_config.get('LOCAL_TTL', 30),
+    negative_ttl=_config.get('NEGATIVE_TTL', 5),
+    pubsub=_config.get('PUBSUB', True),
+)
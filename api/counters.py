@@ -0,0 +1,80 @@
+"""Denormalized counters and the rows they count.
+
+``PostModel.likes_count``/``comments_count`` and ``UserModel.followers_count``/
+``following_count``/``posts_count`` are kept in step by the views with
+``adjust_counter``. A counter counts only rows whose other side is an active
+account, the same rule the list endpoints apply, so a list's ``count`` matches
+the rows it returns. Deactivating or restoring an account changes what counts,
+so ``UserModel.soft_delete``/``ban``/``restore`` call ``recount_for_user``.
+``manage.py reconcile_counters`` recomputes every counter from scratch.
+"""
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import CommentModel, FollowModel, LikeModel, PostModel, UserModel
+
+BATCH_SIZE = 1000
+
+# counter field -> (source model, foreign key to the counted row, filter on the source)
+POST_COUNTERS = {
+    'likes_count': (LikeModel, 'post_id', {'user__is_active': True}),
+    'comments_count': (CommentModel, 'post_id', {'author__is_active': True}),
+}
+USER_COUNTERS = {
+    'followers_count': (FollowModel, 'following_id', {'follower__is_active': True}),
+    'following_count': (FollowModel, 'follower_id', {'following__is_active': True}),
+    'posts_count': (PostModel, 'author_id', {}),
+}
+
+
+def counted(field, counters):
+    """The ``Subquery`` that recomputes ``field`` for the row it is evaluated on."""
+    source, fk, filters = counters[field]
+    rows = (
+        source.objects.filter(**{fk: OuterRef('pk')}, **filters)
+        .order_by()
+        .values(fk)
+        .annotate(c=Count('pk'))
+        .values('c')
+    )
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def counts(field, counters, ids):
+    """``{row id: real value of field}`` for ``ids``; rows with nothing counted are absent."""
+    source, fk, filters = counters[field]
+    rows = (
+        source.objects.filter(**{f'{fk}__in': ids}, **filters)
+        .order_by()
+        .values(fk)
+        .annotate(total=Count('pk'))
+    )
+    return {row[fk]: row['total'] for row in rows}
+
+
+def recount(model, counters, ids, fields=None):
+    """Recompute ``fields`` (default: all of ``counters``) for the rows in ``ids`` with one UPDATE per batch."""
+    ids = list(ids)
+    fields = fields or list(counters)
+    for start in range(0, len(ids), BATCH_SIZE):
+        model.objects.filter(id__in=ids[start:start + BATCH_SIZE]).update(
+            **{field: counted(field, counters) for field in fields}
+        )
+
+
+def recount_for_user(user_id):
+    """Recompute the counters ``user_id``'s rows take part in, after the account's ``is_active`` changed."""
+    from . import likes
+
+    liked = list(LikeModel.objects.filter(user_id=user_id).values_list('post_id', flat=True).distinct())
+    commented = CommentModel.objects.filter(author_id=user_id).values_list('post_id', flat=True).distinct()
+    following = FollowModel.objects.filter(follower_id=user_id).values_list('following_id', flat=True)
+    followers = FollowModel.objects.filter(following_id=user_id).values_list('follower_id', flat=True)
+
+    recount(PostModel, POST_COUNTERS, liked, ['likes_count'])
+    recount(PostModel, POST_COUNTERS, commented, ['comments_count'])
+    recount(UserModel, USER_COUNTERS, following, ['followers_count'])
+    recount(UserModel, USER_COUNTERS, followers, ['following_count'])
+    # the Redis like state of those posts was loaded under the old rule
+    for post_id in liked:
+        likes.forget(post_id)
@@ -58,6 +58,26 @@ class ErrorCode:
         message="COMMENT_NOT_FOUND"
     )
 
+    PROFILE_NOT_FOUND = Error(
+        code="ERROR_303",
+        message="PROFILE_NOT_FOUND"
+    )
+
+    UPLOAD_NOT_FOUND = Error(
+        code="ERROR_304",
+        message="UPLOAD_NOT_FOUND"
+    )
+
+    UPLOAD_INCOMPLETE = Error(
+        code="ERROR_305",
+        message="UPLOAD_INCOMPLETE"
+    )
+
+    UPLOAD_IN_PROGRESS = Error(
+        code="ERROR_306",
+        message="UPLOAD_IN_PROGRESS"
+    )
+
     PERMISSION_DENIED = Error(
         code="ERROR_403",
         message="PERMISSION_DENIED"
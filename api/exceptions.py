@@ -1,9 +1,16 @@
 from rest_framework.views import exception_handler
-from rest_framework.exceptions import NotAuthenticated, PermissionDenied
+from rest_framework.exceptions import APIException, NotAuthenticated, PermissionDenied
 from rest_framework import status
 from rest_framework.response import Response
 from api.errors import ErrorCode  
 
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body is too large.'
+    default_code = 'request_too_large'
+
+
 def custom_exception_handler(exc, context):
     if isinstance(exc, NotAuthenticated):
         return Response(
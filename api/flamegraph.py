@@ -0,0 +1,178 @@
+"""On-demand flame graphs of single requests, in the speedscope format.
+
+``RequestLogMiddleware`` runs a request under ``StackSampler`` when it targets
+``/api/``, carries the ``REQUEST_PROFILER['HEADER']`` header (``X-Profile: 1``)
+and a bearer token of an active user with ``is_staff``. Other requests only
+pay for one ``META`` lookup. The sampler and its thread do not exist for
+them.
+
+The sampler is a background thread. Every ``INTERVAL_MS`` it reads the request
+thread's Python stack with ``sys._current_frames()``. Each sample is weighted
+by the wall-clock time since the previous one, so time spent waiting on the
+database, Redis or storage shows up under the frame that made the call.
+Frames above the middleware (the WSGI server) are cut off.
+
+The result is stored in the default cache for ``TTL`` seconds under a random
+id. The response carries ``X-Profile-Id`` and ``X-Profile-Url``. Staff download
+the file from ``GET /api/profiles/<id>/`` and open it at
+https://www.speedscope.app (or convert it with any speedscope-compatible tool).
+"""
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+logger = logging.getLogger("api")
+
+_config = getattr(settings, 'REQUEST_PROFILER', {})
+HEADER = _config.get('HEADER', 'X-Profile')
+META_KEY = 'HTTP_' + HEADER.upper().replace('-', '_')
+INTERVAL_MS = _config.get('INTERVAL_MS', 1)
+# sampling stops after this long; the rest of the request runs unprofiled
+MAX_SECONDS = _config.get('MAX_SECONDS', 30)
+TTL = _config.get('TTL', 3600)
+
+SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+_PROJECT_ROOT = str(Path(settings.BASE_DIR)) + '/'
+_KEY_PREFIX = 'flamegraph:'
+
+
+def _short_path(filename):
+    if filename.startswith(_PROJECT_ROOT):
+        return filename[len(_PROJECT_ROOT):]
+    _, found, tail = filename.rpartition('site-packages/')
+    return tail if found else filename
+
+
+class StackSampler:
+    """Samples one thread's stack below ``root`` (a frame of that thread) until stopped."""
+
+    def __init__(self, thread_id, root, interval=INTERVAL_MS / 1000, max_seconds=MAX_SECONDS):
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.frames = []
+        self.samples = []
+        self.weights = []
+        self.started = None
+        self.elapsed = 0.0
+        self._frame_index = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='flamegraph-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        last = self.started
+        deadline = self.started + self.max_seconds
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = self._stack(frame) if frame is not None else None
+            if stack:
+                self._record(stack, (now - last) * 1000)
+            last = now
+            if now >= deadline:
+                break
+
+    def _stack(self, frame):
+        """Frame indexes from the root down to the innermost frame; empty inside ``start``/``stop``."""
+        codes = []
+        while frame is not None and frame is not self.root:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        if not codes or codes[-1].co_filename == __file__:
+            return []
+        stack = []
+        for code in reversed(codes):
+            key = (code.co_qualname, code.co_filename, code.co_firstlineno)
+            index = self._frame_index.get(key)
+            if index is None:
+                index = self._frame_index[key] = len(self.frames)
+                self.frames.append({'name': key[0], 'file': _short_path(key[1]), 'line': key[2]})
+            stack.append(index)
+        return stack
+
+    def _record(self, stack, weight):
+        # consecutive identical stacks are merged; the timeline order is kept
+        if self.samples and self.samples[-1] == stack:
+            self.weights[-1] += weight
+        else:
+            self.samples.append(stack)
+            self.weights.append(weight)
+
+    def speedscope(self, name):
+        """The samples as a speedscope file (``sampled`` profile, milliseconds)."""
+        total = self.elapsed * 1000
+        return {
+            '$schema': SCHEMA,
+            'name': name,
+            'exporter': 'sm_backend',
+            'activeProfileIndex': 0,
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(total, 3),
+                'samples': self.samples,
+                'weights': [round(weight, 3) for weight in self.weights],
+            }],
+        }
+
+
+def wants_profile(request):
+    """Whether the request asked for a flame graph; the staff check is left to the caller."""
+    return bool(request.META.get(META_KEY)) and request.path.startswith('/api/')
+
+
+def profile_request(get_response, request):
+    """Run ``get_response(request)`` under the sampler and store the flame graph."""
+    sampler = StackSampler(threading.get_ident(), sys._getframe())
+    sampler.start()
+    try:
+        response = get_response(request)
+    finally:
+        sampler.stop()
+
+    name = f"{request.method} {request.path}"
+    profile_id = uuid.uuid4().hex
+    save(profile_id, sampler.speedscope(name))
+    response['X-Profile-Id'] = profile_id
+    response['X-Profile-Url'] = reverse('profile-download', args=[profile_id])
+    logger.info(
+        f"Flame graph {name}: {len(sampler.samples)} samples, "
+        f"{sampler.elapsed * 1000:.1f} ms -> {profile_id}",
+        extra={"profile_id": profile_id},
+    )
+    return response
+
+
+def save(profile_id, document):
+    cache.set(_KEY_PREFIX + profile_id, zlib.compress(json.dumps(document).encode()), TTL)
+
+
+def load(profile_id):
+    """The stored speedscope JSON as bytes, or None once it has expired."""
+    data = cache.get(_KEY_PREFIX + profile_id)
+    if data is None:
+        return None
+    return zlib.decompress(data)
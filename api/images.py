@@ -0,0 +1,134 @@
+"""Resized WebP and JPEG variants of post images.
+
+A post stores its image exactly as uploaded, which can be an 8 MB phone
+photo. ``process_post_image`` (``api.tasks``) runs after the response has been
+sent. For every size in ``IMAGE_VARIANTS['SIZES']`` (longest edge in pixels)
+it writes a WebP and a JPEG to the original's storage and records them on
+``PostModel.image_variants``::
+
+    {"thumb": {"width": 320, "height": 240, "webp": "<url>", "jpeg": "<url>"},
+     "feed": {...}, "full": {...}}
+
+The variants are rotated upright from the EXIF orientation and written
+without EXIF, so camera serials and GPS positions do not leak. Images are
+never scaled up: a size larger than the original is encoded at the
+original's dimensions.
+
+``render()`` is pure CPU work on bytes, so ``manage.py process_post_images``
+can run it in a process pool. ``store()`` does the storage and database I/O
+in the calling process.
+"""
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import PostModel
+
+logger = logging.getLogger("api")
+
+_config = getattr(settings, 'IMAGE_VARIANTS', {})
+SIZES = _config.get('SIZES', {'thumb': 320, 'feed': 1080, 'full': 2048})
+WEBP_QUALITY = _config.get('WEBP_QUALITY', 80)
+JPEG_QUALITY = _config.get('JPEG_QUALITY', 85)
+
+FORMATS = ('webp', 'jpeg')
+
+
+def _open(data):
+    """Decode ``data`` upright, at the smallest scale that still covers the largest variant."""
+    source = Image.open(io.BytesIO(data))
+    largest = max(SIZES.values())
+    width, height = source.size
+    scale = largest / max(width, height)
+    if scale < 1:
+        # JPEG only: decode at 1/2, 1/4 or 1/8 scale, far cheaper than a full decode
+        source.draft('RGB', (round(width * scale), round(height * scale)))
+    image = ImageOps.exif_transpose(source)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def _fit(image, edge):
+    width, height = image.size
+    if max(width, height) <= edge:
+        return image
+    scale = edge / max(width, height)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def _encode(image, fmt):
+    out = io.BytesIO()
+    if fmt == 'webp':
+        image.save(out, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        if image.mode == 'RGBA':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def render(data):
+    """Encode every variant of the image in ``data``.
+
+    Returns:
+        ``{name: {'width', 'height', 'webp': bytes, 'jpeg': bytes}}``
+
+    Raises:
+        PIL.UnidentifiedImageError: ``data`` is not an image Pillow can read
+    """
+    image = _open(data)
+    variants = {}
+    # largest first, each one resized from the previous: less work than
+    # going back to the full-size original every time
+    for name, edge in sorted(SIZES.items(), key=lambda item: item[1], reverse=True):
+        image = _fit(image, edge)
+        variants[name] = {
+            'width': image.width,
+            'height': image.height,
+            **{fmt: _encode(image, fmt) for fmt in FORMATS},
+        }
+    return variants
+
+
+def read(post):
+    with post.image.open('rb') as f:
+        return f.read()
+
+
+def store(post, rendered):
+    """Write ``render()`` output to the post image's storage and record it on the post.
+
+    The storage names files after their content (``api.storage``), so the
+    variants of an image that was posted before are not uploaded again.
+
+    Returns the recorded variants, or None if the post was deleted or got a
+    different image in the meantime.
+    """
+    storage = post.image.storage
+    variants = {}
+    for name, variant in rendered.items():
+        entry = {'width': variant['width'], 'height': variant['height']}
+        for fmt in FORMATS:
+            saved = storage.save(f"post_images/variants/{name}.{fmt}", ContentFile(variant[fmt]))
+            entry[fmt] = storage.url(saved)
+        variants[name] = entry
+
+    # update() rather than save(): a background job must not bump updated_at
+    # or overwrite fields the author changed while it ran
+    updated = PostModel.objects.filter(pk=post.pk, image=post.image.name).update(image_variants=variants)
+    if not updated:
+        # the files stay: other posts may share them
+        logger.info(f"Post {post.pk} changed while its image was processed; variants discarded")
+        return None
+    return variants
+
+
+def process(post):
+    """Render and store the variants of ``post.image``."""
+    return store(post, render(read(post)))
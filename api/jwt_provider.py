@@ -1,11 +1,15 @@
-from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.conf import settings
-from django.core.cache import cache
+from .cache import hot_cache
 import jwt
+import logging
 from .models import UserModel
+from .user_cache import snapshot_key, store_user_snapshot, user_from_snapshot
 import time
 
+logger = logging.getLogger("api")
+
 
 def generate_tokens(user):
     """
@@ -27,6 +31,9 @@ def decode_token(token):
     """
     Decode a JWT token and return its payload.
     
+    Signature, ``exp`` and algorithm are checked in this single ``jwt.decode``
+    call; no other parsing of the token happens on the request path.
+    
     Args:
         token: JWT token string
         
@@ -34,23 +41,42 @@ def decode_token(token):
         dict: Decoded token payload or None if invalid
     """
     try:
-        decoded = jwt.decode(
+        return jwt.decode(
             token,
-            settings.SECRET_KEY,
-            algorithms=['HS256']
+            settings.SIMPLE_JWT['SIGNING_KEY'],
+            algorithms=[settings.SIMPLE_JWT['ALGORITHM']],
+            options={'require': ['exp']},
         )
-        return decoded
     except jwt.ExpiredSignatureError:
-        print("Token has expired")
+        logger.debug("Token has expired")
         return None
-    except jwt.InvalidTokenError:
-        print("Invalid token")
+    except jwt.InvalidTokenError as e:
+        logger.debug(f"Invalid token: {e}")
         return None
     except Exception as e:
-        print(f"Error decoding token: {str(e)}")
+        logger.warning(f"Error decoding token: {e}")
         return None
 
 
+def verify_access_token(token):
+    """
+    Decode a token and make sure it is an access token.
+
+    Args:
+        token: JWT token string
+
+    Returns:
+        dict: Claims, or None if the token is invalid, expired or a refresh token
+    """
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    if payload.get('token_type') != 'access':
+        logger.debug("Rejected non-access token")
+        return None
+    return payload
+
+
 def validate_token(token):
     """
     Validate if a token is valid and not expired.
@@ -61,15 +87,7 @@ def validate_token(token):
     Returns:
         bool: True if token is valid, False otherwise
     """
-    try:
-        UntypedToken(token)
-        return True
-    except (InvalidToken, TokenError) as e:
-        print(f"Token validation failed: {str(e)}")
-        return False
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        return False
+    return decode_token(token) is not None
 
 
 def is_token_blacklisted(payload):
@@ -79,7 +97,7 @@ def is_token_blacklisted(payload):
     jti = payload.get('jti')
     if not jti:
         return False
-    return bool(cache.get(f"blacklist:{jti}"))
+    return bool(hot_cache.get(f"blacklist:{jti}"))
 
 
 def blacklist_token(payload):
@@ -97,56 +115,67 @@ def blacklist_token(payload):
     ttl = int(exp - time.time())
     if ttl <= 0:
         return False
-    cache.set(f"blacklist:{jti}", True, ttl)
+    hot_cache.set(f"blacklist:{jti}", True, ttl)
     return True
 
 
-def get_user_from_token(token):
+def get_user_from_payload(payload):
     """
-    Extract and return the user object from a JWT token.
-    
+    Return the user for already-verified token claims.
+
     Args:
-        token: JWT token string
-        
+        payload: dict of claims from ``decode_token``/``verify_access_token``
+
     Returns:
-        UserModel: User object or None if token is invalid or user not found
+        UserModel: User object or None if the token is blacklisted or the user is gone
     """
-    payload = decode_token(token)
-    
-    if payload is None:
+    user_id = payload.get('user_id')
+    if user_id is None:
+        logger.info("User ID not found in token")
         return None
-    # Check blacklist first
-    if is_token_blacklisted(payload):
-        print("Token is blacklisted")
+
+    # Blacklist flag and user snapshot: in-process tier first, then a single MGET
+    user_key = snapshot_key(user_id)
+    jti = payload.get('jti')
+    blacklist_key = f"blacklist:{jti}" if jti else None
+    cached = hot_cache.get_many([key for key in (user_key, blacklist_key) if key])
+
+    if blacklist_key and cached.get(blacklist_key):
+        logger.info("Token is blacklisted")
         return None
-    
-    try:
-        user_id = payload.get('user_id')
-        if user_id is None:
-            print("User ID not found in token")
-            return None
-        # Try quick cache hit to reduce DB read
-        cache_key = f"user:{user_id}"
-        cached = cache.get(cache_key)
-        if cached:
-            try:
-                user = UserModel.objects.get(id=user_id)
-                return user
-            except UserModel.DoesNotExist:
-                return None
 
+    snapshot = cached.get(user_key)
+    if snapshot is not None:
+        return user_from_snapshot(snapshot)
+
+    try:
         user = UserModel.objects.get(id=user_id)
-        # set a short-lived cache flag indicating user exists
-        cache.set(cache_key, True, timeout=120)
+        store_user_snapshot(user)
         return user
     except UserModel.DoesNotExist:
-        print(f"User with ID {user_id} does not exist")
+        logger.info(f"User with ID {user_id} does not exist")
         return None
     except Exception as e:
-        print(f"Error retrieving user: {str(e)}")
+        logger.error(f"Error retrieving user: {e}")
         return None
 
 
+def get_user_from_token(token):
+    """
+    Extract and return the user object from a JWT token.
+    
+    Args:
+        token: JWT token string
+        
+    Returns:
+        UserModel: User object or None if token is invalid or user not found
+    """
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    return get_user_from_payload(payload)
+
+
 def refresh_access_token(refresh_token):
     """
     Generate a new access token from a refresh token.
@@ -161,9 +190,8 @@ def refresh_access_token(refresh_token):
         refresh = RefreshToken(refresh_token)
         return str(refresh.access_token)
     except (InvalidToken, TokenError) as e:
-        print(f"Invalid refresh token: {str(e)}")
+        logger.info(f"Invalid refresh token: {e}")
         return None
     except Exception as e:
-        print(f"Error refreshing token: {str(e)}")
+        logger.error(f"Error refreshing token: {e}")
         return None
-
@@ -0,0 +1,267 @@
+"""Write-behind like state in Redis.
+
+Per post, Redis holds the set of user ids who liked it (``likes:<post>:users``)
+and a counter (``likes:<post>:count``); the counter doubles as the "state is
+loaded" marker. A toggle is one EVALSHA that flips set membership, adjusts the
+counter and records the new state in the ``likes:pending`` hash. A Celery beat
+task (``api.tasks.flush_like_buffer``) periodically swaps that hash out and
+applies it to ``LikeModel`` with batched ``bulk_create``/``delete`` calls, then
+refreshes ``PostModel.likes_count`` for the touched posts.
+
+Consistency window: Redis reads (toggle results, ``GetLikeCountView``) are
+immediate. SQL reads (``LikeModel`` rows, ``PostModel.likes_count``, the likes
+list endpoint) trail by up to ``LIKES_FLUSH_INTERVAL`` seconds plus task
+latency. Toggles still in the pending hash are lost if Redis itself loses data
+before a flush, so run Redis with AOF persistence in production.
+
+Recovery: ``manage.py rebuild_like_cache`` flushes whatever is pending and then
+drops the per-post state, which is lazily reloaded from ``LikeModel`` on the
+next access.
+"""
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from . import counters
+from .models import LikeModel, PostModel
+from .profiling import timed
+
+STATE_TTL = getattr(settings, 'LIKES_STATE_TTL', 24 * 3600)
+FLUSH_BATCH_SIZE = getattr(settings, 'LIKES_FLUSH_BATCH_SIZE', 1000)
+
+PENDING_KEY = 'likes:pending'
+FLUSHING_KEY = 'likes:pending:flushing'
+FLUSH_LOCK_KEY = 'likes:flush-lock'
+
+# KEYS: users set, counter, pending hash; ARGV: user id, pending field, ttl.
+# Returns 1 (liked), 0 (unliked) or -1 when the post's state is not loaded.
+TOGGLE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return -1
+end
+local liked = 1
+if redis.call('SREM', KEYS[1], ARGV[1]) == 1 then
+    redis.call('DECR', KEYS[2])
+    liked = 0
+else
+    redis.call('SADD', KEYS[1], ARGV[1])
+    redis.call('INCR', KEYS[2])
+end
+redis.call('HSET', KEYS[3], ARGV[2], liked)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return liked
+"""
+
+# KEYS: users set, counter; ARGV: ttl, then user ids. Never overwrites state
+# that a concurrent loader already installed. Returns the counter.
+LOAD_SCRIPT = """
+local count = redis.call('GET', KEYS[2])
+if count then
+    return tonumber(count)
+end
+redis.call('DEL', KEYS[1])
+for i = 2, #ARGV, 1000 do
+    redis.call('SADD', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+redis.call('SET', KEYS[2], #ARGV - 1, 'EX', ARGV[1])
+if #ARGV > 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return #ARGV - 1
+"""
+
+
+def users_key(post_id):
+    return f"likes:{post_id}:users"
+
+
+def count_key(post_id):
+    return f"likes:{post_id}:count"
+
+
+def _redis():
+    return timed(get_redis_connection("default"))
+
+
+def _pending_for(redis, post_id):
+    """Unflushed ``{user_id: liked}`` states for one post, oldest hash first."""
+    states = {}
+    for key in (FLUSHING_KEY, PENDING_KEY):
+        for field, value in redis.hscan_iter(key, match=f"{post_id}:*"):
+            states[int(field.split(b':')[1])] = value == b'1'
+    return states
+
+
+def load(post_id):
+    """Load a post's like state from ``LikeModel`` into Redis if it is not there.
+
+    Only active accounts' likes count (``api.counters``).
+
+    Returns:
+        int: the like count in Redis, or None if the post does not exist
+    """
+    if not PostModel.objects.filter(id=post_id).exists():
+        return None
+    redis = _redis()
+    # Read the unflushed toggles before the rows: a flush in between then
+    # only moves them into the rows we read next, instead of out of both
+    pending = _pending_for(redis, post_id)
+    user_ids = set(
+        LikeModel.objects.filter(post_id=post_id, user__is_active=True).values_list('user_id', flat=True)
+    )
+    # Toggles not yet flushed to SQL still count
+    for user_id, liked in pending.items():
+        if liked:
+            user_ids.add(user_id)
+        else:
+            user_ids.discard(user_id)
+    return redis.register_script(LOAD_SCRIPT)(
+        keys=[users_key(post_id), count_key(post_id)],
+        args=[STATE_TTL, *user_ids],
+    )
+
+
+def toggle(post_id, user_id):
+    """Flip ``user_id``'s like on ``post_id``.
+
+    Returns:
+        bool: True if the post is now liked, False if unliked, or None if the
+        post does not exist
+    """
+    redis = _redis()
+    script = redis.register_script(TOGGLE_SCRIPT)
+    keys = [users_key(post_id), count_key(post_id), PENDING_KEY]
+    args = [user_id, f"{post_id}:{user_id}", STATE_TTL]
+
+    result = script(keys=keys, args=args)
+    if result == -1:
+        if load(post_id) is None:
+            return None
+        result = script(keys=keys, args=args)
+    return result == 1
+
+
+def get_count(post_id):
+    """Like count for ``post_id`` from Redis, or None if the post does not exist."""
+    count = _redis().get(count_key(post_id))
+    if count is None:
+        # the state may expire again before a second GET; use what was loaded
+        return load(post_id)
+    return int(count)
+
+
+def liked_post_ids(user_id, post_ids):
+    """Which of ``post_ids`` ``user_id`` has liked.
+
+    One ``LikeModel`` query for the whole batch, overlaid with toggles that
+    have not been flushed yet (one pipelined HMGET round trip).
+
+    Returns:
+        set: the liked post ids
+    """
+    post_ids = list(post_ids)
+    if not post_ids:
+        return set()
+    liked = set(
+        LikeModel.objects.filter(user_id=user_id, post_id__in=post_ids)
+        .values_list('post_id', flat=True)
+    )
+    fields = [f"{post_id}:{user_id}" for post_id in post_ids]
+    pipe = _redis().pipeline(transaction=False)
+    pipe.hmget(FLUSHING_KEY, fields)
+    pipe.hmget(PENDING_KEY, fields)
+    flushing, pending = pipe.execute()
+    for post_id, older, newer in zip(post_ids, flushing, pending):
+        state = newer if newer is not None else older
+        if state == b'1':
+            liked.add(post_id)
+        elif state == b'0':
+            liked.discard(post_id)
+    return liked
+
+
+def forget(post_id):
+    """Drop a post's cached like state (e.g. after the post is deleted)."""
+    _redis().delete(users_key(post_id), count_key(post_id))
+
+
+def flush():
+    """Apply buffered toggles to ``LikeModel`` and refresh ``PostModel.likes_count``.
+
+    Returns:
+        dict: number of likes ``created`` and ``deleted``, or ``None`` if
+        another flush holds the lock
+    """
+    redis = _redis()
+    lock = redis.lock(FLUSH_LOCK_KEY, timeout=300, blocking=False)
+    if not lock.acquire():
+        return None
+    try:
+        # A leftover flushing hash means the previous run died; finish it first
+        if not redis.exists(FLUSHING_KEY):
+            try:
+                redis.rename(PENDING_KEY, FLUSHING_KEY)
+            except ResponseError:
+                return {'created': 0, 'deleted': 0}
+
+        created = deleted = 0
+        batch = {}
+        for field, value in redis.hscan_iter(FLUSHING_KEY, count=FLUSH_BATCH_SIZE):
+            post_id, user_id = (int(part) for part in field.split(b':'))
+            batch[(post_id, user_id)] = value == b'1'
+            if len(batch) >= FLUSH_BATCH_SIZE:
+                c, d = _apply(batch)
+                created, deleted, batch = created + c, deleted + d, {}
+        if batch:
+            c, d = _apply(batch)
+            created, deleted = created + c, deleted + d
+
+        redis.delete(FLUSHING_KEY)
+        return {'created': created, 'deleted': deleted}
+    finally:
+        lock.release()
+
+
+def _apply(states):
+    post_ids = {post_id for post_id, _ in states}
+    live_posts = set(PostModel.objects.filter(id__in=post_ids).values_list('id', flat=True))
+
+    to_create = []
+    to_delete = {}
+    for (post_id, user_id), liked in states.items():
+        if post_id not in live_posts:
+            continue
+        if liked:
+            to_create.append(LikeModel(post_id=post_id, user_id=user_id))
+        else:
+            to_delete.setdefault(post_id, []).append(user_id)
+
+    deleted = 0
+    with transaction.atomic():
+        LikeModel.objects.bulk_create(to_create, batch_size=FLUSH_BATCH_SIZE, ignore_conflicts=True)
+        for post_id, user_ids in to_delete.items():
+            deleted += LikeModel.objects.filter(post_id=post_id, user_id__in=user_ids).delete()[0]
+        counters.recount(PostModel, counters.POST_COUNTERS, live_posts, ['likes_count'])
+    return len(to_create), deleted
+
+
+def drop_all():
+    """Delete every post's cached like state so it reloads from ``LikeModel``.
+
+    Returns:
+        int: number of keys deleted
+    """
+    redis = _redis()
+    removed = 0
+    for pattern in ('likes:*:users', 'likes:*:count'):
+        keys = []
+        for key in redis.scan_iter(match=pattern, count=1000):
+            keys.append(key)
+            if len(keys) >= 1000:
+                removed += redis.delete(*keys)
+                keys = []
+        if keys:
+            removed += redis.delete(*keys)
+    return removed
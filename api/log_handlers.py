@@ -0,0 +1,206 @@
+"""Logging that never blocks the request path.
+
+``QueuedHandler`` is the only handler attached to the ``api`` and ``django``
+loggers. Emitting a record puts it on a bounded in-memory queue, and a
+background ``QueueListener`` thread writes it to the real sinks (file,
+console). When the sinks fall behind and the queue is full, new records are
+dropped instead of waiting. The drops are counted (``dropped_records()``,
+exported by ``api.metrics``) and reported through the sinks once the
+listener catches up.
+
+``SuccessSampler`` keeps a fraction of the request log lines for fast,
+successful requests. Errors and slow requests are always kept.
+``JSONFormatter`` writes one JSON object per line.
+
+Configured in ``LOGGING`` with ``()`` rather than ``class``, because for a
+``class`` that subclasses ``QueueHandler``, ``dictConfig`` would build its
+own unbounded queue and listener::
+
+    "queue": {
+        "()": "api.log_handlers.QueuedHandler",
+        "handlers": ["console", "file"],    # names of other LOGGING handlers
+        "maxsize": 10000,
+        "filters": ["sample_success"],
+    }
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_instances = []
+
+
+def dropped_records():
+    """Records dropped by every ``QueuedHandler`` in this process since it started."""
+    return sum(handler.dropped for handler in _instances)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, ``extra`` fields and traceback."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SuccessSampler(logging.Filter):
+    """Keep ``rate`` of the request records for fast 1xx-3xx responses.
+
+    Only records with a ``status`` attribute (the request log lines from
+    ``RequestLogMiddleware``) are sampled. A kept record gets
+    ``sample_rate`` so counts can be scaled back up downstream.
+    """
+
+    def __init__(self, rate=1.0, slow_ms=500):
+        super().__init__()
+        self.rate = float(rate)
+        self.slow_ms = float(slow_ms)
+
+    def filter(self, record):
+        status = getattr(record, 'status', None)
+        if status is None or self.rate >= 1:
+            return True
+        if status >= 400 or getattr(record, 'duration_ms', 0) >= self.slow_ms:
+            return True
+        if random.random() < self.rate:
+            record.sample_rate = self.rate
+            return True
+        return False
+
+
+class _Listener(QueueListener):
+    """Reports drops through the sinks, at most once per ``report_interval`` seconds."""
+    report_interval = 10
+
+    def __init__(self, owner, *handlers):
+        super().__init__(owner.queue, *handlers, respect_handler_level=True)
+        self.owner = owner
+        self.reported = owner.dropped
+        self.last_report = 0.0
+
+    def handle(self, record):
+        super().handle(record)
+        self.report_drops()
+
+    def report_drops(self, force=False):
+        dropped = self.owner.dropped
+        now = time.monotonic()
+        if dropped == self.reported or (not force and now - self.last_report < self.report_interval):
+            return
+        self.last_report = now
+        warning = logging.LogRecord(
+            'api', logging.WARNING, __file__, 0,
+            "Log queue full: dropped %d records", (dropped - self.reported,), None,
+        )
+        self.reported = dropped
+        super().handle(warning)
+
+    def stop(self):
+        super().stop()
+        self.report_drops(force=True)
+
+    def enqueue_sentinel(self):
+        # the queue may be full; wait for room rather than lose the sentinel
+        self.queue.put(self._sentinel, timeout=5)
+
+
+class QueuedHandler(QueueHandler):
+    """Enqueue records for a background thread; never blocks, drops when full.
+
+    Args:
+        handlers: the handlers that do the writing, or their ``LOGGING`` names
+        maxsize: queue bound; further records are dropped and counted
+    """
+
+    def __init__(self, handlers=(), maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.sinks = [self._resolve(handler) for handler in handlers]
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+        self._drop_lock = threading.Lock()
+        _instances.append(self)
+
+    @staticmethod
+    def _resolve(handler):
+        if not isinstance(handler, str):
+            return handler
+        # dictConfig builds handlers in name order, so the sinks must sort
+        # before the queue handler's own name; holding them here also keeps
+        # them alive, since no logger references them directly
+        resolved = logging.getHandlerByName(handler)
+        if resolved is None:
+            raise ValueError(f"Handler {handler!r} is not configured (it must sort before this handler's name)")
+        return resolved
+
+    def emit(self, record):
+        # the thread starts on first use, so forked workers start their own
+        if self._listener_pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+    def prepare(self, record):
+        """Make the record safe to hand to another thread; formatting is left to the sinks."""
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.message = record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def _start(self):
+        with self._start_lock:
+            if self._listener_pid == os.getpid():
+                return
+            if self._listener_pid is not None:
+                # forked: the parent's thread did not come along and its queue lock may be held
+                self.queue = queue.Queue(self.maxsize)
+            self.listener = _Listener(self, *self.sinks)
+            self.listener.start()
+            self._listener_pid = os.getpid()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Drain the queue and stop the listener thread."""
+        listener, self.listener = self.listener, None
+        if listener is not None and self._listener_pid == os.getpid():
+            listener.stop()
+        self._listener_pid = None
+
+    def close(self):
+        self.stop()
+        super().close()
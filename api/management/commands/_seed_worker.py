@@ -0,0 +1,17 @@
+"""Worker process setup for ``seed_social_graph --workers``.
+
+Kept out of the command module: that one imports the models, and a worker
+started with the spawn method (Windows, macOS) unpickles its initializer
+before Django is set up.
+"""
+import django
+
+
+def init_worker(graph):
+    django.setup()
+    from django.db import connections
+    from . import seed_social_graph
+
+    # each worker process opens its own database connection
+    connections.close_all()
+    seed_social_graph._graph.update(graph)
@@ -0,0 +1,144 @@
+import io
+import json
+import os
+import struct
+import time
+import tracemalloc
+import warnings
+import zlib
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import SkipFile
+from django.core.management.base import BaseCommand
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+from api.validators import ImageUploadHandler, validate_image
+
+
+def png_bomb(edge):
+    """A grayscale PNG of ``edge`` x ``edge`` zero pixels; a few hundred KB on disk."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    compressor = zlib.compressobj(9)
+    row = b'\x00' * (edge + 1)
+    idat = b''.join(compressor.compress(row) for _ in range(edge)) + compressor.flush()
+    ihdr = struct.pack('>IIBBBBB', edge, edge, 8, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', idat) + chunk(b'IEND', b'')
+
+
+def encoded(size, fmt, **params):
+    out = io.BytesIO()
+    Image.effect_noise(size, 64).convert('RGB').save(out, fmt, **params)
+    return out.getvalue()
+
+
+def drf_image_field(data):
+    """The previous check: DRF's ImageField (Django's ``Image.open`` + ``verify()``)."""
+    serializers.ImageField().run_validation(SimpleUploadedFile('upload.png', data))
+
+
+def full_decode(data):
+    """What accepting an image commits to: the variant renderer decodes every pixel."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise serializers.ValidationError(str(e))
+
+
+def header_only(data):
+    validate_image(SimpleUploadedFile('upload.png', data))
+
+
+def streamed(data, chunk_size=64 * 1024):
+    """Feed ``data`` to the upload handler like the multipart parser; returns bytes read before the verdict."""
+    handler = ImageUploadHandler()
+    handler.new_file('photo', 'upload', None, None)
+    read = 0
+    try:
+        for start in range(0, len(data), chunk_size):
+            read = min(len(data), start + chunk_size)
+            handler.receive_data_chunk(data[start:start + chunk_size], start)
+            if handler.checked:
+                break
+        else:
+            handler.file_complete(len(data))
+    except SkipFile:
+        pass
+    return read
+
+
+PATHS = (('decode', full_decode), ('drf', drf_image_field), ('header', header_only))
+
+
+class Command(BaseCommand):
+    help = ("Benchmark image upload validation on large and malicious inputs: "
+            "DRF's ImageField and a full decode against the header-only checks and the streaming handler.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        self.stderr.write("Generating inputs...")
+        inputs = {
+            'jpeg 24 MP': encoded((6000, 4000), 'JPEG', quality=90),
+            'png 6 MP': encoded((3000, 2000), 'PNG'),
+            # under Pillow's own bomb limit, so only our megapixel cap stops it
+            'png bomb 144 MP': png_bomb(12000),
+            'random bytes': os.urandom(8 * 1024 * 1024),
+        }
+
+        results = {}
+        with warnings.catch_warnings():
+            # Pillow warns about the bomb on every open
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            for name, data in inputs.items():
+                row = {'bytes': len(data)}
+                for path, check in PATHS:
+                    row[path] = self.measure(check, data, options['iterations'])
+                row['stream_bytes_read'] = streamed(data)
+                results[name] = row
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"{'input':<17}{'size':>10}  {'full decode':>24}  {'drf ImageField':>24}  "
+                          f"{'header only':>24}  {'stream read':>11}")
+        for name, row in results.items():
+            cells = [f"{row[p]['ms']:>9.2f} ms {row[p]['peak_kib']:>8,} KiB {row[p]['verdict'][:1]}" for p, _ in PATHS]
+            self.stdout.write(
+                f"{name:<17}{row['bytes'] / 2 ** 20:>7.1f} MB  " + "  ".join(f"{cell:>24}" for cell in cells)
+                + f"  {row['stream_bytes_read'] / 1024:>7,.0f} KiB"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            "verdict: a = accepted, r = rejected. Memory is the peak of traced Python allocations; "
+            "Pillow's pixel buffers (width x height x bands bytes on a decode) are not included."
+        ))
+
+    @staticmethod
+    def measure(check, data, iterations):
+        def run():
+            try:
+                check(data)
+                return 'accepted'
+            except (serializers.ValidationError, DjangoValidationError):
+                return 'rejected'
+
+        verdict = run()  # warm-up
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'ms': round(sorted(timings)[len(timings) // 2] * 1000, 3),
+            'peak_kib': round(peak / 1024),
+            'verdict': verdict,
+        }
@@ -0,0 +1,74 @@
+import json
+import time
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.jwt_provider import get_user_from_payload, verify_access_token
+from api.models import UserModel
+
+
+def legacy_authenticate(token):
+    """The previous ``get_user_from_token``: one ``jwt.decode``, then the blacklist and user lookup.
+
+    The lookup itself moved unchanged into ``get_user_from_payload``.
+    """
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return None
+    return get_user_from_payload(payload)
+
+
+def lean_authenticate(token):
+    """What ``JWTAuthentication`` does now."""
+    payload = verify_access_token(token)
+    if payload is None:
+        return None
+    return get_user_from_payload(payload)
+
+
+class Command(BaseCommand):
+    help = ("Micro-benchmark bearer authentication, token decode plus blacklist and user lookup "
+            "(requests authenticated per second on one core).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        user = UserModel.objects.filter(is_active=True).order_by('id').first()
+        if user is None:
+            raise CommandError("bench_token_verify needs at least one active user; run seed_social_graph first")
+        token = str(RefreshToken.for_user(user).access_token)
+
+        results = {}
+        for name, verify in (('legacy', legacy_authenticate), ('lean', lean_authenticate)):
+            if verify(token) is None:
+                raise CommandError(f"{name} path rejected a valid token")
+            verify(token)  # warm-up
+            start = time.perf_counter()
+            for _ in range(iterations):
+                verify(token)
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                'tokens_per_second': round(iterations / elapsed),
+                'microseconds_per_token': round(elapsed / iterations * 1_000_000, 2),
+            }
+        results['speedup'] = round(
+            results['lean']['tokens_per_second'] / results['legacy']['tokens_per_second'], 2
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        for name in ('legacy', 'lean'):
+            row = results[name]
+            self.stdout.write(
+                f"{name:>7}: {row['tokens_per_second']:>8} tokens/s  "
+                f"({row['microseconds_per_token']} us/token)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"speedup: {results['speedup']}x"))
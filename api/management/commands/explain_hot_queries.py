@@ -0,0 +1,75 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.models import UserModel, PostModel, CommentModel, LikeModel, FollowModel
+
+PAGE = 21
+
+# "SCAN api_postmodel" is a full table scan; "SCAN ... USING [COVERING] INDEX" walks an index
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (\w+)(?! USING)(?:\s|$)')
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def hot_queries(user_id, post_id):
+    """The main query of each hot view, built the way the view builds it."""
+    return {
+        'posts_feed': PostModel.objects.filter(author__is_active=True)
+            .order_by('-created_at', '-id')[:PAGE],
+        'user_posts_list': PostModel.objects.filter(author_id=user_id)
+            .order_by('-created_at', '-id')[:PAGE],
+        'post_comments': CommentModel.objects.filter(post_id=post_id, author__is_active=True)
+            .order_by('-created_at', '-id')[:PAGE],
+        'post_likes': LikeModel.objects.filter(post_id=post_id, user__is_active=True)
+            .order_by('-created_at', '-id')[:PAGE],
+        'liked_by_me': LikeModel.objects.filter(user_id=user_id, post_id__in=[post_id, post_id + 1])
+            .values_list('post_id', flat=True),
+        'user_followers': FollowModel.objects.filter(following_id=user_id, follower__is_active=True)
+            .order_by('-created_at', '-id')[:PAGE],
+        'user_following': FollowModel.objects.filter(follower_id=user_id, following__is_active=True)
+            .order_by('-created_at', '-id')[:PAGE],
+        'login': UserModel.objects.filter(username='explain'),
+        'user_detail': UserModel.objects.filter(id=user_id, is_active=True),
+    }
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the main query of each hot view and fail if any of them does a full table scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor == 'sqlite':
+            pattern = SQLITE_FULL_SCAN
+        elif vendor == 'postgresql':
+            pattern = POSTGRES_FULL_SCAN
+        else:
+            raise CommandError(f"explain_hot_queries does not support the {vendor} backend")
+
+        user_id = UserModel.objects.order_by('id').values_list('id', flat=True).first() or 1
+        post_id = PostModel.objects.order_by('id').values_list('id', flat=True).first() or 1
+
+        failures = []
+        with transaction.atomic():
+            if vendor == 'postgresql':
+                # tiny dev tables are always cheaper to seq scan; ask whether an index *can* be used
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in hot_queries(user_id, post_id).items():
+                plan = queryset.explain()
+                scanned = sorted(set(pattern.findall(plan)))
+                if options['verbose_plans']:
+                    self.stdout.write(f"-- {name}\n{plan}\n")
+                if scanned:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"{name}: full scan of {', '.join(scanned)}"))
+                else:
+                    self.stdout.write(f"{name}: ok")
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries fall back to a full table scan: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All hot queries use an index."))
@@ -0,0 +1,362 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SCENARIOS = ('login', 'feed_scroll', 'like_storm', 'comment_burst', 'follow_churn')
+DEFAULT_MIX = 'feed_scroll=50,like_storm=20,comment_burst=10,follow_churn=10,login=10'
+# Posts every virtual user piles onto during like storms and comment bursts
+HOT_POSTS = 20
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return None
+    rank = max(math.ceil(pct / 100 * len(samples)), 1)
+    return samples[rank - 1]
+
+
+class EndpointStats:
+    """Latencies and status codes for one ``METHOD url-name``."""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+
+    def record(self, status, elapsed_ms):
+        self.latencies.append(elapsed_ms)
+        self.statuses[str(status)] += 1
+        if status == 'error' or status >= 400:
+            self.errors += 1
+
+    def as_dict(self, elapsed_s):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        histogram = Counter()
+        for value in latencies:
+            bucket = next((str(b) for b in LATENCY_BUCKETS_MS if value <= b), 'inf')
+            histogram[bucket] += 1
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'error_rate': round(self.errors / count, 4) if count else 0.0,
+            'throughput_rps': round(count / elapsed_s, 2) if elapsed_s else 0.0,
+            'latency_ms': {
+                'min': round(latencies[0], 2) if count else None,
+                'mean': round(sum(latencies) / count, 2) if count else None,
+                'p50': round(percentile(latencies, 50), 2) if count else None,
+                'p90': round(percentile(latencies, 90), 2) if count else None,
+                'p95': round(percentile(latencies, 95), 2) if count else None,
+                'p99': round(percentile(latencies, 99), 2) if count else None,
+                'max': round(latencies[-1], 2) if count else None,
+            },
+            # non-cumulative counts keyed by bucket upper bound in ms
+            'histogram_ms': {str(b): histogram[str(b)] for b in LATENCY_BUCKETS_MS} | {'inf': histogram['inf']},
+            'status_codes': dict(sorted(self.statuses.items())),
+        }
+
+
+class Recorder:
+    """Shared by every virtual user; asyncio runs them on one thread, so no locking."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.scenarios = {}
+
+    def request(self, name, status, elapsed_ms):
+        self.endpoints.setdefault(name, EndpointStats()).record(status, elapsed_ms)
+
+    def scenario(self, name, ok):
+        runs = self.scenarios.setdefault(name, {'runs': 0, 'failed': 0})
+        runs['runs'] += 1
+        runs['failed'] += not ok
+
+
+class VirtualUser:
+    """One logged-in seeded user running weighted scenarios until the deadline."""
+
+    def __init__(self, client, recorder, rng, options, pool):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.options = options
+        # post ids and author ids seen in feeds, shared by all virtual users
+        self.pool = pool
+        self.token = None
+        self.user_id = None
+        self.ok = True
+        self.recording = True
+
+    async def call(self, method, name, path, expect=(200,), **kwargs):
+        """Send one request and record it under ``METHOD name``; returns the JSON body or None."""
+        if self.token:
+            kwargs.setdefault('headers', {})['Authorization'] = f"Bearer {self.token}"
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 'error'
+        if self.recording:
+            self.recorder.request(f"{method} {name}", status, (time.perf_counter() - started) * 1000)
+        if status == 'error':
+            self.ok = False
+            return None
+        if response.status_code not in expect:
+            self.ok = False
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+    def hot_post(self):
+        posts = self.pool['posts']
+        return self.rng.choice(list(posts)[:HOT_POSTS]) if posts else None
+
+    def remember(self, posts):
+        for post in posts:
+            self.pool['posts'].append(post['id'])
+            self.pool['authors'].append(post['author'])
+
+    async def login(self):
+        username = f"{self.options['prefix']}{self.rng.randrange(self.options['users'])}"
+        body = await self.call('POST', 'login', '/api/auth/login/',
+                               json={'username': username, 'password': self.options['password']})
+        if body is None:
+            return False
+        self.token = body['data']['tokens']['access']
+        me = await self.call('GET', 'current-user', '/api/users/me/')
+        self.user_id = me['data']['user']['id'] if me else None
+        return me is not None
+
+    async def feed_scroll(self):
+        name, path = self.rng.choice((('home-feed', '/api/feed/home/'), ('post-list-create', '/api/posts/')))
+        cursor = None
+        for _ in range(self.options['scroll_pages']):
+            params = {'cursor': cursor} if cursor else {}
+            body = await self.call('GET', name, path, params=params)
+            if body is None:
+                return
+            self.remember(body['posts'])
+            cursor = body['next']
+            if not cursor:
+                break
+        if body['posts']:
+            post_id = self.rng.choice(body['posts'])['id']
+            await self.call('GET', 'post-comments', f'/api/posts/{post_id}/comments/')
+
+    async def like_storm(self):
+        post_id = self.hot_post()
+        # an even number of toggles leaves the like state as it was
+        for _ in range(2 * (self.options['burst'] // 2 or 1)):
+            await self.call('POST', 'like-toggle', '/api/likes/toggle/', expect=(200, 201), json={'post_id': post_id})
+        await self.call('GET', 'get-like-count', f'/api/posts/{post_id}/likes/count/')
+
+    async def comment_burst(self):
+        post_id = self.hot_post()
+        created = []
+        for i in range(self.options['burst']):
+            body = await self.call('POST', 'comment-create', '/api/comments/create/', expect=(201,),
+                                   json={'post_id': post_id, 'text': f'load test comment {i}'})
+            if body:
+                created.append(body['comment']['id'])
+        await self.call('GET', 'post-comments', f'/api/posts/{post_id}/comments/')
+        # clean up so repeated runs see the same dataset
+        for comment_id in created:
+            await self.call('DELETE', 'comment-delete', f'/api/comments/{comment_id}/delete/')
+
+    async def follow_churn(self):
+        authors = [a for a in set(self.pool['authors']) if a != self.user_id]
+        for user_id in self.rng.sample(authors, min(len(authors), self.options['burst'] // 2 or 1)):
+            # follow/unfollow pairs leave the graph as it was (in either order)
+            for _ in range(2):
+                await self.call('POST', 'follow-toggle', f'/api/users/{user_id}/follow/', expect=(200, 201))
+        if self.user_id:
+            await self.call('GET', 'user-following', f'/api/users/{self.user_id}/following/')
+
+    async def setup(self):
+        """Initial login; not recorded, so every user starts the timed phase authenticated."""
+        self.recording = False
+        try:
+            return await self.login()
+        finally:
+            self.recording = True
+
+    async def run(self, mix, deadline):
+        names, weights = zip(*mix.items())
+        while time.monotonic() < deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            self.ok = True
+            await getattr(self, scenario)()
+            self.recorder.scenario(scenario, self.ok)
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def parse_mix(value):
+    """``'feed_scroll=50,like_storm=20'`` -> ``{'feed_scroll': 50.0, 'like_storm': 20.0}``."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise CommandError(f"Unknown scenario '{name}'; choose from {', '.join(SCENARIOS)}")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}': {weight}")
+    if not any(mix.values()):
+        raise CommandError("--mix needs at least one scenario with a positive weight")
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running server with concurrent virtual users (login, feed scroll, like storms, "
+        "comment bursts, follow churn) and report per-endpoint throughput, latency and errors. "
+        "Expects users created by seed_social_graph."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=20, help='Virtual users (default: 20)')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run (default: 30)')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f'Scenario weights (default: {DEFAULT_MIX})')
+        parser.add_argument('--burst', type=int, default=10,
+                            help='Requests per like storm / comment burst / follow churn (default: 10)')
+        parser.add_argument('--scroll-pages', type=positive_int, default=5, help='Pages per feed scroll (default: 5)')
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Log in as one of the first N seeded users (default: 1000)')
+        parser.add_argument('--prefix', default='seed', help='Seeded username prefix (default: seed)')
+        parser.add_argument('--password', default='Seed!pass123', help='Seeded users\' password')
+        parser.add_argument('--timeout', type=float, default=10, help='Per-request timeout in seconds')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the load profile')
+        parser.add_argument('--label', default='', help='Free-form label stored in the report, e.g. a branch name')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--compare', help='Print deltas against an earlier JSON report')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1")
+
+        report = asyncio.run(self.load(mix, options))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+        else:
+            self.print_report(report)
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.print_comparison(json.load(f), report)
+
+    async def load(self, mix, options):
+        limits = httpx.Limits(max_connections=options['concurrency'], max_keepalive_connections=options['concurrency'])
+        async with httpx.AsyncClient(base_url=options['base_url'], timeout=options['timeout'], limits=limits) as client:
+            pool = {'posts': deque(maxlen=1000), 'authors': deque(maxlen=1000)}
+            try:
+                response = await client.get('/api/posts/', params={'size': 100})
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                raise CommandError(f"Cannot reach {options['base_url']}: {e}")
+            posts = response.json()['posts']
+            if not posts:
+                raise CommandError("The server has no posts; run 'manage.py seed_social_graph' first")
+            for post in posts:
+                pool['posts'].append(post['id'])
+                pool['authors'].append(post['author'])
+
+            recorder = Recorder()
+            users = [
+                VirtualUser(client, recorder, random.Random(f"{options['seed']}:{i}"), options, pool)
+                for i in range(options['concurrency'])
+            ]
+            if not all(await asyncio.gather(*(user.setup() for user in users))):
+                raise CommandError(
+                    "Seeded users could not log in; check --prefix, --password and --users against seed_social_graph"
+                )
+            started_at = datetime.now(timezone.utc)
+            started = time.monotonic()
+            deadline = started + options['duration']
+            await asyncio.gather(*(user.run(mix, deadline) for user in users))
+            elapsed = time.monotonic() - started
+
+        endpoints = {name: stats.as_dict(elapsed) for name, stats in sorted(recorder.endpoints.items())}
+        total = sum(e['requests'] for e in endpoints.values())
+        errors = sum(e['errors'] for e in endpoints.values())
+        return {
+            'meta': {
+                'label': options['label'],
+                'base_url': options['base_url'],
+                'started_at': started_at.isoformat(),
+                'duration_s': round(elapsed, 2),
+                'concurrency': options['concurrency'],
+                'mix': mix,
+                'burst': options['burst'],
+                'scroll_pages': options['scroll_pages'],
+                'seed': options['seed'],
+            },
+            'totals': {
+                'requests': total,
+                'errors': errors,
+                'error_rate': round(errors / total, 4) if total else 0.0,
+                'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+            },
+            'scenarios': recorder.scenarios,
+            'endpoints': endpoints,
+        }
+
+    def print_report(self, report):
+        totals = report['totals']
+        self.stdout.write(
+            f"{totals['requests']} requests in {report['meta']['duration_s']}s "
+            f"({totals['throughput_rps']} req/s, {totals['error_rate']:.2%} errors)"
+        )
+        self.stdout.write(f"{'endpoint':<28}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>8}")
+        for name, row in report['endpoints'].items():
+            latency = row['latency_ms']
+            self.stdout.write(
+                f"{name:<28}{row['requests']:>8}{row['throughput_rps']:>9}"
+                f"{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}{row['error_rate']:>8.2%}"
+            )
+        if totals['errors']:
+            self.stdout.write(self.style.WARNING(f"{totals['errors']} requests failed"))
+
+    def print_comparison(self, before, after):
+        """Relative change per endpoint; negative latency deltas are improvements."""
+        def delta(old, new):
+            return f"{(new - old) / old:+.1%}" if old else 'n/a'
+
+        self.stdout.write(f"\nvs {before['meta'].get('label') or 'baseline'} ({before['meta']['started_at']})")
+        self.stdout.write(f"{'endpoint':<28}{'rps':>10}{'p50':>10}{'p95':>10}")
+        for name, new in after['endpoints'].items():
+            old = before['endpoints'].get(name)
+            if old is None:
+                continue
+            self.stdout.write(
+                f"{name:<28}{delta(old['throughput_rps'], new['throughput_rps']):>10}"
+                f"{delta(old['latency_ms']['p50'], new['latency_ms']['p50']):>10}"
+                f"{delta(old['latency_ms']['p95'], new['latency_ms']['p95']):>10}"
+            )
@@ -0,0 +1,57 @@
+import mimetypes
+import os
+import posixpath
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import storage
+
+
+class Command(BaseCommand):
+    help = ("Copy files saved under MEDIA_ROOT before MediaStorage became the default to the MEDIA_STORAGE "
+            "backend, keeping their names so the rows that refer to them stay valid.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('folders', nargs='*', default=['post_images'],
+                            help='Folders under MEDIA_ROOT to copy (default: post_images)')
+        parser.add_argument('--delete-local', action='store_true',
+                            help='Remove each local file once the backend has it, so its URL moves to the backend')
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be copied')
+
+    def handle(self, *args, **options):
+        backend = storage.get_backend()
+        if isinstance(backend, storage.LocalBackend):
+            raise CommandError("MEDIA_STORAGE is the local backend already; there is nothing to copy")
+        local = storage.LocalBackend()
+        chunk_size = storage.config('CHUNK_SIZE')
+
+        copied = present = 0
+        for name in self.local_names(local, options['folders']):
+            if backend.exists(name):
+                present += 1
+            elif options['dry_run']:
+                self.stdout.write(f"  would copy {name}")
+                copied += 1
+                continue
+            else:
+                with local.open(name) as f:
+                    backend.save(name, iter(lambda: f.read(chunk_size), b''), mimetypes.guess_type(name)[0],
+                                 size=os.fstat(f.fileno()).st_size)
+                copied += 1
+            if options['delete_local'] and not options['dry_run']:
+                local.delete(name)
+
+        verb = 'Would copy' if options['dry_run'] else 'Copied'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {copied} files; {present} were already in the backend."))
+
+    @staticmethod
+    def local_names(local, folders):
+        for folder in folders:
+            root = local.path(folder)
+            for directory, _, files in os.walk(root):
+                for filename in sorted(files):
+                    # temp files of a save in progress
+                    if filename.startswith('.upload-'):
+                        continue
+                    path = os.path.join(directory, filename)
+                    yield posixpath.join(folder, os.path.relpath(path, root).replace(os.sep, '/'))
@@ -0,0 +1,104 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from PIL import Image, UnidentifiedImageError
+
+from api import images
+from api.storage import StorageError
+from api.models import PostModel
+
+
+def _init_worker():
+    # a no-op after fork; needed when workers are spawned
+    django.setup()
+    connections.close_all()
+
+
+def _render(data):
+    """Runs in a worker: the variants, or the error message for an unreadable image."""
+    try:
+        return images.render(data), None
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        return None, str(e)
+
+
+class Command(BaseCommand):
+    help = "Render the WebP/JPEG variants of post images in a process pool (backfills and reprocessing)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('post_ids', nargs='*', type=int,
+                            help='Only these posts (default: every post with an image and no variants)')
+        parser.add_argument('--all', action='store_true',
+                            help='Reprocess posts that already have variants, e.g. after changing IMAGE_VARIANTS')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes for decoding and encoding (default: CPU count)')
+        parser.add_argument('--batch-size', type=int, default=64,
+                            help='Images read into memory and handed to the pool at a time (default: 64)')
+
+    def handle(self, *args, **options):
+        posts = PostModel.objects.exclude(image='').exclude(image__isnull=True)
+        if options['post_ids']:
+            posts = posts.filter(id__in=options['post_ids'])
+        elif not options['all']:
+            posts = posts.filter(image_variants={})
+        posts = posts.order_by('id').only('id', 'image')
+
+        workers = max(1, options['workers'])
+        batch_size = max(1, options['batch_size'])
+        started = time.monotonic()
+        totals = {'processed': 0, 'unreadable': 0, 'changed': 0, 'missing': 0, 'in_bytes': 0, 'out_bytes': 0}
+
+        pool = None
+        if workers > 1:
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        try:
+            last_id = 0
+            while True:
+                # walk the primary key; processed rows drop out of the default filter
+                batch = list(posts.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                self.process_batch(batch, pool, totals)
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"  {totals['processed']:,} images ({totals['processed'] / elapsed:.1f}/s)")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.monotonic() - started
+        ratio = totals['out_bytes'] / totals['in_bytes'] if totals['in_bytes'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {totals['processed']:,} images in {elapsed:.1f}s with {workers} worker(s); "
+            f"variants total {ratio:.0%} of the originals' size. "
+            f"Skipped: {totals['unreadable']} unreadable, {totals['missing']} missing files, "
+            f"{totals['changed']} changed while processing."
+        ))
+
+    def process_batch(self, batch, pool, totals):
+        originals = []
+        for post in batch:
+            try:
+                originals.append((post, images.read(post)))
+            except (FileNotFoundError, StorageError):
+                totals['missing'] += 1
+                self.stderr.write(f"Post {post.id}: {post.image.name} not found in storage")
+
+        datas = [data for _, data in originals]
+        results = pool.map(_render, datas) if pool is not None else map(_render, datas)
+        for (post, data), (rendered, error) in zip(originals, results):
+            if error:
+                totals['unreadable'] += 1
+                self.stderr.write(f"Post {post.id}: {error}")
+                continue
+            if images.store(post, rendered) is None:
+                totals['changed'] += 1
+                continue
+            totals['processed'] += 1
+            totals['in_bytes'] += len(data)
+            totals['out_bytes'] += sum(len(v[fmt]) for v in rendered.values() for fmt in images.FORMATS)
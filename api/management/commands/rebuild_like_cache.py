@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from api import likes
+
+
+class Command(BaseCommand):
+    help = "Flush buffered like toggles to the database, then rebuild the Redis like state from LikeModel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('post_ids', nargs='*', type=int,
+                            help='Only rebuild these posts (default: drop all cached state)')
+        parser.add_argument('--warm', action='store_true',
+                            help='Reload the given posts immediately instead of on next access')
+
+    def handle(self, *args, **options):
+        result = likes.flush()
+        if result is None:
+            self.stderr.write(self.style.WARNING("Another flush is running; pending likes were not flushed."))
+        else:
+            self.stdout.write(f"Flushed pending likes: {result['created']} created, {result['deleted']} deleted.")
+
+        post_ids = options['post_ids']
+        if post_ids:
+            for post_id in post_ids:
+                likes.forget(post_id)
+                if options['warm']:
+                    likes.load(post_id)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt like state for {len(post_ids)} posts."))
+        else:
+            removed = likes.drop_all()
+            self.stdout.write(self.style.SUCCESS(f"Dropped {removed} cached keys; state reloads on next access."))
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api import counters
+from api.models import UserModel, PostModel
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized post and user counters from the source tables and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows checked per batch (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted rows without writing them')
+        parser.add_argument('--only', choices=['posts', 'users'],
+                            help='Reconcile only post or only user counters')
+
+    def handle(self, *args, **options):
+        targets = {
+            'posts': (PostModel, counters.POST_COUNTERS),
+            'users': (UserModel, counters.USER_COUNTERS),
+        }
+        for label, (model, spec) in targets.items():
+            if options['only'] and options['only'] != label:
+                continue
+            self._reconcile(label, model, spec, options)
+
+    def _reconcile(self, label, model, spec, options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        fields = list(spec)
+
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            # Walk the primary key so each batch is an index range scan
+            rows = list(
+                model.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', *fields)[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            ids = [row.id for row in rows]
+
+            real = {field: counters.counts(field, spec, ids) for field in fields}
+
+            drifted = []
+            for row in rows:
+                changed = False
+                for field in fields:
+                    value = real[field].get(row.id, 0)
+                    if getattr(row, field) != value:
+                        setattr(row, field, value)
+                        changed = True
+                if changed:
+                    drifted.append(row)
+
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    model.objects.bulk_update(drifted, fields)
+
+            checked += len(rows)
+            fixed += len(drifted)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"checked {checked} {label}, {fixed} drifted")
+
+        action = 'would fix' if dry_run else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f"Done: {checked} {label} checked, {action} {fixed}."))
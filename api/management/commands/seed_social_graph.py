@@ -0,0 +1,330 @@
+import random
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.models import UserModel, PostModel, CommentModel, LikeModel, FollowModel
+from api.management.commands._seed_worker import init_worker
+
+# Pareto shape for per-user/per-post counts: a long tail with a finite mean
+PARETO_ALPHA = 2.0
+# Zipf exponent for who gets followed: a handful of accounts collect most follows
+ZIPF_EXPONENT = 1.0
+# Users per unit of work. Fixed (not derived from --workers) so that a given
+# --seed produces the same rows however many processes generate them.
+SHARD_USERS = 500
+
+WORDS = (
+    'great', 'post', 'love', 'this', 'agree', 'nice', 'photo', 'thanks', 'for', 'sharing',
+    'so', 'true', 'wow', 'cool', 'amazing', 'interesting', 'read', 'today', 'weekend', 'coffee',
+)
+
+# Filled in by the parent and handed to each worker process once, by
+# _seed_worker.init_worker, instead of being pickled per task
+_graph = {}
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create store the generated ``created_at``/``updated_at`` values.
+
+    ``auto_now``/``auto_now_add`` would otherwise stamp every row with the
+    same instant, which makes feeds and keyset pagination unrealistically flat.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Generator:
+    """Row generation for one shard of users, with its own deterministic RNG."""
+
+    def __init__(self, phase, shard):
+        self.options = _graph['options']
+        self.rng = random.Random(f"{self.options['seed']}:{phase}:{shard}")
+        self.now = _graph['now']
+        self.window = timedelta(days=self.options['days']).total_seconds()
+        self.chunk_size = self.options['chunk_size']
+        self.written = 0
+
+    def skewed(self, mean, cap):
+        """Long-tailed non-negative integer with (roughly) the given mean."""
+        value = mean * (self.rng.paretovariate(PARETO_ALPHA) - 1) * (PARETO_ALPHA - 1)
+        return min(int(round(value)), cap)
+
+    def timestamp(self, after=None):
+        start = after or self.now - timedelta(seconds=self.window)
+        span = max((self.now - start).total_seconds(), 0)
+        return start + timedelta(seconds=self.rng.random() * span)
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def write(self, model, rows, **kwargs):
+        if rows:
+            with transaction.atomic():
+                model.objects.bulk_create(rows, batch_size=self.chunk_size, **kwargs)
+            self.written += len(rows)
+        return []
+
+    def follows(self, followers):
+        """Followees are drawn from a Zipf popularity ranking; out-degree is Pareto."""
+        by_popularity, cum_weights = _graph['by_popularity'], _graph['cum_weights']
+        n, total = len(by_popularity), cum_weights[-1]
+        mean = self.options['follows_per_user']
+        rows = []
+        for follower in followers:
+            degree = self.skewed(mean, n - 1)
+            followees = set()
+            # rejection sampling; bounded so a tiny graph cannot spin forever
+            for _ in range(degree * 3):
+                if len(followees) >= degree:
+                    break
+                followee = by_popularity[bisect_right(cum_weights, self.rng.random() * total)]
+                if followee != follower:
+                    followees.add(followee)
+            for followee in followees:
+                rows.append(FollowModel(follower_id=follower, following_id=followee, created_at=self.timestamp()))
+            if len(rows) >= self.chunk_size:
+                rows = self.write(FollowModel, rows, ignore_conflicts=True)
+        self.write(FollowModel, rows, ignore_conflicts=True)
+
+    def posts(self, authors):
+        mean = self.options['posts_per_user']
+        rows = []
+        for author in authors:
+            for _ in range(self.skewed(mean, 10 * int(mean) + 100)):
+                created_at = self.timestamp()
+                rows.append(PostModel(author_id=author, content=self.text(3, 30),
+                                      created_at=created_at, updated_at=created_at))
+            if len(rows) >= self.chunk_size:
+                rows = self.write(PostModel, rows)
+        self.write(PostModel, rows)
+
+    def engagement(self, authors):
+        """Likes and comments; posts by accounts with more followers draw more of both."""
+        user_ids, followers = _graph['user_ids'], _graph['followers']
+        n = len(user_ids)
+        mean_followers = _graph['mean_followers']
+        likes_mean = self.options['likes_per_post']
+        comments_mean = self.options['comments_per_post']
+        posts = (
+            PostModel.objects.filter(author_id__in=authors, id__gt=_graph['first_post_id'])
+            .order_by('id').values_list('id', 'author_id', 'created_at')
+        )
+        likes, comments = [], []
+        for post_id, author_id, created_at in posts.iterator(chunk_size=self.chunk_size):
+            reach = ((followers.get(author_id, 0) + 1) / (mean_followers + 1)) ** 0.5
+            for user_id in set(self.rng.choices(user_ids, k=self.skewed(likes_mean * reach, n))):
+                likes.append(LikeModel(post_id=post_id, user_id=user_id,
+                                       created_at=self.timestamp(after=created_at)))
+            for _ in range(self.skewed(comments_mean * reach, 10 * int(comments_mean) + 100)):
+                comments.append(CommentModel(post_id=post_id, author_id=self.rng.choice(user_ids),
+                                             text=self.text(1, 15), created_at=self.timestamp(after=created_at)))
+            if len(likes) >= self.chunk_size:
+                likes = self.write(LikeModel, likes, ignore_conflicts=True)
+            if len(comments) >= self.chunk_size:
+                comments = self.write(CommentModel, comments)
+        self.write(LikeModel, likes, ignore_conflicts=True)
+        self.write(CommentModel, comments)
+
+
+def run_shard(phase, shard, user_ids):
+    """Generate one shard's rows; returns how many were written."""
+    with explicit_timestamps(FollowModel, PostModel, LikeModel, CommentModel):
+        generator = Generator(phase, shard)
+        getattr(generator, phase)(user_ids)
+    return generator.written
+
+
+def _close_connections():
+    # each worker process opens its own database connection
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic social graph for load testing: users, a power-law follow "
+        "graph, and posts, likes and comments with a long-tailed distribution."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--follows-per-user', type=float, default=20,
+                            help='Mean follows per user (default: 20)')
+        parser.add_argument('--posts-per-user', type=float, default=10,
+                            help='Mean posts per user (default: 10)')
+        parser.add_argument('--likes-per-post', type=float, default=5,
+                            help='Mean likes per post (default: 5)')
+        parser.add_argument('--comments-per-post', type=float, default=1,
+                            help='Mean comments per post (default: 1)')
+        parser.add_argument('--days', type=int, default=30,
+                            help='Spread content over this many days (default: 30)')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed; the same seed produces the same graph')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows per bulk_create/transaction (default: 5000)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Generator processes (needs a database with concurrent writers, e.g. PostgreSQL)')
+        parser.add_argument('--prefix', default='seed',
+                            help='Username/email prefix of generated users (default: seed)')
+        parser.add_argument('--password', default='Seed!pass123',
+                            help='Password every generated user can log in with')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['users'] < 2:
+            raise CommandError("--users must be at least 2")
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            raise CommandError("SQLite allows a single writer; use --workers 1")
+        if UserModel.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Users with prefix '{prefix}' already exist; pick another --prefix")
+
+        started = time.monotonic()
+        rng = random.Random(options['seed'])
+        _graph.update(options=options, now=timezone.now())
+
+        user_ids = self.create_users(rng, prefix, options['users'], options['password'])
+        by_popularity = user_ids[:]
+        rng.shuffle(by_popularity)
+        _graph.update(
+            user_ids=user_ids,
+            by_popularity=by_popularity,
+            cum_weights=list(accumulate(1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(len(user_ids)))),
+            first_post_id=PostModel.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+        )
+        shards = [user_ids[i:i + SHARD_USERS] for i in range(0, len(user_ids), SHARD_USERS)]
+
+        self.run_phase('follows', shards, options['workers'])
+        self.run_phase('posts', shards, options['workers'])
+        self.refresh_counters(UserModel, user_ids[0], user_ids[-1], {
+            'followers_count': (FollowModel, 'following'),
+            'following_count': (FollowModel, 'follower'),
+            'posts_count': (PostModel, 'author'),
+        })
+
+        followers = dict(
+            UserModel.objects.filter(id__gte=user_ids[0], id__lte=user_ids[-1])
+            .values_list('id', 'followers_count')
+        )
+        _graph.update(followers=followers, mean_followers=sum(followers.values()) / len(followers))
+        self.run_phase('engagement', shards, options['workers'], label='likes + comments')
+        last_post_id = PostModel.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        self.refresh_counters(PostModel, _graph['first_post_id'] + 1, last_post_id, {
+            'likes_count': (LikeModel, 'post'),
+            'comments_count': (CommentModel, 'post'),
+        })
+
+        threshold = getattr(settings, 'HOME_TIMELINE_PULL_THRESHOLD', 10000)
+        UserModel.objects.filter(id__gte=user_ids[0], id__lte=user_ids[-1]).update(
+            is_pull_author=ExpressionWrapper(Q(followers_count__gte=threshold), output_field=BooleanField())
+        )
+        pull_authors = UserModel.objects.filter(is_pull_author=True).count()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.monotonic() - started:.1f}s ({pull_authors} pull authors). "
+            f"Run 'manage.py rebuild_like_cache' if Redis holds like state from an earlier dataset."
+        ))
+
+    def create_users(self, rng, prefix, count, password):
+        # hash once and reuse: the work factor is deliberately slow
+        template = UserModel()
+        template.set_password(password)
+
+        progress = Progress(self.stdout, 'users', count)
+        chunk_size = _graph['options']['chunk_size']
+        for start in range(0, count, chunk_size):
+            rows = [
+                UserModel(
+                    username=f"{prefix}{i}",
+                    email=f"{prefix}{i}@example.com",
+                    password=template.password,
+                    profile_info=' '.join(rng.choices(WORDS, k=rng.randint(0, 8))),
+                )
+                for i in range(start, min(start + chunk_size, count))
+            ]
+            with transaction.atomic():
+                UserModel.objects.bulk_create(rows, batch_size=chunk_size)
+            progress.advance(len(rows))
+        progress.done()
+        return list(
+            UserModel.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True)
+        )
+
+    def run_phase(self, phase, shards, workers, label=None):
+        progress = Progress(self.stdout, label or phase, None)
+        if workers <= 1:
+            for shard, user_ids in enumerate(shards):
+                progress.advance(run_shard(phase, shard, user_ids))
+        else:
+            _close_connections()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(_graph,)) as pool:
+                futures = [pool.submit(run_shard, phase, shard, user_ids) for shard, user_ids in enumerate(shards)]
+                for future in futures:
+                    progress.advance(future.result())
+        progress.done()
+
+    def refresh_counters(self, model, first_id, last_id, counters):
+        """Set-based counter update over the generated id range, one chunk per transaction."""
+        step = _graph['options']['chunk_size']
+        updates = {}
+        for field, (source, fk) in counters.items():
+            rows = (
+                source.objects.filter(**{fk: OuterRef('pk')})
+                .order_by()
+                .values(fk)
+                .annotate(c=Count('pk'))
+                .values('c')
+            )
+            updates[field] = Coalesce(Subquery(rows), Value(0))
+
+        progress = Progress(self.stdout, f"{model.__name__} counters", None)
+        for low in range(first_id, last_id + 1, step):
+            with transaction.atomic():
+                progress.advance(model.objects.filter(id__gte=low, id__lt=low + step).update(**updates))
+        progress.done()
+
+
+class Progress:
+    """Prints '<label>: written [/ expected] (rows/s)' at most once a second."""
+
+    def __init__(self, stdout, label, expected):
+        self.stdout = stdout
+        self.label = label
+        self.expected = expected
+        self.written = 0
+        self.started = self.last = time.monotonic()
+
+    def advance(self, rows):
+        self.written += rows
+        now = time.monotonic()
+        if now - self.last >= 1:
+            self.last = now
+            total = f" / {self.expected:,}" if self.expected else ""
+            self.stdout.write(f"  {self.label}: {self.written:,}{total} ({self.rate():,.0f} rows/s)")
+
+    def rate(self):
+        return self.written / max(time.monotonic() - self.started, 1e-9)
+
+    def done(self):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f"{self.label}: {self.written:,} rows in {elapsed:.1f}s ({self.rate():,.0f} rows/s)")
@@ -0,0 +1,347 @@
+"""In-process request metrics, exported at ``/metrics`` in the Prometheus text format.
+
+``RequestLogMiddleware`` feeds the metrics defined at the bottom of this
+module: latency histograms and status counters per resolved URL name (never
+the raw path, so ``/api/posts/<id>/`` is one series), the number of requests
+in flight, and database query counts and time. The two-tier cache's hit/miss
+totals and the number of log records dropped by ``api.log_handlers`` are
+copied in whenever a snapshot is taken. Hit rates are left to
+PromQL, e.g. ``rate(hot_cache_lookups_total{result!="miss"}[5m]) /
+rate(hot_cache_lookups_total[5m])``.
+
+Updating a metric is a dict update under a lock. Nothing leaves the process
+on the request path: the multi-process file below is written by a
+background thread.
+
+With several worker processes (gunicorn), set ``METRICS_MULTIPROC_DIR`` to a
+directory shared by the workers and empty it before the server starts. Each
+process then writes its totals to ``metrics-<pid>.json`` there, from a daemon
+thread every ``METRICS_FLUSH_INTERVAL`` seconds and when it exits. Whichever worker
+serves ``/metrics`` sums every file together with its own live state.
+Counters and histograms of exited workers are kept so totals never go
+backwards. Gauges only count live processes.
+
+If ``METRICS_TOKEN`` is set, ``/metrics`` requires ``Authorization: Bearer <token>``.
+"""
+import atexit
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import log_handlers
+from .cache import hot_cache
+
+logger = logging.getLogger("api")
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """A metric family: one value per tuple of label values."""
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def describe(self):
+        return {'type': self.type, 'help': self.documentation, 'labels': list(self.labelnames)}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, labels, value):
+        """Overwrite a total that is tracked elsewhere (see ``Registry.add_collector``)."""
+        with self._lock:
+            self._values[labels] = value
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Stored as ``[count per bucket..., count above the last bucket, sum]``."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), list(row)] for labels, row in self._values.items()]
+
+    def describe(self):
+        return {**super().describe(), 'buckets': list(self.buckets)}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._flusher_pid = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def add_collector(self, collector):
+        """Run ``collector()`` before every snapshot, to copy in totals kept elsewhere."""
+        self.collectors.append(collector)
+
+    def snapshot(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        return {name: {**metric.describe(), 'samples': metric.samples()} for name, metric in self.metrics.items()}
+
+    # ----- multi-process -----
+
+    def directory(self):
+        return getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+
+    def ensure_flusher(self):
+        """Start the thread that writes this process's file; a no-op once it runs."""
+        # one writer per process; forked workers start their own
+        pid = os.getpid()
+        if self._flusher_pid == pid or not self.directory():
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+        threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0))
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Metrics flush failed: {e}")
+
+    def flush(self):
+        directory = self.directory()
+        if not directory:
+            return
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        try:
+            with open(f"{path}.tmp", 'w') as f:
+                json.dump(self.snapshot(), f)
+            # atomic, so a concurrent scrape never reads half a file
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics file {path}: {e}")
+
+    def collect(self):
+        """This process's live snapshot merged with every other process's last file."""
+        merged = self.snapshot()
+        directory = self.directory()
+        if not directory:
+            return merged
+        own = f"metrics-{os.getpid()}.json"
+        try:
+            names = [n for n in os.listdir(directory) if n.startswith('metrics-') and n.endswith('.json')]
+        except OSError as e:
+            logger.warning(f"Could not list metrics directory {directory}: {e}")
+            return merged
+        for filename in names:
+            if filename == own:
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    other = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(int(filename[len('metrics-'):-len('.json')]))
+            _merge(merged, other, include_gauges=alive)
+        return merged
+
+    def render(self):
+        return render(self.collect())
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(into, other, include_gauges):
+    for name, family in other.items():
+        if family['type'] == 'gauge' and not include_gauges:
+            continue
+        target = into.setdefault(name, {**family, 'samples': []})
+        samples = {tuple(sample[0]): sample for sample in target['samples']}
+        for labels, value in family['samples']:
+            sample = samples.get(tuple(labels))
+            if sample is None:
+                target['samples'].append([labels, value])
+                samples[tuple(labels)] = target['samples'][-1]
+            elif isinstance(value, list):
+                sample[1] = [a + b for a, b in zip(sample[1], value)]
+            else:
+                sample[1] += value
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(families):
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, family in sorted(families.items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        names = family['labels']
+        for labels, value in sorted(family['samples']):
+            if family['type'] != 'histogram':
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(family['buckets'], value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(names, labels, [('le', bound)])} {cumulative}")
+            cumulative += value[-2]
+            lines.append(f"{name}_bucket{_labels(names, labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+    """Counts and times the queries run on every database connection inside ``track()``."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+    def track(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+def observe_request(method, route, status, seconds, queries):
+    """Record one finished request; ``queries`` is the ``QueryTimer`` that wrapped it."""
+    REQUEST_DURATION.observe((method, route), seconds)
+    REQUESTS.inc((method, route, str(status)))
+    if queries.count:
+        DB_QUERIES.inc((route,), queries.count)
+        DB_TIME.inc((route,), queries.seconds)
+    REGISTRY.ensure_flusher()
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        supplied = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def _collect_hot_cache():
+    stats = hot_cache.stats()
+    for result, key in (('local_hit', 'local_hits'), ('remote_hit', 'remote_hits'), ('miss', 'misses')):
+        CACHE_LOOKUPS.set((result,), stats[key])
+    CACHE_ENTRIES.set((), stats['local_entries'])
+
+
+def _collect_log_drops():
+    LOG_DROPS.set((), log_handlers.dropped_records())
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Request latency by route.', ('method', 'route'))
+REQUESTS = Counter(
+    'http_requests_total', 'Requests by route and status code.', ('method', 'route', 'status'))
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being handled.')
+DB_QUERIES = Counter(
+    'db_queries_total', 'Database queries by route.', ('route',))
+DB_TIME = Counter(
+    'db_query_duration_seconds_total', 'Time spent in database queries by route.', ('route',))
+CACHE_LOOKUPS = Counter(
+    'hot_cache_lookups_total', 'Two-tier cache key lookups by result (local_hit, remote_hit, miss).', ('result',))
+CACHE_ENTRIES = Gauge(
+    'hot_cache_local_entries', 'Entries in the per-process cache tier.')
+LOG_DROPS = Counter(
+    'log_records_dropped_total', 'Log records dropped because the log queue was full.')
+
+REGISTRY.add_collector(_collect_hot_cache)
+REGISTRY.add_collector(_collect_log_drops)
+atexit.register(REGISTRY.flush)
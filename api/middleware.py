@@ -1,32 +1,106 @@
 import logging
 import time
 
+from django.db import connections
+
+from . import flamegraph, metrics, profiling
+from .jwt_provider import get_user_from_payload, verify_access_token
+
 logger = logging.getLogger("api")
 
+
+def is_staff(request):
+    """Whether the bearer token belongs to an active staff user.
+
+    Middleware runs before DRF authentication, so the token is read directly.
+    """
+    keyword, _, token = request.headers.get('Authorization', '').partition(' ')
+    if keyword.lower() != 'bearer' or not token:
+        return False
+    payload = verify_access_token(token.strip())
+    if payload is None:
+        return False
+    user = get_user_from_payload(payload)
+    return bool(user and user.is_active and user.is_staff)
+
+
 class RequestLogMiddleware:
+    """Logs every request and records it in ``api.metrics``.
+
+    Staff can ask for a flame graph of an ``/api/`` request with the
+    ``REQUEST_PROFILER['HEADER']`` header (see ``api.flamegraph``).
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        start_time = time.time()
-
-        response = self.get_response(request)
+        start_time = time.perf_counter()
+        queries = metrics.QueryTimer()
+        metrics.IN_FLIGHT.inc()
+        try:
+            with queries.track():
+                if flamegraph.wants_profile(request) and is_staff(request):
+                    response = flamegraph.profile_request(self.get_response, request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            metrics.IN_FLIGHT.dec()
 
-        duration = round(time.time() - start_time, 3)
+        duration = time.perf_counter() - start_time
+        route = self.get_route(request)
+        metrics.observe_request(request.method, route, response.status_code, duration, queries)
 
         ip = self.get_client_ip(request)
 
         logger.info(
             f"{request.method} {request.path} "
             f"STATUS={response.status_code} "
-            f"DURATION={duration}s",
-            extra={"ip": ip},
+            f"DURATION={round(duration, 3)}s",
+            extra={
+                "ip": ip,
+                "method": request.method,
+                "path": request.path,
+                "route": route,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 2),
+            },
         )
 
         return response
 
+    def get_route(self, request):
+        # the URL name keeps /posts/1/ and /posts/2/ in one series
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.url_name or match.view_name or 'unnamed'
+
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
         if x_forwarded_for:
             return x_forwarded_for.split(",")[0]
         return request.META.get("REMOTE_ADDR")
+
+
+class ProfilingMiddleware:
+    """Profiles SQL, cache and storage time for staff requests that ask for it (see ``api.profiling``)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.headers.get(profiling.HEADER) or not is_staff(request):
+            return self.get_response(request)
+
+        with profiling.profile(connections.all()) as profile:
+            response = self.get_response(request)
+
+        response['Server-Timing'] = profile.server_timing()
+        summary = profile.summary()
+        logger.info(
+            f"SQL profile {request.method} {request.path}: {len(profile.queries)} queries, "
+            f"{len(summary)} distinct, {profile.timings['db'] * 1000:.1f} ms",
+            extra={"server_timing": response['Server-Timing'], "queries": summary[:profiling.SUMMARY_SIZE]},
+        )
+        return response
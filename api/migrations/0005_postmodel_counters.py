@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    PostModel = apps.get_model('api', 'PostModel')
+    LikeModel = apps.get_model('api', 'LikeModel')
+    CommentModel = apps.get_model('api', 'CommentModel')
+
+    def count_of(model):
+        rows = (
+            model.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(c=Count('pk'))
+            .values('c')
+        )
+        return Coalesce(Subquery(rows), Value(0))
+
+    PostModel.objects.update(
+        likes_count=count_of(LikeModel),
+        comments_count=count_of(CommentModel),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_usermodel_deleted_at_usermodel_is_active_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmodel',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='postmodel',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
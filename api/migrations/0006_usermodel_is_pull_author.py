@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_postmodel_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermodel',
+            name='is_pull_author',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_usermodel_is_pull_author'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commentmodel',
+            index=models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followmodel',
+            index=models.Index(fields=['following', '-created_at', '-id'], name='follow_following_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followmodel',
+            index=models.Index(fields=['follower', '-created_at', '-id'], name='follow_follower_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='likemodel',
+            index=models.Index(fields=['post', '-created_at', '-id'], name='like_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postmodel',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postmodel',
+            index=models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usermodel',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='user_active_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:04
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    UserModel = apps.get_model('api', 'UserModel')
+    PostModel = apps.get_model('api', 'PostModel')
+    FollowModel = apps.get_model('api', 'FollowModel')
+
+    def count_of(model, field):
+        rows = (
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(c=Count('pk'))
+            .values('c')
+        )
+        return Coalesce(Subquery(rows), Value(0))
+
+    UserModel.objects.update(
+        followers_count=count_of(FollowModel, 'following'),
+        following_count=count_of(FollowModel, 'follower'),
+        posts_count=count_of(PostModel, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermodel',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usermodel',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usermodel',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_usermodel_is_staff'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmodel',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
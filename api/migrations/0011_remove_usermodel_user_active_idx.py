@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_postmodel_image_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='usermodel',
+            name='user_active_idx',
+        ),
+    ]
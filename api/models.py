@@ -1,8 +1,23 @@
 from django.db import models
+from django.db.models import F
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password, check_password
+from .user_cache import invalidate_user_snapshot
 
-class UserModel(models.Model):
+
+class CounterModel(models.Model):
+    """Base for models carrying denormalized counter columns."""
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def adjust_counter(cls, pk, field, delta):
+        """Atomically add ``delta`` to a counter column without reading the row"""
+        cls.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+class UserModel(CounterModel):
     username = models.CharField(max_length=150, unique=True)
     email = models.EmailField(unique=True)
     password = models.CharField(max_length=128)
@@ -10,10 +25,28 @@ class UserModel(models.Model):
     photo_url = models.URLField(blank=True, null=True)
 
     is_active = models.BooleanField(default=True)
+    # Staff may request diagnostics such as the SQL profiler (api/profiling.py)
+    is_staff = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    # High-follower accounts are not fanned out on write; followers pull
+    # their posts at read time instead (see api/timeline.py)
+    is_pull_author = models.BooleanField(default=False)
+
+    # Denormalized counters, kept in step with FollowModel/PostModel rows
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+
     def set_password(self, raw_password):
         self.password = make_password(raw_password)
+        if self.pk:
+            invalidate_user_snapshot(self.pk)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # drop the cached auth snapshot so the next request sees the change
+        invalidate_user_snapshot(self.pk)
 
     def check_password(self, raw_password):
         return check_password(raw_password, self.password)
@@ -23,18 +56,26 @@ class UserModel(models.Model):
         self.is_active = False
         self.deleted_at = timezone.now()
         self.save(update_fields=["is_active", "deleted_at"])
+        self._recount()
 
     def ban(self):
         """Admin ban (NOT deletion)"""
         self.is_active = False
         self.deleted_at = None
         self.save(update_fields=["is_active", "deleted_at"])
+        self._recount()
 
     def restore(self):
         """Restore account"""
         self.is_active = True
         self.deleted_at = None
         self.save(update_fields=["is_active", "deleted_at"])
+        self._recount()
+
+    def _recount(self):
+        # counters count active accounts only (api/counters.py)
+        from .counters import recount_for_user
+        recount_for_user(self.pk)
 
     @property
     def is_authenticated(self):
@@ -47,7 +88,7 @@ class UserModel(models.Model):
     def __str__(self):
         return self.username
 
-class PostModel(models.Model):
+class PostModel(CounterModel):
     author = models.ForeignKey(
         UserModel,
         on_delete=models.PROTECT,   
@@ -55,9 +96,21 @@ class PostModel(models.Model):
     )
     content = models.TextField(blank=True)
     image=models.ImageField(upload_to='post_images/', blank=True, null=True)
+    # resized WebP/JPEG renditions of ``image``, filled in by api.images
+    image_variants = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized counters, kept in step with LikeModel/CommentModel rows
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+        ]
+
     def __str__(self):
      return f"Post by {self.author.username} at {self.created_at}"
 
@@ -72,6 +125,12 @@ class CommentModel(models.Model):
     )
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
      return f"Comment by {self.author.username} on {self.post}"
 
@@ -87,6 +146,9 @@ class LikeModel(models.Model):
 
     class Meta:
         unique_together = ('post', 'user')
+        indexes = [
+            models.Index(fields=['post', '-created_at', '-id'], name='like_post_created_idx'),
+        ]
     def __str__(self):
           return f"{self.user.username} liked {self.post}"
 
@@ -98,6 +160,10 @@ class FollowModel(models.Model):
 
     class Meta:
         unique_together = ('follower', 'following')
+        indexes = [
+            models.Index(fields=['following', '-created_at', '-id'], name='follow_following_created_idx'),
+            models.Index(fields=['follower', '-created_at', '-id'], name='follow_follower_created_idx'),
+        ]
         
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
@@ -0,0 +1,210 @@
+"""Opt-in per-request profiling: SQL fingerprints, slow-query EXPLAINs and ``Server-Timing``.
+
+``ProfilingMiddleware`` turns the profiler on for a request that carries the
+``SQL_PROFILER['HEADER']`` header (``X-Profile-SQL: 1``) and a bearer token of
+an active user with ``is_staff``. Everyone else pays a single header lookup, so
+this can stay enabled in production.
+
+While a request is profiled:
+
+- every query run through Django is recorded with its fingerprint (the SQL
+  with literals and ``IN`` lists collapsed), duration and the first call site
+  inside the project;
+- a SELECT slower than ``SQL_PROFILER['SLOW_QUERY_MS']`` is logged at WARNING
+  with its EXPLAIN plan;
+- time spent in Redis (``timed()`` clients) and object storage (``span()``
+  blocks) is added up;
+- the response gets ``Server-Timing: db;dur=..;desc="N queries", cache;dur=..,
+  storage;dur=.., total;dur=..``, and a summary with the costliest fingerprints
+  is logged at INFO.
+"""
+import logging
+import re
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger("api")
+
+_config = getattr(settings, 'SQL_PROFILER', {})
+HEADER = _config.get('HEADER', 'X-Profile-SQL')
+SLOW_QUERY_MS = _config.get('SLOW_QUERY_MS', 100)
+# how many fingerprints the summary log line lists
+SUMMARY_SIZE = _config.get('SUMMARY_SIZE', 10)
+
+_PROJECT_ROOT = str(Path(settings.BASE_DIR))
+_THIS_FILE = __file__
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+_active = ContextVar('sql_profile', default=None)
+
+
+def fingerprint(sql):
+    """Normalize SQL so that the same query shape maps to the same string.
+
+    ``WHERE id IN (%s, %s, %s) LIMIT 21`` -> ``WHERE id IN (...) LIMIT ?``
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def call_site():
+    """``path:line in function`` of the innermost project frame outside this module."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_ROOT) and filename != _THIS_FILE and 'site-packages' not in filename:
+            return f"{filename[len(_PROJECT_ROOT) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class Profile:
+    """Everything recorded for one request."""
+
+    def __init__(self):
+        self.queries = []
+        self.timings = {'db': 0.0, 'cache': 0.0, 'storage': 0.0}
+        self.started = time.perf_counter()
+        self._explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self._explaining:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.timings['db'] += duration
+            entry = {
+                'fingerprint': fingerprint(sql),
+                'duration_ms': round(duration * 1000, 3),
+                'call_site': call_site(),
+            }
+            self.queries.append(entry)
+            if entry['duration_ms'] >= SLOW_QUERY_MS and not many:
+                self.log_slow_query(context['connection'], sql, params, entry)
+
+    def explain(self, connection, sql, params):
+        """EXPLAIN plan of a SELECT, or None. Runs in a savepoint so a failure cannot poison the transaction."""
+        if not sql.lstrip().upper().startswith('SELECT') or connection.needs_rollback:
+            return None
+        self._explaining = True
+        try:
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+                    return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+        finally:
+            self._explaining = False
+
+    def log_slow_query(self, connection, sql, params, entry):
+        plan = self.explain(connection, sql, params)
+        logger.warning(
+            f"Slow query ({entry['duration_ms']} ms) at {entry['call_site']}: {entry['fingerprint'][:200]}",
+            extra={'sql': sql, 'plan': plan, **entry},
+        )
+
+    def summary(self):
+        """Fingerprints ordered by total time, with how often each ran and from where."""
+        groups = {}
+        for query in self.queries:
+            group = groups.setdefault(query['fingerprint'], {
+                'fingerprint': query['fingerprint'], 'count': 0, 'total_ms': 0.0, 'call_sites': [],
+            })
+            group['count'] += 1
+            group['total_ms'] += query['duration_ms']
+            if query['call_site'] not in group['call_sites']:
+                group['call_sites'].append(query['call_site'])
+        ranked = sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)
+        for group in ranked:
+            group['total_ms'] = round(group['total_ms'], 3)
+        return ranked
+
+    def server_timing(self):
+        total = (time.perf_counter() - self.started) * 1000
+        parts = [f'db;dur={self.timings["db"] * 1000:.2f};desc="{len(self.queries)} queries"']
+        parts += [f"{name};dur={self.timings[name] * 1000:.2f}" for name in ('cache', 'storage')]
+        parts.append(f"total;dur={total:.2f}")
+        return ', '.join(parts)
+
+
+def current():
+    """The active ``Profile`` of this request, or None."""
+    return _active.get()
+
+
+@contextmanager
+def profile(connections):
+    """Profile everything run inside the block on ``connections``; yields the ``Profile``."""
+    recorder = Profile()
+    token = _active.set(recorder)
+    try:
+        with ExitStack() as stack:
+            for connection in connections:
+                stack.enter_context(connection.execute_wrapper(recorder))
+            yield recorder
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Add the time spent inside the block to ``name`` (``'cache'``/``'storage'``) of the active profile."""
+    recorder = _active.get()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.timings[name] += time.perf_counter() - start
+
+
+class _Timed:
+    """Proxy timing every call on a client, and on the pipelines and scripts it returns."""
+    __slots__ = ('_target', '_name')
+
+    def __init__(self, target, name):
+        self._target = target
+        self._name = name
+
+    def _timed(self, call, *args, **kwargs):
+        with span(self._name):
+            result = call(*args, **kwargs)
+        if callable(result) or hasattr(result, 'execute'):
+            return _Timed(result, self._name)
+        return result
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if not callable(value):
+            return value
+        return lambda *args, **kwargs: self._timed(value, *args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        return self._timed(self._target, *args, **kwargs)
+
+
+def timed(client, name='cache'):
+    """``client`` itself, or a timing proxy around it while a request is being profiled."""
+    if _active.get() is None:
+        return client
+    return _Timed(client, name)
@@ -0,0 +1,50 @@
+"""Queryset builders for the list endpoints.
+
+Each helper applies the ``select_related``/``only()`` that the serializer used
+for that list needs, derived from the serializer's own fields: a dotted
+``source`` such as ``author.username`` joins ``author`` and loads just that
+column. A page therefore costs the same number of queries whatever its size,
+and adding a field to a serializer cannot silently reintroduce an N+1.
+"""
+from functools import lru_cache
+
+from .models import PostModel, CommentModel, LikeModel, FollowModel
+from .serializers import PostSerializer, CommentSerializer, LikeSerializer, FollowSerializer
+
+
+@lru_cache(maxsize=None)
+def _plan(serializer_class):
+    """``(select_related, only)`` lookups needed to serialize without extra queries."""
+    related = set()
+    columns = {'id', 'created_at'}  # keyset pagination orders on these
+    for field in serializer_class().fields.values():
+        if field.source == '*':
+            # SerializerMethodField and friends fetch their own data
+            continue
+        parts = field.source.split('.')
+        if len(parts) > 1:
+            related.add('__'.join(parts[:-1]))
+        columns.add('__'.join(parts))
+    return tuple(sorted(related)), tuple(sorted(columns))
+
+
+def for_serializer(queryset, serializer_class):
+    """Restrict ``queryset`` to the joins and columns ``serializer_class`` reads."""
+    related, columns = _plan(serializer_class)
+    return queryset.select_related(*related).only(*columns)
+
+
+def posts(queryset=None):
+    return for_serializer(PostModel.objects.all() if queryset is None else queryset, PostSerializer)
+
+
+def comments(queryset=None):
+    return for_serializer(CommentModel.objects.all() if queryset is None else queryset, CommentSerializer)
+
+
+def likes(queryset=None):
+    return for_serializer(LikeModel.objects.all() if queryset is None else queryset, LikeSerializer)
+
+
+def follows(queryset=None):
+    return for_serializer(FollowModel.objects.all() if queryset is None else queryset, FollowSerializer)
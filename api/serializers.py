@@ -1,9 +1,11 @@
 from rest_framework import serializers
+from django.db.models.manager import BaseManager
 from .models import UserModel, PostModel, CommentModel, LikeModel, FollowModel
-from .validators import validate_password_strength
+from .validators import validate_password_strength, validate_image
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 from .errors import ErrorCode
+from .likes import liked_post_ids
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -40,24 +42,42 @@ class UserSerializer(serializers.ModelSerializer):
         validate_password_strength(value, username=username, email=email)
         return value
 
+class PostListSerializer(serializers.ListSerializer):
+    """Resolves ``liked_by_me`` for a whole page with one ``likes.liked_post_ids`` lookup."""
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, BaseManager) else data)
+        viewer = self.context.get('viewer')
+        if viewer is not None and viewer.is_authenticated:
+            self.context['liked_post_ids'] = liked_post_ids(viewer.id, [post.id for post in posts])
+        return super().to_representation(posts)
+
+
 class PostSerializer(serializers.ModelSerializer):
+    """Pass ``context={'viewer': request.user}`` to fill in ``liked_by_me``."""
     author_username=serializers.ReadOnlyField(source='author.username')
-    likes_count=serializers.SerializerMethodField()
-    comments_count=serializers.SerializerMethodField()
+    liked_by_me=serializers.SerializerMethodField()
 
     class Meta:
         model = PostModel
+        list_serializer_class = PostListSerializer
         fields = ['id', 'author', 'author_username', 
-                  'likes_count', 'comments_count', 
-                  'content', 'image', 'created_at', 'updated_at']
-        
-    @extend_schema_field(OpenApiTypes.INT)
-    def get_likes_count(self, obj) -> int:
-        return obj.likes.count()
-        
-    @extend_schema_field(OpenApiTypes.INT)
-    def get_comments_count(self, obj) -> int:
-        return obj.comments.count()
+                  'likes_count', 'comments_count', 'liked_by_me',
+                  'content', 'image', 'image_variants', 'created_at', 'updated_at']
+        # counters are maintained by the like/comment views, never by clients;
+        # variants by api.images once the upload has been processed
+        read_only_fields = ['likes_count', 'comments_count', 'image_variants']
+
+    @extend_schema_field(OpenApiTypes.BOOL)
+    def get_liked_by_me(self, obj) -> bool:
+        viewer = self.context.get('viewer')
+        if viewer is None or not viewer.is_authenticated:
+            return False
+        liked = self.context.get('liked_post_ids')
+        if liked is None:
+            # single-object serialization
+            liked = liked_post_ids(viewer.id, [obj.id])
+        return obj.id in liked
 
 class CommentSerializer(serializers.ModelSerializer):
     author_username = serializers.ReadOnlyField(source='author.username')
@@ -87,7 +107,16 @@ class PublicUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserModel
         # intentionally exclude email and password for public endpoints
-        fields = ['id', 'username', 'profile_info']
+        fields = ['id', 'username', 'profile_info', 'followers_count', 'following_count', 'posts_count']
+        read_only_fields = ['followers_count', 'following_count', 'posts_count']
+
+
+class UserStatsSerializer(serializers.ModelSerializer):
+    """Denormalized profile counters (see ``UserModel``)."""
+    class Meta:
+        model = UserModel
+        fields = ['id', 'followers_count', 'following_count', 'posts_count']
+        read_only_fields = fields
 
 
 class LoginSerializer(serializers.Serializer):
@@ -113,5 +142,22 @@ class RegisterSerializer(UserSerializer):
     class Meta(UserSerializer.Meta):
         fields = ['username', 'email', 'profile_info', 'password']
 
+class LikeStatusSerializer(serializers.Serializer):
+    post_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500,
+        help_text='Up to 500 post ids',
+    )
+
+
 class UploadPhotoSerializer(serializers.Serializer):
-    photo = serializers.ImageField()
\ No newline at end of file
+    # header checks only; serializers.ImageField would decode the whole image
+    photo = serializers.FileField(validators=[validate_image])
+
+
+class UploadSessionSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1, help_text='Total size of the file in bytes')
+    content_type = serializers.CharField(max_length=100, required=False)
+    purpose = serializers.ChoiceField(choices=['post', 'profile'], help_text='What the upload will be attached to')
@@ -1,23 +1,383 @@
+"""Media storage: pluggable backends behind content-addressed names.
+
+``MEDIA_STORAGE['BACKEND']`` picks where uploaded bytes live:
+
+- ``SupabaseBackend``: Supabase Storage over its REST API (production);
+- ``LocalBackend``: files under ``MEDIA_ROOT``, served from ``MEDIA_URL`` (local runs);
+- ``InMemoryBackend``: a dict in this process (throwaway runs, tests).
+
+Every object is named after the SHA-256 of its bytes: ``<folder>/<sha256>.<ext>``.
+Uploading the same avatar or post image again finds the object already
+stored, and no bytes are transferred. Objects never change once written, and
+several rows may point at one object. So a name can be cached forever, and
+nothing here deletes an object a row refers to.
+
+Django's ``default`` storage is ``MediaStorage``, an adapter over the same
+backend, so ``ImageField`` files (post images and their variants) are
+content-addressed too. Files saved under ``MEDIA_ROOT`` before that, while the
+backend is elsewhere, are still read and served from there until
+``manage.py migrate_media`` copies them to the backend.
+
+Supabase uploads are streamed in ``SUPABASE_STORAGE['CHUNK_SIZE']`` pieces
+straight from Django's upload file, so a worker never holds a whole image in
+memory. Uploads above ``FILE_UPLOAD_MAX_MEMORY_SIZE`` are already on disk.
+One pooled ``httpx.Client`` per process keeps connections alive, and public
+URLs are built locally.
+
+With ``SUPABASE_STORAGE['ASYNC_PROFILE_PHOTOS']``, ``spool()`` moves the upload
+into ``SPOOL_DIR`` (a rename when it is on the same filesystem as the upload
+temp dir) and the request returns. A Celery task then streams the file from
+the spool. ``SPOOL_DIR`` must be reachable from the Celery workers.
+"""
+import hashlib
+import io
+import mimetypes
+import os
+import posixpath
+import tempfile
+import threading
 import uuid
-from .supabase import supabase
+from urllib.parse import quote
+
+import httpx
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import Storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils._os import safe_join
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+from .profiling import span
+
+DEFAULTS = {
+    'BUCKET': 'media',
+    'CHUNK_SIZE': 256 * 1024,
+    'TIMEOUT': 30,
+    'MAX_CONNECTIONS': 20,
+    'ASYNC_PROFILE_PHOTOS': False,
+    'SPOOL_DIR': None,
+}
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_backend = None
+
+
+class StorageError(Exception):
+    """The backend rejected a request or could not be reached."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self):
+        return self.status is None or self.status >= 500 or self.status == 429
+
+
+def config(name):
+    return getattr(settings, 'SUPABASE_STORAGE', {}).get(name, DEFAULTS[name])
+
+
+# ===== backends =====
+
+class StorageBackend:
+    """Where media bytes live. Names are relative paths such as ``profiles/<sha256>.png``."""
+
+    def exists(self, name):
+        raise NotImplementedError
+
+    def save(self, name, chunks, content_type=None, size=None):
+        """Store ``chunks`` (an iterable of bytes) under ``name``.
+
+        Writing a name that already exists is harmless: the content is the same.
+        """
+        raise NotImplementedError
+
+    def open(self, name):
+        """A binary file object with the stored bytes."""
+        raise NotImplementedError
+
+    def size(self, name):
+        raise NotImplementedError
+
+    def delete(self, name):
+        raise NotImplementedError
+
+    def url(self, name):
+        raise NotImplementedError
+
+
+class SupabaseBackend(StorageBackend):
+    """Supabase Storage's object REST API, through the pooled ``http_client()``."""
+
+    def __init__(self, bucket=None):
+        self.bucket = bucket or config('BUCKET')
+
+    def _request(self, method, name, **kwargs):
+        with span('storage'):
+            try:
+                return http_client().request(method, f"/object/{self.bucket}/{quote(name)}", **kwargs)
+            except httpx.HTTPError as e:
+                raise StorageError(f"{method} {name} failed: {e}") from e
+
+    @staticmethod
+    def _check(response, name):
+        if response.status_code >= 300:
+            raise StorageError(f"{response.request.method} {name} failed: {response.status_code} "
+                               f"{response.text[:200]}", status=response.status_code)
+        return response
+
+    def exists(self, name):
+        response = self._request('HEAD', name)
+        # Storage answers 400 rather than 404 for some missing objects
+        if response.status_code in (400, 404):
+            return False
+        self._check(response, name)
+        return True
+
+    def save(self, name, chunks, content_type=None, size=None):
+        headers = {'Content-Type': content_type or 'application/octet-stream', 'x-upsert': 'true'}
+        if size is not None:
+            # a known length avoids chunked transfer encoding
+            headers['Content-Length'] = str(size)
+        self._check(self._request('POST', name, content=chunks, headers=headers), name)
+
+    def open(self, name):
+        return io.BytesIO(self._check(self._request('GET', name), name).content)
+
+    def size(self, name):
+        return int(self._check(self._request('HEAD', name), name).headers.get('Content-Length', 0))
+
+    def delete(self, name):
+        response = self._request('DELETE', name)
+        if response.status_code not in (400, 404):
+            self._check(response, name)
+
+    def url(self, name):
+        return f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/object/public/{self.bucket}/{quote(name)}"
+
+
+class LocalBackend(StorageBackend):
+    """Files under ``location`` (default ``MEDIA_ROOT``), served from ``base_url`` (default ``MEDIA_URL``)."""
+
+    def __init__(self, location=None, base_url=None):
+        self.location = str(location or settings.MEDIA_ROOT)
+        self.base_url = base_url or settings.MEDIA_URL
+
+    def path(self, name):
+        return safe_join(self.location, name)
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def save(self, name, chunks, content_type=None, size=None):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write aside and rename, so a reader never sees half a file even
+        # when two requests store the same content at once
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def open(self, name):
+        try:
+            return open(self.path(name), 'rb')
+        except FileNotFoundError as e:
+            raise StorageError(f"{name} does not exist", status=404) from e
+
+    def size(self, name):
+        return os.path.getsize(self.path(name))
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def url(self, name):
+        return self.base_url.rstrip('/') + '/' + quote(name)
+
+
+class InMemoryBackend(StorageBackend):
+    """A dict in this process; contents vanish when it exits."""
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url or settings.MEDIA_URL
+        self.objects = {}
+
+    def exists(self, name):
+        return name in self.objects
+
+    def save(self, name, chunks, content_type=None, size=None):
+        self.objects[name] = (b''.join(chunks), content_type)
+
+    def open(self, name):
+        if name not in self.objects:
+            raise StorageError(f"{name} does not exist", status=404)
+        return io.BytesIO(self.objects[name][0])
+
+    def size(self, name):
+        return len(self.objects[name][0])
+
+    def delete(self, name):
+        self.objects.pop(name, None)
+
+    def url(self, name):
+        return self.base_url.rstrip('/') + '/' + quote(name)
+
+
+def get_backend():
+    """The ``MEDIA_STORAGE`` backend of this process, created on first use."""
+    global _backend
+    if _backend is None:
+        conf = getattr(settings, 'MEDIA_STORAGE', {})
+        _backend = import_string(conf.get('BACKEND', 'api.storage.LocalBackend'))(**conf.get('OPTIONS', {}))
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting in ('MEDIA_STORAGE', 'SUPABASE_STORAGE', 'SUPABASE_URL', 'MEDIA_ROOT', 'MEDIA_URL'):
+        _backend = None
+
+
+def http_client():
+    """The process-wide pooled client; a forked worker builds its own."""
+    global _client, _client_pid
+    if _client_pid != os.getpid():
+        with _client_lock:
+            if _client_pid != os.getpid():
+                key = settings.SUPABASE_SERVICE_ROLE_KEY
+                _client = httpx.Client(
+                    base_url=f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1",
+                    headers={'Authorization': f"Bearer {key}", 'apikey': key},
+                    timeout=config('TIMEOUT'),
+                    limits=httpx.Limits(
+                        max_connections=config('MAX_CONNECTIONS'),
+                        max_keepalive_connections=config('MAX_CONNECTIONS'),
+                    ),
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+# ===== content-addressed uploads =====
+
+def content_name(file, folder, filename=None):
+    """``<folder>/<sha256 of the bytes>.<ext>``, hashed in chunks from ``file``.
+
+    The extension comes from ``filename``, or else from ``file.name``.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks(config('CHUNK_SIZE')):
+        digest.update(chunk)
+    base = posixpath.basename(filename or file.name or '')
+    ext = base.rsplit('.', 1)[-1].lower() if '.' in base else 'bin'
+    return posixpath.join(folder, f"{digest.hexdigest()}.{ext}")
+
+
+def store(file, folder, filename=None):
+    """Store ``file`` under its content name unless it is already there; returns the name."""
+    name = content_name(file, folder, filename)
+    backend = get_backend()
+    if not backend.exists(name):
+        content_type = getattr(file, 'content_type', None) or mimetypes.guess_type(name)[0]
+        backend.save(name, file.chunks(config('CHUNK_SIZE')), content_type, size=file.size)
+    return name
+
+
+def public_url(name):
+    return get_backend().url(name)
+
 
 def upload_image(file, folder: str):
     """
-    Uploads image to Supabase Storage and returns public URL
+    Stores an uploaded image (once per distinct content) and returns its public URL
     """
-    ext = file.name.split('.')[-1]
-    filename = f"{folder}/{uuid.uuid4()}.{ext}"
-
-    # Upload
-    supabase.storage.from_("media").upload(
-        filename,
-        file.read(),
-        file_options={
-            "content-type": file.content_type
-        }
-    )
-
-    # Get public URL
-    public_url = supabase.storage.from_("media").get_public_url(filename)
-
-    return public_url
+    return public_url(store(file, folder))
+
+
+def spool(file, name):
+    """Park an upload in ``SPOOL_DIR`` for ``upload_spooled``; returns where it waits."""
+    directory = config('SPOOL_DIR') or os.path.join(settings.MEDIA_ROOT, 'upload-spool')
+    os.makedirs(directory, exist_ok=True)
+    # unique per request: two uploads of the same content each get their own file
+    path = os.path.join(directory, f"{uuid.uuid4().hex}-{name.replace('/', '_')}")
+    if hasattr(file, 'temporary_file_path'):
+        file_move_safe(file.temporary_file_path(), path, allow_overwrite=True)
+    else:
+        with open(path, 'wb') as out:
+            for chunk in file.chunks(config('CHUNK_SIZE')):
+                out.write(chunk)
+    return path
+
+
+def upload_spooled(path, name, content_type):
+    """Stream a spooled file to ``name`` and delete it from the spool; safe to retry."""
+    backend = get_backend()
+    if not backend.exists(name):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            chunk_size = config('CHUNK_SIZE')
+            backend.save(name, iter(lambda: f.read(chunk_size), b''), content_type, size=size)
+    discard_spooled(path)
+
+
+def discard_spooled(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@deconstructible
+class MediaStorage(Storage):
+    """Django ``Storage`` over ``get_backend()`` that names every file after its content."""
+
+    def get_available_name(self, name, max_length=None):
+        # the final name is chosen by _save from the content
+        return name
+
+    def _save(self, name, content):
+        return store(content, posixpath.dirname(name), posixpath.basename(name))
+
+    @staticmethod
+    def _source(name):
+        """The backend holding ``name``: a file left under ``MEDIA_ROOT`` wins, else ``get_backend()``."""
+        backend = get_backend()
+        if not isinstance(backend, LocalBackend):
+            # one stat; saves a remote lookup for every name
+            local = LocalBackend()
+            if local.exists(name):
+                return local
+        return backend
+
+    def _open(self, name, mode='rb'):
+        return File(self._source(name).open(name), name=name)
+
+    def exists(self, name):
+        return self._source(name).exists(name)
+
+    def size(self, name):
+        return self._source(name).size(name)
+
+    def delete(self, name):
+        source = self._source(name)
+        source.delete(name)
+        if source is not get_backend():
+            get_backend().delete(name)
+
+    def url(self, name):
+        return self._source(name).url(name)
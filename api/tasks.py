@@ -1,7 +1,11 @@
+import logging
+
 from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
 
+logger = logging.getLogger("api")
+
 
 @shared_task(bind=True)
 def send_confirmation_email(self, to_email: str, username: str):
@@ -26,3 +30,115 @@ def send_confirmation_email(self, to_email: str, username: str):
     except Exception as e:
         # Let Celery record the exception and return failure information
         raise self.retry(exc=e, countdown=60, max_retries=3)
+
+
+@shared_task
+def fan_out_post(post_id: int):
+    """Push a freshly created post into its author's and followers' home timelines."""
+    from .models import PostModel
+    from . import timeline
+
+    try:
+        post = PostModel.objects.get(id=post_id)
+    except PostModel.DoesNotExist:
+        return {'timelines': 0}
+    return {'timelines': timeline.fan_out(post)}
+
+
+@shared_task(bind=True)
+def process_post_image(self, post_id: int):
+    """Render the resized WebP/JPEG variants of a post's image and record them on the post."""
+    from PIL import Image, UnidentifiedImageError
+    from .models import PostModel
+    from . import images, storage
+
+    try:
+        post = PostModel.objects.only('id', 'image').get(id=post_id)
+    except PostModel.DoesNotExist:
+        return {'variants': 0}
+    if not post.image:
+        return {'variants': 0}
+    try:
+        variants = images.process(post)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        # not worth retrying; the original stays available as ``image``
+        logger.warning(f"Post {post_id} image cannot be processed: {e}")
+        return {'variants': 0}
+    except storage.StorageError as e:
+        if not e.retryable:
+            logger.warning(f"Post {post_id} image cannot be processed: {e}")
+            return {'variants': 0}
+        raise self.retry(exc=e, countdown=30, max_retries=3)
+    return {'variants': len(variants or {})}
+
+
+@shared_task(bind=True, max_retries=5)
+def upload_profile_photo(self, user_id: int, spool_path: str, name: str, content_type: str,
+                         photo_url: str, previous_url: str = None):
+    """Stream a spooled profile photo to storage (``SUPABASE_STORAGE['ASYNC_PROFILE_PHOTOS']``).
+
+    The view has already pointed ``photo_url`` at the final URL. If the upload
+    cannot be completed, the previous photo is restored unless the user has
+    changed it again since.
+    """
+    from .models import UserModel
+    from . import storage
+
+    try:
+        storage.upload_spooled(spool_path, name, content_type)
+        return {'uploaded': True}
+    except storage.StorageError as e:
+        if e.retryable and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=5 * 2 ** self.request.retries)
+        error = e
+    except FileNotFoundError as e:
+        # the spool is not shared with this worker, or was cleaned up
+        error = e
+
+    logger.error(f"Profile photo upload for user {user_id} failed: {error}")
+    user = UserModel.objects.filter(id=user_id, photo_url=photo_url).first()
+    if user is not None:
+        user.photo_url = previous_url
+        user.save(update_fields=['photo_url'])
+    storage.discard_spooled(spool_path)
+    return {'uploaded': False}
+
+
+@shared_task
+def backfill_home_timeline(follower_id: int, author_id: int):
+    """Merge a newly followed author's recent posts into the follower's timeline."""
+    from . import timeline
+
+    return {'added': timeline.backfill(follower_id, author_id)}
+
+
+@shared_task
+def prune_home_timeline(follower_id: int, author_id: int):
+    """Remove an unfollowed author's posts from the follower's timeline."""
+    from . import timeline
+
+    return {'removed': timeline.prune(follower_id, author_id)}
+
+
+@shared_task
+def retract_post(post_id: int, author_id: int):
+    """Remove a deleted post from its author's and followers' home timelines."""
+    from . import timeline
+
+    return {'timelines': timeline.retract(post_id, author_id)}
+
+
+@shared_task
+def flush_like_buffer():
+    """Write buffered like toggles from Redis to the database (run by celery beat)."""
+    from . import likes
+
+    return likes.flush()
+
+
+@shared_task
+def purge_stale_uploads():
+    """Delete the spooled chunks of expired upload sessions (run by celery beat)."""
+    from . import uploads
+
+    return uploads.purge_stale()
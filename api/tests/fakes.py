@@ -0,0 +1,82 @@
+"""In-process stand-ins for Redis and Supabase so the test suite runs hermetically.
+
+``FakeRedis`` is fakeredis' client bound to one process-wide server, so the
+connections django-redis opens all see the same keyspace. Scripts run through
+fakeredis' Lua interpreter (``fakeredis[lua]``), so ``api.likes`` and redis-py's
+locks execute their real Lua. Point django-redis at it with::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://in-memory/0',
+            'OPTIONS': {'REDIS_CLIENT_CLASS': 'api.tests.fakes.FakeRedis'},
+        }
+    }
+
+``FakeRedis.reset()`` empties the keyspace.
+
+``InMemorySupabase`` serves Supabase Storage's object endpoints through an
+``httpx.MockTransport``; patch ``api.storage.http_client`` to return its
+``client()``.
+"""
+import uuid
+from urllib.parse import unquote
+
+import fakeredis
+import httpx
+
+_server = fakeredis.FakeServer()
+
+
+class FakeRedis(fakeredis.FakeRedis):
+    """A fakeredis client on the shared server, whatever pool django-redis hands it."""
+
+    def __init__(self, *args, connection_pool=None, **kwargs):
+        super().__init__(*args, server=_server, **kwargs)
+
+    @classmethod
+    def reset(cls):
+        cls().flushall()
+
+
+class InMemorySupabase:
+    """Supabase Storage's object REST API, served to ``httpx`` through a ``MockTransport``.
+
+    Objects are kept in ``objects`` as ``(bucket, name) -> (bytes, headers)``;
+    every request's method and name is appended to ``requests``.
+    ``fail_next(status)`` makes the next upload fail with that status.
+    """
+
+    def __init__(self, base_url='https://storage.test'):
+        self.base_url = base_url
+        self.objects = {}
+        self.requests = []
+        self.failures = []
+        self.transport = httpx.MockTransport(self.handle)
+
+    def client(self):
+        return httpx.Client(base_url=f"{self.base_url}/storage/v1", transport=self.transport)
+
+    def fail_next(self, status):
+        self.failures.append(status)
+
+    def handle(self, request):
+        prefix = '/storage/v1/object/'
+        if not request.url.path.startswith(prefix):
+            return httpx.Response(404, json={'error': 'not_found'})
+        bucket, _, name = unquote(request.url.path[len(prefix):]).partition('/')
+        key = (bucket, name)
+        self.requests.append((request.method, name))
+        if request.method == 'POST':
+            if self.failures:
+                return httpx.Response(self.failures.pop(0), json={'error': 'injected'})
+            if key in self.objects and request.headers.get('x-upsert') != 'true':
+                return httpx.Response(409, json={'statusCode': '409', 'error': 'Duplicate'})
+            self.objects[key] = (request.read(), dict(request.headers))
+            return httpx.Response(200, json={'Key': f"{bucket}/{name}", 'Id': str(uuid.uuid4())})
+        if request.method == 'DELETE':
+            self.objects.pop(key, None)
+            return httpx.Response(200, json={'message': 'Successfully deleted'})
+        if key not in self.objects:
+            return httpx.Response(404, json={'error': 'not_found'})
+        return httpx.Response(200, content=self.objects[key][0])
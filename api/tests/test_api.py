@@ -0,0 +1,1660 @@
+import gc
+import hashlib
+import io
+import logging
+import math
+import json
+import os
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image as PILImage
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from sm_backend.celery import app as celery_app
+
+from ..cache import hot_cache
+from .fakes import FakeRedis, InMemorySupabase
+from .. import flamegraph, images, likes, metrics, storage, tasks, timeline, uploads
+from ..log_handlers import JSONFormatter, QueuedHandler, SuccessSampler
+from ..validators import ImageUploadHandler, validate_image
+from ..profiling import fingerprint
+from ..jwt_provider import generate_tokens
+from ..models import UserModel, PostModel, CommentModel, LikeModel, FollowModel
+
+IN_MEMORY_CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://in-memory/0',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'REDIS_CLIENT_CLASS': 'api.tests.fakes.FakeRedis',
+        },
+    }
+}
+
+# Query budgets are the hard gate. Latency depends on the machine, so it is
+# only checked with PERF_CHECK_LATENCY=1: p50/p95 per route, compared with a
+# relative tolerance plus an absolute slack so scheduler noise on fast routes
+# does not fail the run. The tail is noisier than the median on shared
+# machines, so p95 gets a looser tolerance. Set PERF_UPDATE_BASELINE=1 to
+# rewrite the file after an intended change; nothing else writes it.
+PERF_BASELINE_PATH = Path(__file__).with_name('perf_baseline.json')
+PERF_ITERATIONS = int(os.environ.get('PERF_ITERATIONS', 30))
+PERF_TOLERANCE = float(os.environ.get('PERF_TOLERANCE', 0.5))
+PERF_P95_TOLERANCE = float(os.environ.get('PERF_P95_TOLERANCE', 2.0))
+PERF_SLACK_MS = float(os.environ.get('PERF_SLACK_MS', 5.0))
+PERF_CHECK_LATENCY = os.environ.get('PERF_CHECK_LATENCY') == '1'
+PERF_UPDATE_BASELINE = os.environ.get('PERF_UPDATE_BASELINE') == '1'
+
+PASSWORD = 'Vq7!xLm#2pZ'
+
+
+@override_settings(
+    CACHES=IN_MEMORY_CACHES,
+    # the default PBKDF2 work factor would dominate every auth timing
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    MEDIA_STORAGE={'BACKEND': 'api.storage.SupabaseBackend'},
+    SUPABASE_URL='https://project.supabase.test',
+    SUPABASE_SERVICE_ROLE_KEY='service-role-key',
+)
+class HermeticTestCase(TestCase):
+    """Redis, Supabase and the Celery broker replaced by in-process stand-ins."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        cls.storage = InMemorySupabase()
+        cls._supabase = mock.patch('api.storage.http_client', return_value=cls.storage.client())
+        cls._supabase.start()
+        cls._chunk_spool = tempfile.TemporaryDirectory()
+        cls._uploads = override_settings(UPLOADS={'CHUNK_SIZE': 64 * 1024, 'SPOOL_DIR': cls._chunk_spool.name})
+        cls._uploads.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._uploads.disable()
+        cls._chunk_spool.cleanup()
+        cls._supabase.stop()
+        celery_app.conf.task_always_eager = cls._eager
+        super().tearDownClass()
+
+    def setUp(self):
+        # the database is rolled back between tests; the caches must be too
+        FakeRedis.reset()
+        hot_cache.local.clear()
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + generate_tokens(user)['access'])
+        return client
+
+
+class ListQueryCountGuardTests(HermeticTestCase):
+    """A list endpoint's query count must not depend on how many rows it returns.
+
+    Each endpoint is requested with a small and a large page; if a serializer
+    field starts lazily loading a relation per row, the larger page issues more
+    queries and the test fails with the offending SQL.
+    """
+    small, large = 5, 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = UserModel.objects.create(username='author', email='author@example.com')
+        cls.quiet = UserModel.objects.create(username='quiet', email='quiet@example.com')
+        fans = UserModel.objects.bulk_create(
+            UserModel(username=f'fan{i}', email=f'fan{i}@example.com') for i in range(cls.large + 5)
+        )
+        posts = PostModel.objects.bulk_create(
+            PostModel(author=cls.author, content=f'post {i}') for i in range(cls.large + 5)
+        )
+        PostModel.objects.bulk_create(
+            PostModel(author=cls.quiet, content=f'quiet {i}') for i in range(cls.small)
+        )
+        cls.post = posts[0]
+        LikeModel.objects.bulk_create(LikeModel(post=cls.post, user=fan) for fan in fans)
+        CommentModel.objects.bulk_create(
+            CommentModel(post=cls.post, author=fan, text='nice') for fan in fans
+        )
+        FollowModel.objects.bulk_create(FollowModel(follower=fan, following=cls.author) for fan in fans)
+        FollowModel.objects.bulk_create(FollowModel(follower=cls.author, following=fan) for fan in fans)
+
+    def count_queries(self, url, key, params=None, client=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = (client or self.client).get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx), len(response.json()[key]), [q['sql'] for q in ctx.captured_queries]
+
+    def assert_flat(self, url, key, client=None):
+        # first request fills the auth snapshot and like-state caches
+        self.count_queries(url, key, {'size': self.small}, client)
+        small, small_rows, _ = self.count_queries(url, key, {'size': self.small}, client)
+        large, large_rows, sql = self.count_queries(url, key, {'size': self.large}, client)
+        self.assertEqual((small_rows, large_rows), (self.small, self.large))
+        self.assertEqual(small, large, f"{url} ran {small} queries for {self.small} rows "
+                                       f"but {large} for {self.large}:\n" + "\n".join(sql))
+
+    def test_posts_feed(self):
+        self.assert_flat('/api/posts/', 'posts')
+
+    def test_posts_feed_authenticated(self):
+        # liked_by_me is resolved for the whole page at once
+        self.assert_flat('/api/posts/', 'posts', client=self.client_for(self.quiet))
+
+    def test_post_likes(self):
+        self.assert_flat(f'/api/posts/{self.post.id}/likes/', 'likes')
+
+    def test_post_comments(self):
+        self.assert_flat(f'/api/posts/{self.post.id}/comments/', 'comments')
+
+    def test_user_followers(self):
+        self.assert_flat(f'/api/users/{self.author.id}/followers/', 'followers')
+
+    def test_user_following(self):
+        self.assert_flat(f'/api/users/{self.author.id}/following/', 'following')
+
+    def test_user_posts(self):
+        # not paginated: compare a user with few posts against one with many
+        few, few_rows, _ = self.count_queries(f'/api/users/{self.quiet.id}/posts/', 'posts')
+        many, many_rows, sql = self.count_queries(f'/api/users/{self.author.id}/posts/', 'posts')
+        self.assertLess(few_rows, many_rows)
+        self.assertEqual(few, many, "\n".join(sql))
+
+
+# Maximum SQL queries per request, keyed by "<METHOD> <url name>". Lower a
+# budget when a change makes a route cheaper; raising one needs a reason.
+QUERY_BUDGETS = {
+    'POST register': 3,
+    'POST login': 1,
+    'POST refresh-token': 0,
+    'POST logout': 0,
+    'GET current-user': 0,
+    'POST current-user': 6,      # deactivation recounts the counters the account's rows feed
+    'PUT update-profile': 2,
+    'GET user-detail': 1,
+    'GET user-stats': 1,
+    'GET user-posts': 2,
+    'POST upload-profile-photo': 2,
+    'GET post-list-create': 2,
+    'POST post-list-create': 9,
+    'GET my-posts': 4,
+    'GET post-detail': 3,
+    'PUT post-update': 4,
+    'DELETE post-delete': 9,     # +1: the retract task's follower scan, inline under eager Celery
+    'POST like-toggle': 0,
+    'POST like-status': 1,
+    'GET post-likes': 2,
+    'GET get-like-count': 0,
+    'POST comment-create': 5,
+    'GET post-comments': 2,
+    'DELETE comment-delete': 6,
+    'POST follow-toggle': 7,
+    'GET user-followers': 2,
+    'GET user-following': 2,
+    'GET home-feed': 3,
+    'GET profile-download': 0,
+    'POST upload-create': 0,
+    'PUT upload-chunk': 0,
+    'GET upload-status': 0,
+    'POST upload-complete': 0,
+}
+
+
+class EndpointBudgetTests(HermeticTestCase):
+    """Every route in ``api/urls.py`` against a seeded graph: SQL budget and latency.
+
+    The seed is a few hundred users with follows, posts, likes and comments so
+    that queries run against indexes of realistic shape rather than empty tables.
+    """
+    users_count = 200
+    follows_per_user = 20
+    posts_per_user = 10
+    likes_per_post = 5
+    comments_per_post = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password(PASSWORD)
+        users = UserModel.objects.bulk_create(
+            UserModel(username=f'user{i}', email=f'user{i}@example.com', password=password)
+            for i in range(cls.users_count)
+        )
+        n = len(users)
+        FollowModel.objects.bulk_create(
+            FollowModel(follower=user, following=users[(i + 7 * k) % n])
+            for i, user in enumerate(users)
+            for k in range(1, cls.follows_per_user + 1)
+        )
+        posts = PostModel.objects.bulk_create(
+            PostModel(author=user, content=f'post {j} by {user.username}')
+            for user in users
+            for j in range(cls.posts_per_user)
+        )
+        LikeModel.objects.bulk_create(
+            LikeModel(post=post, user=users[(i + k) % n])
+            for i, post in enumerate(posts)
+            for k in range(1, cls.likes_per_post + 1)
+        )
+        CommentModel.objects.bulk_create(
+            CommentModel(post=post, author=users[(i + 3 * k) % n], text='nice post')
+            for i, post in enumerate(posts)
+            for k in range(1, cls.comments_per_post + 1)
+        )
+        call_command('reconcile_counters', stdout=io.StringIO())
+
+        cls.viewer = users[0]
+        cls.other = users[1]
+        cls.post = posts[len(posts) // 2]
+        cls.page_ids = [post.id for post in posts[:20]]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.baseline = json.loads(PERF_BASELINE_PATH.read_text()) if PERF_BASELINE_PATH.exists() else {}
+        cls.measured = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if PERF_UPDATE_BASELINE:
+            baseline = {**cls.baseline, **cls.measured}
+            PERF_BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.client_for(self.viewer)
+
+    def check(self, key, call, expected_status=200):
+        """Run ``call(i)``: once to warm caches, once under the query budget, then timed if asked."""
+        response = call(0)
+        self.assertEqual(response.status_code, expected_status, response.content)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = call(1)
+        self.assertEqual(response.status_code, expected_status, response.content)
+        self.assertLessEqual(
+            len(ctx), QUERY_BUDGETS[key],
+            f"{key} ran {len(ctx)} queries (budget {QUERY_BUDGETS[key]}):\n"
+            + "\n".join(q['sql'] for q in ctx.captured_queries)
+        )
+
+        if not (PERF_CHECK_LATENCY or PERF_UPDATE_BASELINE):
+            return
+
+        # like timeit: keep collector pauses out of the samples
+        gc.collect()
+        gc.disable()
+        try:
+            samples = []
+            for i in range(2, PERF_ITERATIONS + 2):
+                start = time.perf_counter()
+                call(i)
+                samples.append((time.perf_counter() - start) * 1000)
+        finally:
+            gc.enable()
+        samples.sort()
+        p50 = statistics.median(samples)
+        p95 = samples[math.ceil(0.95 * len(samples)) - 1]
+        self.measured[key] = {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3)}
+
+        if PERF_UPDATE_BASELINE:
+            return
+        previous = self.baseline.get(key)
+        if previous is None:
+            self.fail(f"{key} has no latency baseline; record one with PERF_UPDATE_BASELINE=1")
+        for name, value, tolerance in (('p50', p50, PERF_TOLERANCE), ('p95', p95, PERF_P95_TOLERANCE)):
+            allowed = previous[f'{name}_ms'] * (1 + tolerance) + PERF_SLACK_MS
+            self.assertLessEqual(value, allowed, f"{key} {name} {value:.2f}ms exceeds baseline "
+                                                 f"{previous[f'{name}_ms']:.2f}ms + tolerance")
+
+    def test_every_route_has_a_budget(self):
+        from ..urls import urlpatterns
+
+        covered = {key.split(' ', 1)[1] for key in QUERY_BUDGETS}
+        self.assertEqual({pattern.name for pattern in urlpatterns} - covered, set())
+
+    def test_every_budget_has_a_baseline(self):
+        self.assertEqual(set(QUERY_BUDGETS) - set(self.baseline), set(),
+                         "record the missing routes with PERF_UPDATE_BASELINE=1")
+
+    # ----- auth -----
+
+    def test_register(self):
+        self.check('POST register', lambda i: self.client.post('/api/auth/register/', {
+            'username': f'newcomer{i}', 'email': f'newcomer{i}@example.com', 'password': PASSWORD,
+        }, format='json'))
+
+    def test_login(self):
+        self.check('POST login', lambda i: self.client.post('/api/auth/login/', {
+            'username': self.viewer.username, 'password': PASSWORD,
+        }, format='json'))
+
+    def test_refresh(self):
+        refresh = generate_tokens(self.viewer)['refresh']
+        self.check('POST refresh-token', lambda i: self.client.post(
+            '/api/auth/refresh/', {'refresh': refresh}, format='json'))
+
+    def test_logout(self):
+        tokens = [generate_tokens(self.viewer)['refresh'] for _ in range(PERF_ITERATIONS + 2)]
+        self.check('POST logout', lambda i: self.client.post(
+            '/api/auth/logout/', {'refresh': tokens[i]}, format='json'))
+
+    # ----- users -----
+
+    def test_current_user(self):
+        self.check('GET current-user', lambda i: self.api.get('/api/users/me/'))
+
+    def test_deactivate_current_user(self):
+        accounts = UserModel.objects.bulk_create(
+            UserModel(username=f'leaver{i}', email=f'leaver{i}@example.com')
+            for i in range(PERF_ITERATIONS + 2)
+        )
+        clients = [self.client_for(user) for user in accounts]
+        self.check('POST current-user', lambda i: clients[i].post('/api/users/me/'))
+
+    def test_update_profile(self):
+        self.check('PUT update-profile', lambda i: self.api.put(
+            '/api/users/update/', {'profile_info': f'bio {i}'}, format='json'))
+
+    def test_user_detail(self):
+        self.check('GET user-detail', lambda i: self.client.get(f'/api/users/{self.other.id}/'))
+
+    def test_user_stats(self):
+        self.check('GET user-stats', lambda i: self.client.get(f'/api/users/{self.other.id}/stats/'))
+
+    def test_user_posts(self):
+        self.check('GET user-posts', lambda i: self.client.get(f'/api/users/{self.other.id}/posts/'))
+
+    def test_upload_profile_photo(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), 'teal').save(buffer, format='PNG')
+        png = buffer.getvalue()
+        self.check('POST upload-profile-photo', lambda i: self.api.post(
+            '/api/users/me/photo/',
+            {'photo': SimpleUploadedFile(f'avatar{i}.png', png, content_type='image/png')},
+            format='multipart',
+        ))
+        self.assertTrue(self.storage.objects)
+
+    # ----- posts -----
+
+    def test_posts_feed(self):
+        self.check('GET post-list-create', lambda i: self.api.get('/api/posts/'))
+
+    def test_create_post(self):
+        self.check('POST post-list-create', lambda i: self.api.post(
+            '/api/posts/', {'content': f'hello {i}'}, format='json'), expected_status=201)
+
+    def test_my_posts(self):
+        self.check('GET my-posts', lambda i: self.api.get('/api/posts/me/'))
+
+    def test_post_detail(self):
+        self.check('GET post-detail', lambda i: self.api.get(f'/api/posts/{self.post.id}/'))
+
+    def test_update_post(self):
+        post = PostModel.objects.filter(author=self.viewer).first()
+        self.check('PUT post-update', lambda i: self.api.put(
+            f'/api/posts/{post.id}/update/', {'content': f'edited {i}'}, format='json'))
+
+    def test_delete_post(self):
+        posts = PostModel.objects.bulk_create(
+            PostModel(author=self.viewer, content='doomed') for _ in range(PERF_ITERATIONS + 2)
+        )
+        UserModel.adjust_counter(self.viewer.id, 'posts_count', len(posts))
+        self.check('DELETE post-delete', lambda i: self.api.delete(f'/api/posts/{posts[i].id}/delete/'))
+
+    # ----- likes -----
+
+    def test_like_toggle(self):
+        # toggling alternates between 201 (liked) and 200 (unliked)
+        statuses = set()
+
+        def toggle(i):
+            response = self.api.post('/api/likes/toggle/', {'post_id': self.post.id}, format='json')
+            statuses.add(response.status_code)
+            response.status_code = 200
+            return response
+        self.check('POST like-toggle', toggle)
+        self.assertEqual(statuses, {200, 201})
+
+    def test_like_status(self):
+        self.check('POST like-status', lambda i: self.api.post(
+            '/api/likes/status/', {'post_ids': self.page_ids}, format='json'))
+
+    def test_post_likes(self):
+        self.check('GET post-likes', lambda i: self.client.get(f'/api/posts/{self.post.id}/likes/'))
+
+    def test_like_count(self):
+        self.check('GET get-like-count', lambda i: self.client.get(f'/api/posts/{self.post.id}/likes/count/'))
+
+    # ----- comments -----
+
+    def test_create_comment(self):
+        self.check('POST comment-create', lambda i: self.api.post(
+            '/api/comments/create/', {'post_id': self.post.id, 'text': f'comment {i}'}, format='json'),
+            expected_status=201)
+
+    def test_post_comments(self):
+        self.check('GET post-comments', lambda i: self.client.get(f'/api/posts/{self.post.id}/comments/'))
+
+    def test_delete_comment(self):
+        comments = CommentModel.objects.bulk_create(
+            CommentModel(post=self.post, author=self.viewer, text='doomed') for _ in range(PERF_ITERATIONS + 2)
+        )
+        PostModel.adjust_counter(self.post.id, 'comments_count', len(comments))
+        self.check('DELETE comment-delete', lambda i: self.api.delete(f'/api/comments/{comments[i].id}/delete/'))
+
+    # ----- follows and feed -----
+
+    def test_follow_toggle(self):
+        statuses = set()
+
+        def toggle(i):
+            response = self.api.post(f'/api/users/{self.other.id}/follow/')
+            statuses.add(response.status_code)
+            response.status_code = 200
+            return response
+        self.check('POST follow-toggle', toggle)
+        self.assertEqual(statuses, {200, 201})
+
+    def test_user_followers(self):
+        self.check('GET user-followers', lambda i: self.client.get(f'/api/users/{self.other.id}/followers/'))
+
+    def test_user_following(self):
+        self.check('GET user-following', lambda i: self.client.get(f'/api/users/{self.other.id}/following/'))
+
+    def test_home_feed(self):
+        self.check('GET home-feed', lambda i: self.api.get('/api/feed/home/'))
+
+    # ----- chunked uploads -----
+
+    def open_upload(self, data, purpose='post'):
+        response = self.api.post('/api/uploads/', {
+            'filename': 'photo.png', 'size': len(data), 'purpose': purpose,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['data']['upload_id']
+
+    def put_chunk(self, api, upload_id, index, data):
+        return api.put(f'/api/uploads/{upload_id}/chunks/{index}/', data, content_type='application/octet-stream')
+
+    def test_upload_create(self):
+        self.check('POST upload-create', lambda i: self.api.post('/api/uploads/', {
+            'filename': f'photo{i}.jpg', 'size': 3 * 2 ** 20, 'purpose': 'post',
+        }, format='json'), expected_status=201)
+
+    def test_upload_chunk(self):
+        png = make_image((64, 64), fmt='PNG')
+        upload_id = self.open_upload(png)
+        self.check('PUT upload-chunk', lambda i: self.put_chunk(self.api, upload_id, 0, png))
+
+    def test_upload_status(self):
+        upload_id = self.open_upload(make_image((64, 64), fmt='PNG'))
+        self.check('GET upload-status', lambda i: self.api.get(f'/api/uploads/{upload_id}/'))
+
+    def test_upload_complete(self):
+        png = make_image((64, 64), fmt='PNG')
+        upload_id = self.open_upload(png)
+        self.put_chunk(self.api, upload_id, 0, png)
+        self.check('POST upload-complete', lambda i: self.api.post(f'/api/uploads/{upload_id}/complete/'))
+
+    def test_profile_download(self):
+        staff = UserModel.objects.create(username='staff', email='staff@example.com', is_staff=True)
+        flamegraph.save('abc123', {'name': 'GET /api/feed/home/', 'profiles': []})
+        api = self.client_for(staff)
+        self.check('GET profile-download', lambda i: api.get('/api/profiles/abc123/'))
+
+
+class MetricsTests(HermeticTestCase):
+    """``/metrics`` reflects the requests ``RequestLogMiddleware`` has seen."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = UserModel.objects.create(username='author', email='author@example.com')
+        cls.post = PostModel.objects.create(author=cls.author, content='hello')
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def value(self, text, series):
+        for line in text.splitlines():
+            if line.startswith(series + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+
+    def test_routes_are_keyed_by_url_name(self):
+        series = 'http_requests_total{method="GET",route="post-detail",status="200"}'
+        before = self.value(self.scrape(), series)
+        self.client.get(f'/api/posts/{self.post.id}/')
+        self.client.get(f'/api/posts/{self.post.id + 1000}/')
+        text = self.scrape()
+        self.assertEqual(self.value(text, series), before + 1)
+        self.assertGreater(self.value(text, 'http_requests_total{method="GET",route="post-detail",status="404"}'), 0)
+        self.assertGreater(self.value(text, 'http_request_duration_seconds_count{method="GET",route="post-detail"}'), 0)
+        self.assertGreater(self.value(text, 'db_queries_total{route="post-detail"}'), 0)
+        self.assertNotIn(f'/api/posts/{self.post.id}/', text)
+
+    def test_unknown_paths_share_one_series(self):
+        before = self.value(self.scrape(), 'http_requests_total{method="GET",route="unmatched",status="404"}')
+        self.client.get('/no/such/page/1')
+        self.client.get('/no/such/page/2')
+        after = self.value(self.scrape(), 'http_requests_total{method="GET",route="unmatched",status="404"}')
+        self.assertEqual(after, before + 2)
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.client.get(f'/api/posts/{self.post.id}/')
+        text = self.scrape()
+        prefix = 'http_request_duration_seconds_bucket{method="GET",route="post-detail",le="'
+        counts = [float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith(prefix)]
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(counts[-1], self.value(text, 'http_request_duration_seconds_count{method="GET",route="post-detail"}'))
+
+    def test_other_processes_are_merged(self):
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+
+        def worker_file(directory, pid, requests, in_flight):
+            with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as f:
+                json.dump({
+                    'http_requests_total': {'type': 'counter', 'help': '', 'labels': ['method', 'route', 'status'],
+                                            'samples': [[['GET', 'load-test-route', '200'], requests]]},
+                    'http_requests_in_flight': {'type': 'gauge', 'help': '', 'labels': [],
+                                                'samples': [[[], in_flight]]},
+                }, f)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            worker_file(directory, os.getppid(), 3, 4)
+            worker_file(directory, exited.pid, 5, 100)
+            text = self.scrape()
+
+        # counters of exited workers are kept, their gauges are not
+        self.assertEqual(self.value(text, 'http_requests_total{method="GET",route="load-test-route",status="200"}'), 8)
+        self.assertLess(self.value(text, 'http_requests_in_flight'), 100)
+        self.assertGreaterEqual(self.value(text, 'http_requests_in_flight'), 4)
+
+    def test_worker_file_is_written_off_the_request_path(self):
+        threads = []
+        write = metrics.REGISTRY.flush
+
+        def flush():
+            threads.append(threading.current_thread().name)
+            write()
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_MULTIPROC_DIR=directory, METRICS_FLUSH_INTERVAL=0.01), \
+                mock.patch.object(metrics.REGISTRY, 'flush', flush), \
+                mock.patch.object(metrics.REGISTRY, '_flusher_pid', None):
+            self.client.get(f'/api/posts/{self.post.id}/')
+            path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+            deadline = time.monotonic() + 5
+            while not os.path.exists(path) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(os.path.exists(path))
+        self.assertEqual(set(threads), {'metrics-flush'})
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.scrape(HTTP_AUTHORIZATION='Bearer s3cret')
+
+
+class QueuedLoggingTests(SimpleTestCase):
+    """Request-path logging hands records to a thread and never waits for the sinks."""
+
+    class Sink(logging.Handler):
+        def __init__(self, gate=None):
+            super().__init__()
+            self.gate = gate
+            self.lines = []
+            self.setFormatter(JSONFormatter())
+
+        def emit(self, record):
+            if self.gate is not None:
+                self.gate.wait()
+            self.lines.append(json.loads(self.format(record)))
+
+    def logger_for(self, handler):
+        logger = logging.getLogger(f'api.tests.{id(handler)}')
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return logger
+
+    def test_records_reach_the_sinks_as_json(self):
+        sink = self.Sink()
+        handler = QueuedHandler([sink])
+        logger = self.logger_for(handler)
+        logger.warning("GET %s", '/api/posts/', extra={'status': 200, 'route': 'post-list-create'})
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception("failed")
+        handler.stop()
+
+        first, second = sink.lines
+        self.assertEqual((first['message'], first['status'], first['route']), ('GET /api/posts/', 200, 'post-list-create'))
+        self.assertEqual(first['level'], 'WARNING')
+        self.assertIn('ZeroDivisionError', second['exc'])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        gate = threading.Event()
+        sink = self.Sink(gate)
+        handler = QueuedHandler([sink], maxsize=5)
+        logger = self.logger_for(handler)
+
+        started = time.perf_counter()
+        for i in range(50):
+            logger.warning("record %d", i)
+        self.assertLess(time.perf_counter() - started, 1)
+        # one record is held by the blocked sink, five wait in the queue
+        self.assertGreaterEqual(handler.dropped, 50 - 6)
+
+        gate.set()
+        handler.stop()
+        messages = [line['message'] for line in sink.lines]
+        self.assertEqual(len(messages), 50 - handler.dropped + 1)
+        self.assertIn(f"Log queue full: dropped {handler.dropped} records", messages)
+
+    def test_sampler_keeps_errors_and_slow_requests(self):
+        sampler = SuccessSampler(rate=0, slow_ms=500)
+
+        def record(**extra):
+            return logging.makeLogRecord({'msg': 'request', **extra})
+
+        self.assertFalse(sampler.filter(record(status=200, duration_ms=3)))
+        self.assertTrue(sampler.filter(record(status=200, duration_ms=900)))
+        self.assertTrue(sampler.filter(record(status=404, duration_ms=3)))
+        self.assertTrue(sampler.filter(record()))
+
+
+class SQLProfilerTests(HermeticTestCase):
+    """``X-Profile-SQL`` profiles a request for staff and is ignored for everyone else."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = UserModel.objects.create(username='staff', email='staff@example.com', is_staff=True)
+        cls.member = UserModel.objects.create(username='member', email='member@example.com')
+        cls.post = PostModel.objects.create(author=cls.member, content='hello')
+
+    def test_fingerprint_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x''y'  LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+        self.assertEqual(fingerprint('SELECT "api_post2"."id" FROM "api_post2"'), 'SELECT "api_post2"."id" FROM "api_post2"')
+
+    def test_ignored_without_staff(self):
+        response = self.client_for(self.member).get('/api/posts/', HTTP_X_PROFILE_SQL='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        response = self.client.get('/api/posts/', HTTP_X_PROFILE_SQL='1')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing_and_summary_for_staff(self):
+        client = self.client_for(self.staff)
+        self.assertNotIn('Server-Timing', client.get('/api/posts/'))
+
+        with self.assertLogs('api', 'INFO') as logs:
+            response = client.get('/api/posts/', HTTP_X_PROFILE_SQL='1')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'cache;dur=', 'storage;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+
+        summary = next(r for r in logs.records if r.getMessage().startswith('SQL profile GET /api/posts/'))
+        self.assertTrue(summary.queries)
+        self.assertTrue(any(site and site.startswith('api/') for q in summary.queries for site in q['call_sites']))
+
+    @mock.patch('api.profiling.SLOW_QUERY_MS', 0)
+    def test_slow_queries_are_logged_with_a_plan(self):
+        with self.assertLogs('api', 'WARNING') as logs:
+            self.client_for(self.staff).get(f'/api/posts/{self.post.id}/', HTTP_X_PROFILE_SQL='1')
+        slow = [r for r in logs.records if r.getMessage().startswith('Slow query')]
+        self.assertTrue(slow)
+        self.assertTrue(all(r.plan for r in slow if r.sql.lstrip().upper().startswith('SELECT')))
+        self.assertNotIn('EXPLAIN failed', ''.join(r.plan or '' for r in slow))
+
+
+class FlameGraphTests(HermeticTestCase):
+    """``X-Profile`` records a speedscope flame graph of an ``/api/`` request for staff."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = UserModel.objects.create(username='staff', email='staff@example.com', is_staff=True)
+        cls.member = UserModel.objects.create(username='member', email='member@example.com')
+        cls.post = PostModel.objects.create(author=cls.member, content='hello')
+
+    def test_sampler_attributes_time_to_the_running_function(self):
+        def busy():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = flamegraph.StackSampler(threading.get_ident(), sys._getframe(), interval=0.001)
+        sampler.start()
+        busy()
+        sampler.stop()
+
+        document = sampler.speedscope('busy')
+        profile = document['profiles'][0]
+        self.assertEqual(len(profile['samples']), len(profile['weights']))
+        names = document['shared']['frames']
+        busy_ms = sum(w for stack, w in zip(profile['samples'], profile['weights'])
+                      if any(names[i]['name'].endswith('busy') for i in stack))
+        self.assertGreater(busy_ms, 25)
+        self.assertLessEqual(sum(profile['weights']), profile['endValue'] + 1)
+
+    def test_ignored_without_staff(self):
+        response = self.client_for(self.member).get('/api/posts/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/posts/', HTTP_X_PROFILE='1'))
+        self.assertNotIn('X-Profile-Id', self.client_for(self.staff).get('/api/posts/'))
+
+    def test_staff_request_is_profiled_and_downloadable(self):
+        client = self.client_for(self.staff)
+        response = client.get(f'/api/posts/{self.post.id}/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Profile-Url'], f"/api/profiles/{response['X-Profile-Id']}/")
+
+        download = client.get(response['X-Profile-Url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('speedscope.json', download['Content-Disposition'])
+        document = json.loads(download.content)
+        self.assertEqual(document['$schema'], flamegraph.SCHEMA)
+        profile = document['profiles'][0]
+        self.assertEqual((profile['type'], profile['name']), ('sampled', f'GET /api/posts/{self.post.id}/'))
+        frames = document['shared']['frames']
+        self.assertTrue(all(0 <= i < len(frames) for stack in profile['samples'] for i in stack))
+        # stacks start below the middleware, not in the test client or server
+        self.assertFalse(any(f['file'].endswith('flamegraph.py') for f in frames))
+
+        self.assertEqual(self.client_for(self.member).get(response['X-Profile-Url']).status_code, 403)
+        self.assertEqual(client.get('/api/profiles/missing/').status_code, 404)
+
+
+def make_image(size, fmt='JPEG', mode='RGB', exif=None):
+    image = PILImage.new(mode, size, (200, 80, 40) if mode == 'RGB' else (200, 80, 40, 128))
+    out = io.BytesIO()
+    image.save(out, fmt, **({'exif': exif.tobytes()} if exif is not None else {}))
+    return out.getvalue()
+
+
+class ImageVariantTests(HermeticTestCase):
+    """Post images get resized, EXIF-free WebP/JPEG variants after the response."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = UserModel.objects.create(username='author', email='author@example.com')
+
+    def test_render_orients_resizes_and_strips_exif(self):
+        exif = PILImage.Exif()
+        exif[0x0112] = 6        # orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'PhoneMaker'
+        rendered = images.render(make_image((3000, 2000), exif=exif))
+
+        self.assertEqual(set(rendered), set(images.SIZES))
+        self.assertEqual((rendered['full']['width'], rendered['full']['height']), (1365, 2048))
+        self.assertEqual((rendered['thumb']['width'], rendered['thumb']['height']), (213, 320))
+        for variant in rendered.values():
+            for fmt, pil_format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+                with PILImage.open(io.BytesIO(variant[fmt])) as decoded:
+                    self.assertEqual(decoded.format, pil_format)
+                    self.assertEqual(decoded.size, (variant['width'], variant['height']))
+                    self.assertFalse(decoded.getexif())
+
+    def test_small_images_are_not_upscaled(self):
+        rendered = images.render(make_image((100, 50), fmt='PNG', mode='RGBA'))
+        self.assertTrue(all((v['width'], v['height']) == (100, 50) for v in rendered.values()))
+
+    def test_created_post_gets_variants(self):
+        client = self.client_for(self.author)
+        upload = SimpleUploadedFile('photo.jpg', make_image((1600, 1200)), content_type='image/jpeg')
+        response = client.post('/api/posts/', {'content': 'hi', 'image': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        post = client.get(f"/api/posts/{response.json()['post']['id']}/").json()['post']
+        feed = post['image_variants']['feed']
+        self.assertEqual((feed['width'], feed['height']), (1080, 810))
+        self.assertRegex(feed['webp'], r'/post_images/variants/[0-9a-f]{64}\.webp$')
+        self.assertRegex(feed['jpeg'], r'/post_images/variants/[0-9a-f]{64}\.jpeg$')
+
+    def test_command_backfills_and_skips_unreadable_images(self):
+        good = PostModel.objects.create(author=self.author, image=SimpleUploadedFile('a.jpg', make_image((800, 600))))
+        bad = PostModel.objects.create(author=self.author, image=SimpleUploadedFile('b.jpg', b'not an image'))
+        PostModel.objects.create(author=self.author, content='no image')
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('process_post_images', workers=1, stdout=out, stderr=err)
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual(good.image_variants['thumb']['width'], 320)
+        self.assertEqual(bad.image_variants, {})
+        self.assertIn('1 unreadable', out.getvalue())
+        self.assertIn(f'Post {bad.id}', err.getvalue())
+
+
+class StorageUploadTests(HermeticTestCase):
+    """Profile photos are streamed to Supabase Storage, inline or from the spool."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create(username='member', email='member@example.com',
+                                            photo_url='https://old.example/photo.png')
+
+    def setUp(self):
+        super().setUp()
+        self.storage.objects.clear()
+        self.storage.failures.clear()
+        self.api = self.client_for(self.user)
+
+    def upload(self, large=False):
+        if large:
+            # noise does not compress: above FILE_UPLOAD_MAX_MEMORY_SIZE, so
+            # Django hands the view a temporary file instead of memory
+            out = io.BytesIO()
+            PILImage.effect_noise((1100, 1100), 64).convert('RGB').save(out, 'PNG')
+            photo = out.getvalue()
+            self.assertGreater(len(photo), 2.5 * 2 ** 20)
+        else:
+            photo = make_image((64, 64), fmt='PNG')
+        response = self.api.post('/api/users/me/photo/', {
+            'photo': SimpleUploadedFile('me.PNG', photo, content_type='image/png'),
+        }, format='multipart')
+        return response, photo
+
+    def test_streams_upload_and_builds_public_url_locally(self):
+        response, photo = self.upload(large=True)
+        self.assertEqual(response.status_code, 200, response.content)
+        url = response.json()['data']['photo_url']
+        (bucket, name), (data, headers) = next(iter(self.storage.objects.items()))
+        self.assertEqual(data, photo)
+        self.assertEqual(headers['content-length'], str(len(photo)))
+        self.assertEqual(headers['content-type'], 'image/png')
+        self.assertEqual(name, f'profiles/{hashlib.sha256(photo).hexdigest()}.png')
+        self.assertEqual(url, f'https://project.supabase.test/storage/v1/object/public/{bucket}/{name}')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_url, url)
+
+    def test_reupload_of_the_same_photo_transfers_nothing(self):
+        first, _ = self.upload()
+        self.storage.requests.clear()
+        second, _ = self.upload()
+        self.assertEqual(second.json()['data']['photo_url'], first.json()['data']['photo_url'])
+        self.assertEqual([method for method, _ in self.storage.requests], ['HEAD'])
+
+    def test_storage_error_keeps_the_old_photo(self):
+        self.storage.fail_next(503)
+        response, _ = self.upload()
+        self.assertEqual(response.status_code, 502)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_url, 'https://old.example/photo.png')
+
+    def async_settings(self, spool):
+        return override_settings(SUPABASE_STORAGE={'ASYNC_PROFILE_PHOTOS': True, 'SPOOL_DIR': spool})
+
+    def test_async_mode_returns_202_and_task_uploads_from_spool(self):
+        with tempfile.TemporaryDirectory() as spool, self.async_settings(spool):
+            self.storage.fail_next(503)     # retried by the task
+            response, photo = self.upload(large=True)
+            self.assertEqual(response.status_code, 202, response.content)
+            data = response.json()['data']
+            self.assertEqual(data['upload'], 'pending')
+            self.assertEqual(os.listdir(spool), [])
+        (_, _), (stored, _) = next(iter(self.storage.objects.items()))
+        self.assertEqual(stored, photo)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_url, data['photo_url'])
+
+    def test_async_mode_restores_previous_photo_when_upload_is_rejected(self):
+        with tempfile.TemporaryDirectory() as spool, self.async_settings(spool):
+            self.storage.fail_next(400)
+            with self.assertLogs('api', 'ERROR'):
+                response, _ = self.upload()
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(os.listdir(spool), [])
+        self.assertFalse(self.storage.objects)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_url, 'https://old.example/photo.png')
+
+    def test_concurrent_uploads_of_the_same_photo_spool_separately(self):
+        photo = make_image((64, 64), fmt='PNG')
+        with tempfile.TemporaryDirectory() as spool, self.async_settings(spool):
+            name = 'profiles/same.png'
+            paths = [storage.spool(SimpleUploadedFile('me.png', photo), name) for _ in range(2)]
+            self.assertNotEqual(*paths)
+            for path in paths:
+                result = tasks.upload_profile_photo(self.user.id, path, name, 'image/png',
+                                                    storage.public_url(name))
+                self.assertEqual(result, {'uploaded': True})
+            self.assertEqual(os.listdir(spool), [])
+        self.assertEqual(len(self.storage.objects), 1)
+
+
+class StorageBackendTests(HermeticTestCase):
+    """Every ``MEDIA_STORAGE`` backend stores content-addressed objects the same way."""
+
+    def backends(self):
+        with tempfile.TemporaryDirectory() as media:
+            for backend in ('SupabaseBackend', 'LocalBackend', 'InMemoryBackend'):
+                with self.subTest(backend=backend), override_settings(
+                        MEDIA_ROOT=media, MEDIA_STORAGE={'BACKEND': f'api.storage.{backend}'}):
+                    yield storage.get_backend()
+
+    def test_store_is_idempotent_and_readable(self):
+        data = make_image((40, 30))
+        for backend in self.backends():
+            name = storage.store(SimpleUploadedFile('a.JPG', data, content_type='image/jpeg'), 'posts')
+            self.assertEqual(name, f'posts/{hashlib.sha256(data).hexdigest()}.jpg')
+            self.assertTrue(backend.exists(name))
+            self.assertEqual(storage.store(SimpleUploadedFile('b.jpg', data), 'posts'), name)
+            with backend.open(name) as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(backend.size(name), len(data))
+            self.assertTrue(backend.url(name).endswith(name))
+            backend.delete(name)
+            self.assertFalse(backend.exists(name))
+
+    def test_image_field_files_are_deduplicated(self):
+        author = UserModel.objects.create(username='author', email='author@example.com')
+        data = make_image((40, 30))
+        for _ in self.backends():
+            first = PostModel.objects.create(author=author, image=SimpleUploadedFile('x.jpg', data))
+            second = PostModel.objects.create(author=author, image=SimpleUploadedFile('y.jpg', data))
+            self.assertEqual(first.image.name, second.image.name)
+            self.assertTrue(first.image.name.startswith('post_images/'))
+            with first.image.open('rb') as f:
+                self.assertEqual(f.read(), data)
+
+    def test_files_left_in_media_root_are_served_until_migrated(self):
+        author = UserModel.objects.create(username='author', email='author@example.com')
+        data = make_image((40, 30))
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, MEDIA_URL='/media/'):
+            os.makedirs(os.path.join(media, 'post_images'))
+            with open(os.path.join(media, 'post_images', 'old.jpg'), 'wb') as f:
+                f.write(data)
+            post = PostModel.objects.create(author=author, image='post_images/old.jpg')
+            self.assertEqual(post.image.url, '/media/post_images/old.jpg')
+            with post.image.open('rb') as f:
+                self.assertEqual(f.read(), data)
+
+            out = io.StringIO()
+            call_command('migrate_media', '--delete-local', stdout=out)
+            self.assertIn('Copied 1 files', out.getvalue())
+            self.assertFalse(os.path.exists(os.path.join(media, 'post_images', 'old.jpg')))
+            self.assertEqual(self.storage.objects[('media', 'post_images/old.jpg')][0], data)
+            post.refresh_from_db()
+            self.assertEqual(post.image.url,
+                             'https://project.supabase.test/storage/v1/object/public/media/post_images/old.jpg')
+            with post.image.open('rb') as f:
+                self.assertEqual(f.read(), data)
+
+    def test_local_backend_rejects_paths_outside_media_root(self):
+        with tempfile.TemporaryDirectory() as media:
+            backend = storage.LocalBackend(location=media)
+            with self.assertRaises(SuspiciousFileOperation):
+                backend.save('../escape.txt', [b'x'])
+
+
+class ChunkedUploadTests(HermeticTestCase):
+    """Resumable uploads: chunks in any order, resumption from the status, attaching by id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create(username='uploader', email='uploader@example.com')
+        cls.stranger = UserModel.objects.create(username='stranger', email='stranger@example.com')
+        out = io.BytesIO()
+        # noise does not compress: five 64 KiB chunks, the last one short
+        PILImage.effect_noise((330, 330), 64).convert('RGB').save(out, 'PNG')
+        cls.photo = out.getvalue()
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.client_for(self.user)
+
+    def open(self, data=None, purpose='post'):
+        data = self.photo if data is None else data
+        response = self.api.post('/api/uploads/', {
+            'filename': 'Holiday.PNG', 'size': len(data), 'purpose': purpose, 'content_type': 'image/png',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['data']
+
+    def put(self, session, index, data=None, api=None):
+        data = self.photo if data is None else data
+        start = index * session['chunk_size']
+        return (api or self.api).put(f"/api/uploads/{session['upload_id']}/chunks/{index}/",
+                                     data[start:start + session['chunk_size']],
+                                     content_type='application/octet-stream')
+
+    def status(self, session):
+        return self.api.get(f"/api/uploads/{session['upload_id']}/").json()['data']
+
+    def complete(self, session):
+        return self.api.post(f"/api/uploads/{session['upload_id']}/complete/")
+
+    def send_all(self, data=None, purpose='post'):
+        session = self.open(data, purpose)
+        for index in range(session['chunks']):
+            self.assertEqual(self.put(session, index, data).status_code, 200)
+        response = self.complete(session)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['data']
+
+    def test_resumes_from_missing_chunks_and_attaches_to_a_post(self):
+        session = self.open()
+        self.assertEqual(session['chunks'], 5)
+        for index in (3, 0, 4, 0):
+            self.assertEqual(self.put(session, index).status_code, 200)
+        # the connection dropped; the status says what is left
+        self.assertEqual(self.status(session)['missing'], [1, 2])
+        self.assertEqual(self.complete(session).status_code, 409)
+        for index in self.status(session)['missing']:
+            self.put(session, index)
+
+        response = self.complete(session)
+        self.assertEqual(response.status_code, 200, response.content)
+        name = f'post_images/{hashlib.sha256(self.photo).hexdigest()}.png'
+        self.assertTrue(response.json()['data']['url'].endswith(name))
+        self.assertEqual(self.storage.objects[('media', name)][0], self.photo)
+        self.assertFalse(os.path.exists(uploads.spool_dir(session['upload_id'])))
+        # completing again is harmless
+        self.assertEqual(self.complete(session).json()['data']['url'], response.json()['data']['url'])
+
+        response = self.api.post('/api/posts/', {'content': 'big one', 'upload_id': session['upload_id']}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        post = PostModel.objects.get(id=response.json()['post']['id'])
+        self.assertEqual(post.image.name, name)
+        self.assertIn('thumb', post.image_variants)
+
+    def test_complete_while_another_completes_is_a_conflict(self):
+        session = self.open()
+        for index in range(session['chunks']):
+            self.put(session, index)
+        held = FakeRedis().lock(f"uploads:{session['upload_id']}:lock", timeout=60)
+        self.assertTrue(held.acquire(blocking=False))
+        try:
+            started = time.monotonic()
+            response = self.complete(session)
+            self.assertLess(time.monotonic() - started, 1)
+            # the chunks must not change under the assembly
+            chunk = self.put(session, 0)
+        finally:
+            held.release()
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertEqual(response.json()['error_code'], 'ERROR_306')
+        self.assertEqual(chunk.status_code, 409, chunk.content)
+        self.assertEqual(chunk.json()['error_code'], 'ERROR_306')
+        self.assertEqual(self.complete(session).status_code, 200)
+
+    def test_complete_while_a_chunk_is_being_written_is_a_conflict(self):
+        session = self.open()
+        for index in range(session['chunks']):
+            self.put(session, index)
+        stored = uploads.get(session['upload_id'], self.user.id)
+        chunk = self.photo[:session['chunk_size']]
+        attempts = []
+
+        class CompletingStream(io.BytesIO):
+            def read(stream, size=-1):
+                if not attempts:
+                    with self.assertRaises(uploads.UploadError) as ctx:
+                        uploads.complete(stored)
+                    attempts.append(ctx.exception.status)
+                return super().read(size)
+
+        uploads.write_chunk(stored, 0, CompletingStream(chunk), len(chunk))
+        self.assertEqual(attempts, [409])
+        self.assertEqual(self.complete(session).status_code, 200)
+
+    def test_chunks_of_the_wrong_length_are_refused(self):
+        session = self.open()
+        response = self.api.put(f"/api/uploads/{session['upload_id']}/chunks/0/", b'too short',
+                                content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.put(session, 5).status_code, 400)
+        self.assertEqual(self.status(session)['received'], [])
+
+    def test_sessions_belong_to_their_creator(self):
+        session = self.open()
+        stranger = self.client_for(self.stranger)
+        self.assertEqual(self.put(session, 0, api=stranger).status_code, 404)
+        self.assertEqual(stranger.get(f"/api/uploads/{session['upload_id']}/").status_code, 404)
+        self.assertEqual(self.api.get('/api/uploads/0123456789abcdef/').status_code, 404)
+
+    def test_attaches_a_profile_photo_for_its_purpose_only(self):
+        session = self.send_all(purpose='profile')
+        response = self.api.post('/api/posts/', {'upload_id': session['upload_id']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.api.post('/api/users/me/photo/', {'upload_id': session['upload_id']}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.photo_url, session['url'])
+        self.assertIn('/profiles/', session['url'])
+
+    def test_content_that_is_not_an_image_is_refused_on_complete(self):
+        stored = set(self.storage.objects)
+        session = self.open(b'\x00' * 1000)
+        self.put(session, 0, b'\x00' * 1000)
+        response = self.complete(session)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.api.get(f"/api/uploads/{session['upload_id']}/").status_code, 404)
+        self.assertEqual(set(self.storage.objects), stored)
+
+    def test_oversized_uploads_are_refused_up_front(self):
+        response = self.api.post('/api/uploads/', {
+            'filename': 'huge.png', 'size': uploads.config('MAX_SIZE') + 1, 'purpose': 'post',
+        }, format='json')
+        self.assertEqual(response.status_code, 413)
+
+    def test_purges_chunks_of_expired_sessions(self):
+        session = self.open()
+        self.put(session, 0)
+        orphan = os.path.join(uploads.spool_dir(), 'expired')
+        os.makedirs(orphan)
+        self.assertGreaterEqual(uploads.purge_stale(min_age=0), 1)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(uploads.spool_dir(session['upload_id'])))
+
+
+def png_header(width, height):
+    """A PNG that declares ``width`` x ``height`` pixels and holds none: a decompression bomb's header."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IEND', b'')
+
+
+def noise_png(edge):
+    out = io.BytesIO()
+    PILImage.effect_noise((edge, edge), 64).convert('RGB').save(out, 'PNG')
+    return out.getvalue()
+
+
+@override_settings(IMAGE_UPLOADS={'MAX_BYTES': 100 * 1024, 'MAX_MEGAPIXELS': 40})
+class ImageValidationTests(HermeticTestCase):
+    """Uploads are judged on their header and size; nothing is decoded to refuse them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create(username='poster', email='poster@example.com')
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.client_for(self.user)
+        self.stored = set(self.storage.objects)
+
+    def test_header_checks(self):
+        header = validate_image(SimpleUploadedFile('ok.jpg', make_image((640, 480))))
+        self.assertEqual(tuple(header), ('JPEG', 640, 480))
+        for data, message in (
+            (png_header(8000, 6000), 'megapixels'),
+            (png_header(20000, 20000), 'too large'),     # past Pillow's own bomb limit
+            (make_image((10, 10), fmt='BMP'), 'valid image'),
+            (b'GIF89a' + b'\x00' * 3, 'valid image'),
+        ):
+            with self.subTest(message=message), self.assertRaisesRegex(serializers.ValidationError, message):
+                validate_image(SimpleUploadedFile('x.png', data))
+
+    def test_bomb_is_refused_without_decoding(self):
+        with mock.patch.object(PILImage.Image, 'load') as load:
+            response = self.api.post('/api/users/me/photo/', {
+                'photo': SimpleUploadedFile('bomb.png', png_header(30000, 30000), content_type='image/png'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('photo', response.json())
+        load.assert_not_called()
+        self.assertEqual(set(self.storage.objects), self.stored)
+
+    def test_post_image_gets_the_same_checks(self):
+        response = self.api.post('/api/posts/', {
+            'content': 'look', 'image': SimpleUploadedFile('bomb.png', png_header(9000, 9000)),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('megapixels', str(response.json()['data']['image']))
+        self.assertFalse(PostModel.objects.filter(author=self.user).exists())
+
+    def test_byte_cap_is_enforced_before_and_while_streaming(self):
+        # the declared length alone is too much: refused before the body is read
+        response = self.api.post('/api/users/me/photo/', {
+            'photo': SimpleUploadedFile('big.png', noise_png(300), content_type='image/png'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 413)
+        # within the form allowance, so caught by counting the file's bytes
+        response = self.api.post('/api/users/me/photo/', {
+            'photo': SimpleUploadedFile('big.png', noise_png(220), content_type='image/png'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('larger than', str(response.json()['photo']))
+
+    def test_handler_waits_for_a_header_split_across_chunks(self):
+        exif = PILImage.Exif()
+        exif[0x010F] = 'x' * 20000      # pushes the JPEG frame header past the first chunks
+        data = make_image((64, 48), exif=exif)
+        handler = ImageUploadHandler()
+        handler.new_file('photo', 'a.jpg', 'image/jpeg', None)
+        for start in range(0, len(data), 4096):
+            handler.receive_data_chunk(data[start:start + 4096], start)
+        handler.file_complete(len(data))
+        self.assertEqual(handler.errors, {})
+
+        handler.new_file('photo', 'b.jpg', 'image/jpeg', None)
+        handler.receive_data_chunk(b'not an image', 0)
+        handler.file_complete(12)
+        self.assertIn('photo', handler.errors)
+
+
+class CounterConsistencyTests(HermeticTestCase):
+    """Writes never overwrite or double-apply the denormalized counters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserModel.objects.create(username='counted', email='counted@example.com')
+
+    def test_profile_update_writes_only_the_edited_columns(self):
+        api = self.client_for(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = api.put('/api/users/update/', {'profile_info': 'hello'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('profile_info', updates[0])
+        self.assertNotIn('_count', updates[0])
+
+    def stale_delete(self, model, instance, url):
+        """DELETE ``url`` twice, the second time as if it had read the row before the first committed."""
+        api = self.client_for(self.user)
+        self.assertEqual(api.delete(url).status_code, 200)
+        with mock.patch.object(model.objects, 'get', return_value=instance):
+            return api.delete(url)
+
+    def test_concurrent_post_deletes_decrement_once(self):
+        post = PostModel.objects.create(author=self.user, content='bye')
+        UserModel.adjust_counter(self.user.id, 'posts_count', 1)
+        response = self.stale_delete(PostModel, post, f'/api/posts/{post.id}/delete/')
+        self.assertEqual(response.status_code, 404)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.posts_count, 0)
+
+    def test_concurrent_comment_deletes_decrement_once(self):
+        post = PostModel.objects.create(author=self.user, content='hi')
+        comment = CommentModel.objects.create(post=post, author=self.user, text='first')
+        PostModel.adjust_counter(post.id, 'comments_count', 1)
+        response = self.stale_delete(CommentModel, comment, f'/api/comments/{comment.id}/delete/')
+        self.assertEqual(response.status_code, 404)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_concurrent_unfollows_decrement_once(self):
+        star = UserModel.objects.create(username='star', email='star@example.com')
+        api = self.client_for(self.user)
+        self.assertEqual(api.post(f'/api/users/{star.id}/follow/').status_code, 201)
+        follow = FollowModel.objects.get(follower=self.user, following=star)
+        self.assertEqual(api.post(f'/api/users/{star.id}/follow/').status_code, 200)
+        # the second unfollow saw the row before the first one deleted it
+        stale = mock.MagicMock(first=mock.Mock(return_value=follow))
+        with mock.patch.object(FollowModel.objects, 'filter', return_value=stale):
+            self.assertEqual(api.post(f'/api/users/{star.id}/follow/').status_code, 200)
+        self.user.refresh_from_db()
+        star.refresh_from_db()
+        self.assertEqual((self.user.following_count, star.followers_count), (0, 0))
+
+    def test_comments_and_likes_move_the_post_counters(self):
+        post = PostModel.objects.create(author=self.user, content='hi')
+        UserModel.adjust_counter(self.user.id, 'posts_count', 1)
+        api = self.client_for(self.user)
+
+        def post_counts():
+            post.refresh_from_db()
+            return post.comments_count, post.likes_count
+
+        created = [api.post('/api/comments/create/', {'post_id': post.id, 'text': f'c{i}'}, format='json')
+                   for i in range(2)]
+        self.assertEqual([response.status_code for response in created], [201, 201])
+        self.assertEqual(api.post('/api/likes/toggle/', {'post_id': post.id}, format='json').status_code, 201)
+        likes.flush()
+        self.assertEqual(post_counts(), (2, 1))
+
+        comment_id = created[0].json()['comment']['id']
+        self.assertEqual(api.delete(f'/api/comments/{comment_id}/delete/').status_code, 200)
+        self.assertEqual(api.post('/api/likes/toggle/', {'post_id': post.id}, format='json').status_code, 200)
+        likes.flush()
+        self.assertEqual(post_counts(), (1, 0))
+
+    def test_follows_and_posts_move_the_user_counters(self):
+        star = UserModel.objects.create(username='star', email='star@example.com')
+        api = self.client_for(self.user)
+
+        def stats(user):
+            response = self.client.get(f'/api/users/{user.id}/stats/')
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()['data']['stats']
+            return data['followers_count'], data['following_count'], data['posts_count']
+
+        self.assertEqual(api.post(f'/api/users/{star.id}/follow/').status_code, 201)
+        created = api.post('/api/posts/', {'content': 'first'}, format='json')
+        self.assertEqual(created.status_code, 201, created.content)
+        self.assertEqual((stats(self.user), stats(star)), ((0, 1, 1), (1, 0, 0)))
+
+        self.assertEqual(api.post(f'/api/users/{star.id}/follow/').status_code, 200)
+        self.assertEqual(api.delete(f"/api/posts/{created.json()['post']['id']}/delete/").status_code, 200)
+        self.assertEqual((stats(self.user), stats(star)), ((0, 0, 0), (0, 0, 0)))
+
+    def test_reconcile_counters_repairs_drift(self):
+        fan = UserModel.objects.create(username='fan', email='fan@example.com')
+        post = PostModel.objects.create(author=self.user, content='hi')
+        LikeModel.objects.create(post=post, user=fan)
+        CommentModel.objects.create(post=post, author=fan, text='nice')
+        FollowModel.objects.create(follower=fan, following=self.user)
+        # as after a manual SQL edit
+        PostModel.objects.filter(id=post.id).update(likes_count=7, comments_count=0)
+        UserModel.objects.filter(id=self.user.id).update(followers_count=0, posts_count=3)
+
+        out = io.StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('would fix 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 7)
+
+        call_command('reconcile_counters', stdout=io.StringIO())
+        post.refresh_from_db()
+        self.user.refresh_from_db()
+        fan.refresh_from_db()
+        self.assertEqual((post.likes_count, post.comments_count), (1, 1))
+        self.assertEqual((self.user.followers_count, self.user.posts_count), (1, 1))
+        self.assertEqual((fan.following_count, fan.posts_count), (1, 0))
+
+    def test_list_counts_match_the_lists_after_deactivation(self):
+        star = UserModel.objects.create(username='star', email='star@example.com')
+        post = PostModel.objects.create(author=star, content='hi')
+        UserModel.adjust_counter(star.id, 'posts_count', 1)
+        for user in (self.user, star):
+            api = self.client_for(user)
+            self.assertEqual(api.post('/api/comments/create/', {'post_id': post.id, 'text': 'hi'},
+                                      format='json').status_code, 201)
+        self.assertEqual(self.client_for(self.user).post(f'/api/users/{star.id}/follow/').status_code, 201)
+        self.assertEqual(self.client_for(star).post(f'/api/users/{self.user.id}/follow/').status_code, 201)
+        self.user.soft_delete()
+
+        def counts(url, key):
+            data = self.client.get(url).json()
+            return data['count'], len(data[key])
+
+        self.assertEqual(counts(f'/api/posts/{post.id}/comments/', 'comments'), (1, 1))
+        self.assertEqual(counts(f'/api/users/{star.id}/followers/', 'followers'), (0, 0))
+        self.assertEqual(counts(f'/api/users/{star.id}/following/', 'following'), (0, 0))
+        self.user.restore()
+        self.assertEqual(counts(f'/api/posts/{post.id}/comments/', 'comments'), (2, 2))
+        self.assertEqual(counts(f'/api/users/{star.id}/followers/', 'followers'), (1, 1))
+        self.assertEqual(counts(f'/api/users/{star.id}/following/', 'following'), (1, 1))
+
+
+class KeysetFeedTests(HermeticTestCase):
+    """Following ``next`` through the global feed visits every post once, newest first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = UserModel.objects.create(username='author', email='author@example.com')
+        posts = PostModel.objects.bulk_create(
+            PostModel(author=cls.author, content=f'post {i}') for i in range(7)
+        )
+        base = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        # posts 1-4 share a timestamp, so only the id orders them
+        stamps = [base, base + timedelta(seconds=1), *[base + timedelta(seconds=2)] * 4,
+                  base + timedelta(seconds=3)]
+        for post, created_at in zip(posts, stamps):
+            PostModel.objects.filter(id=post.id).update(created_at=created_at)
+        ordered = sorted(zip(stamps, posts), key=lambda pair: (pair[0], pair[1].id), reverse=True)
+        cls.expected = [post.id for _, post in ordered]
+
+    def walk(self, size):
+        seen, cursor = [], None
+        while True:
+            params = {'size': size, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get('/api/posts/', params)
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            seen.extend(post['id'] for post in data['posts'])
+            cursor = data['next']
+            if cursor is None:
+                return seen
+
+    def test_pages_split_posts_with_equal_timestamps(self):
+        for size in (1, 2, 3, 7, 20):
+            self.assertEqual(self.walk(size), self.expected, f"size={size}")
+
+    def test_post_created_between_pages_does_not_shift_the_next_page(self):
+        first = self.client.get('/api/posts/', {'size': 3}).json()
+        PostModel.objects.create(author=self.author, content='newest')
+        rest = self.client.get('/api/posts/', {'size': 10, 'cursor': first['next']}).json()
+        self.assertEqual([post['id'] for post in first['posts'] + rest['posts']], self.expected)
+
+
+class LikedByMeTests(HermeticTestCase):
+    """``liked_by_me`` is the viewer's own like state, flushed or still buffered."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = UserModel.objects.create(username='author', email='author@example.com')
+        cls.fan = UserModel.objects.create(username='fan', email='fan@example.com')
+        cls.posts = PostModel.objects.bulk_create(
+            PostModel(author=cls.author, content=f'post {i}') for i in range(3)
+        )
+        LikeModel.objects.create(post=cls.posts[0], user=cls.fan)
+
+    def liked(self, client):
+        response = client.get('/api/posts/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return {post['id']: post['liked_by_me'] for post in response.json()['posts']}
+
+    def test_feed_reports_the_viewers_likes(self):
+        fan = self.client_for(self.fan)
+        first, second, third = (post.id for post in self.posts)
+        # not flushed yet
+        self.assertEqual(fan.post('/api/likes/toggle/', {'post_id': second}, format='json').status_code, 201)
+        self.assertEqual(self.liked(fan), {first: True, second: True, third: False})
+        self.assertEqual(self.liked(self.client_for(self.author)), {first: False, second: False, third: False})
+        self.assertEqual(self.liked(self.client), {first: False, second: False, third: False})
+
+        self.assertEqual(fan.post('/api/likes/toggle/', {'post_id': first}, format='json').status_code, 200)
+        self.assertEqual(self.liked(fan), {first: False, second: True, third: False})
+        self.assertFalse(fan.get(f'/api/posts/{first}/').json()['post']['liked_by_me'])
+        self.assertTrue(fan.get(f'/api/posts/{second}/').json()['post']['liked_by_me'])
+
+
+class LikeStateTests(HermeticTestCase):
+    """Redis like state loads from ``LikeModel`` plus the toggles not flushed yet."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = UserModel.objects.create(username='author', email='author@example.com')
+        cls.fan = UserModel.objects.create(username='fan', email='fan@example.com')
+        cls.post = PostModel.objects.create(author=cls.author, content='hello')
+
+    def test_flush_during_load_keeps_pending_toggles(self):
+        self.assertTrue(likes.toggle(self.post.id, self.fan.id))
+        likes.forget(self.post.id)
+        pending_for = likes._pending_for
+
+        def flush_first(redis, post_id):
+            # the beat task runs between the two reads
+            likes.flush()
+            return pending_for(redis, post_id)
+
+        with mock.patch.object(likes, '_pending_for', flush_first):
+            self.assertEqual(likes.get_count(self.post.id), 1)
+        self.assertEqual(likes.liked_post_ids(self.fan.id, [self.post.id]), {self.post.id})
+
+    def test_inactive_users_likes_are_not_counted(self):
+        LikeModel.objects.create(post=self.post, user=self.fan)
+        LikeModel.objects.create(post=self.post, user=self.author)
+        self.fan.soft_delete()
+        self.assertEqual(likes.get_count(self.post.id), 1)
+
+    def test_every_like_count_follows_the_active_only_rule(self):
+        for user in (self.fan, self.author):
+            self.assertTrue(likes.toggle(self.post.id, user.id))
+        likes.flush()
+        self.fan.ban()
+
+        def counts():
+            post = self.client.get(f'/api/posts/{self.post.id}/').json()['post']
+            listed = self.client.get(f'/api/posts/{self.post.id}/likes/').json()
+            redis = self.client.get(f'/api/posts/{self.post.id}/likes/count/').json()['like_count']
+            return post['likes_count'], listed['count'], len(listed['likes']), redis
+
+        self.assertEqual(counts(), (1, 1, 1, 1))
+        self.fan.restore()
+        self.assertEqual(counts(), (2, 2, 2, 2))
+        call_command('reconcile_counters', stdout=io.StringIO())
+        self.assertEqual(counts(), (2, 2, 2, 2))
+
+    def test_count_survives_state_expiring_right_after_load(self):
+        LikeModel.objects.create(post=self.post, user=self.fan)
+        load = likes.load
+
+        def load_then_expire(post_id):
+            count = load(post_id)
+            likes.forget(post_id)
+            return count
+
+        with mock.patch.object(likes, 'load', load_then_expire):
+            self.assertEqual(likes.get_count(self.post.id), 1)
+        self.assertIsNone(likes.get_count(self.post.id + 1000))
+
+
+class LoadTestArgumentTests(SimpleTestCase):
+    """``loadtest`` refuses arguments that would crash or run the wrong method mid-run."""
+
+    def test_scroll_pages_must_be_positive(self):
+        with self.assertRaisesMessage(CommandError, 'must be at least 1'):
+            call_command('loadtest', '--scroll-pages', '0')
+
+    def test_mix_accepts_only_scenarios(self):
+        for name in ('setup', 'run', '__init__', 'feed'):
+            with self.subTest(name=name), self.assertRaisesMessage(CommandError, f"Unknown scenario '{name}'"):
+                call_command('loadtest', '--mix', f'{name}=1')
+
+
+class HomeTimelineTests(HermeticTestCase):
+    """Fan-out, backfill, prune and the push/pull merge behind ``/api/feed/home/``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = UserModel.objects.create(username='reader', email='reader@example.com')
+        cls.pusher = UserModel.objects.create(username='pusher', email='pusher@example.com')
+        cls.celebrity = UserModel.objects.create(username='celebrity', email='celebrity@example.com',
+                                                 is_pull_author=True, followers_count=1)
+        cls.stranger = UserModel.objects.create(username='stranger', email='stranger@example.com')
+        FollowModel.objects.create(follower=cls.reader, following=cls.pusher)
+        FollowModel.objects.create(follower=cls.reader, following=cls.celebrity)
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.client_for(self.reader)
+        self.clock = 0
+        # one follower makes a pull author here
+        threshold = mock.patch.object(timeline, 'PULL_THRESHOLD', 1)
+        threshold.start()
+        self.addCleanup(threshold.stop)
+
+    def post(self, author):
+        """A post one minute newer than the previous one; fanned out like PostListCreateView does."""
+        self.clock += 1
+        post = PostModel.objects.create(author=author, content=f'post {self.clock}')
+        UserModel.adjust_counter(author.id, 'posts_count', 1)
+        created_at = datetime(2026, 1, 1, tzinfo=dt_timezone.utc) + timedelta(minutes=self.clock)
+        PostModel.objects.filter(id=post.id).update(created_at=created_at)
+        post.created_at = created_at
+        timeline.fan_out(post)
+        return post
+
+    def feed(self, size, cursor=None):
+        params = {'size': size, **({'cursor': cursor} if cursor else {})}
+        response = self.api.get('/api/feed/home/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def scroll(self, size):
+        ids, cursor = [], None
+        while True:
+            body = self.feed(size, cursor)
+            ids += [post['id'] for post in body['posts']]
+            cursor = body['next']
+            if not cursor:
+                return ids
+
+    def members(self, user):
+        return {int(m) for m in FakeRedis().zrange(timeline.timeline_key(user.id), 0, -1)}
+
+    def test_fan_out_reaches_materialized_followers_only(self):
+        self.post(self.pusher)
+        self.feed(5)     # materializes the reader's timeline
+        post = self.post(self.pusher)
+        self.assertIn(post.id, self.members(self.reader))
+        # the author's own timeline was never read, so it is not written
+        self.assertFalse(FakeRedis().exists(timeline.timeline_key(self.pusher.id)))
+        celebrity_post = self.post(self.celebrity)
+        self.assertNotIn(celebrity_post.id, self.members(self.reader))
+
+    def test_deleted_posts_do_not_end_pagination(self):
+        posts = [self.post(self.pusher) for _ in range(10)]
+        self.feed(3)
+        PostModel.objects.filter(id=posts[5].id).delete()
+        expected = [post.id for post in reversed(posts) if post.id != posts[5].id]
+        self.assertEqual(self.scroll(3), expected)
+
+    def test_delete_removes_the_post_from_timelines(self):
+        post = self.post(self.pusher)
+        self.feed(5)
+        self.assertIn(post.id, self.members(self.reader))
+        response = self.client_for(self.pusher).delete(f'/api/posts/{post.id}/delete/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn(post.id, self.members(self.reader))
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        old = [self.post(self.stranger) for _ in range(3)]
+        self.post(self.pusher)
+        self.feed(5)
+        self.assertEqual(self.api.post(f'/api/users/{self.stranger.id}/follow/').json()['is_following'], True)
+        self.assertTrue({post.id for post in old} <= self.members(self.reader))
+        self.assertEqual(self.api.post(f'/api/users/{self.stranger.id}/follow/').json()['is_following'], False)
+        self.assertFalse({post.id for post in old} & self.members(self.reader))
+
+    def test_pull_posts_are_merged_in_order_with_sources(self):
+        pushed = [self.post(self.pusher), self.post(self.pusher)]
+        pulled = self.post(self.celebrity)
+        newest = self.post(self.pusher)
+        body = self.feed(3)
+        self.assertEqual([post['id'] for post in body['posts']], [newest.id, pulled.id, pushed[1].id])
+        self.assertEqual(body['sources']['timeline']['used'], 2)
+        self.assertEqual(body['sources']['pull']['used'], 1)
+        self.assertEqual(self.scroll(2), [newest.id, pulled.id, pushed[1].id, pushed[0].id])
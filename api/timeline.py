@@ -0,0 +1,305 @@
+"""Home timelines materialized in Redis (fan-out on write).
+
+Each user's timeline is a sorted set ``timeline:<user_id>`` of post ids scored
+by the post's ``created_at`` in microseconds, capped at
+``HOME_TIMELINE_MAX_LENGTH`` entries. Writes happen in Celery tasks (see
+``api.tasks``); reads are a single ZREVRANGEBYSCORE followed by one bulk post
+fetch, repeated further down the set only when deleted posts or inactive
+authors leave the page short. Deleting a post removes it again. Timelines are only materialized for users who actually read them: a
+missing key is rebuilt from ``FollowModel`` on the next read and expires after
+``HOME_TIMELINE_TTL`` seconds of inactivity.
+
+Authors with at least ``HOME_TIMELINE_PULL_THRESHOLD`` followers are flagged
+``UserModel.is_pull_author`` and skipped by fan-out: one post from them would
+otherwise mean hundreds of thousands of ZADDs. Their posts are pulled from
+SQL at read time and k-way merged with the precomputed timeline.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from . import queries
+from .models import FollowModel, PostModel, UserModel
+from .pagination import encode_cursor, decode_cursor
+from .profiling import timed
+
+TIMELINE_MAX_LENGTH = getattr(settings, 'HOME_TIMELINE_MAX_LENGTH', 800)
+TIMELINE_TTL = getattr(settings, 'HOME_TIMELINE_TTL', 7 * 24 * 3600)
+BACKFILL_SIZE = getattr(settings, 'HOME_TIMELINE_BACKFILL_SIZE', 50)
+FANOUT_BATCH_SIZE = getattr(settings, 'HOME_TIMELINE_FANOUT_BATCH_SIZE', 1000)
+PULL_THRESHOLD = getattr(settings, 'HOME_TIMELINE_PULL_THRESHOLD', 10000)
+
+
+def timeline_key(user_id):
+    return f"timeline:{user_id}"
+
+
+def score_for(created_at):
+    """Microsecond timestamp; exact in a ZSET double until the year 2255."""
+    return int(created_at.timestamp() * 1_000_000)
+
+
+def _redis():
+    return timed(get_redis_connection("default"))
+
+
+def _add(pipe, user_id, entries):
+    """Queue ZADD + trim + TTL refresh of ``{post_id: score}`` entries on ``pipe``."""
+    key = timeline_key(user_id)
+    pipe.zadd(key, entries)
+    pipe.zremrangebyrank(key, 0, -(TIMELINE_MAX_LENGTH + 1))
+    pipe.expire(key, TIMELINE_TTL)
+
+
+def refresh_pull_flag(author_id):
+    """Re-evaluate whether ``author_id`` is over the pull threshold.
+
+    Returns:
+        bool: the (possibly updated) ``is_pull_author`` value
+    """
+    followers = UserModel.objects.filter(pk=author_id).values_list('followers_count', flat=True).first()
+    is_pull = (followers or 0) >= PULL_THRESHOLD
+    UserModel.objects.filter(pk=author_id).exclude(is_pull_author=is_pull).update(is_pull_author=is_pull)
+    return is_pull
+
+
+def fan_out(post):
+    """Push ``post`` into the materialized timelines of its author and followers.
+
+    Posts by pull authors only go to the author's own timeline.
+
+    Returns:
+        int: number of timelines written
+    """
+    entry = {post.id: score_for(post.created_at)}
+    redis = _redis()
+    if refresh_pull_flag(post.author_id):
+        return _push_batch(redis, [post.author_id], entry)
+
+    follower_ids = (
+        FollowModel.objects.filter(following_id=post.author_id, follower__is_active=True)
+        .values_list('follower_id', flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+
+    written = 0
+    batch = [post.author_id]
+    for follower_id in follower_ids:
+        batch.append(follower_id)
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            written += _push_batch(redis, batch, entry)
+            batch = []
+    if batch:
+        written += _push_batch(redis, batch, entry)
+    return written
+
+
+def _push_batch(redis, user_ids, entry):
+    # Skip users with no materialized timeline; their first read rebuilds it
+    pipe = redis.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.exists(timeline_key(user_id))
+    live = [user_id for user_id, exists in zip(user_ids, pipe.execute()) if exists]
+    if not live:
+        return 0
+
+    pipe = redis.pipeline(transaction=False)
+    for user_id in live:
+        _add(pipe, user_id, entry)
+    pipe.execute()
+    return len(live)
+
+
+def retract(post_id, author_id):
+    """Remove a deleted post from its author's and followers' timelines.
+
+    Returns:
+        int: number of timelines queued for the ZREM
+    """
+    redis = _redis()
+    follower_ids = (
+        FollowModel.objects.filter(following_id=author_id)
+        .values_list('follower_id', flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    written = 0
+    batch = [author_id]
+    for follower_id in follower_ids:
+        batch.append(follower_id)
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            written += _remove_batch(redis, batch, post_id)
+            batch = []
+    if batch:
+        written += _remove_batch(redis, batch, post_id)
+    return written
+
+
+def _remove_batch(redis, user_ids, post_id):
+    # ZREM on a missing timeline is a no-op, so no EXISTS round trip first
+    pipe = redis.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.zrem(timeline_key(user_id), post_id)
+    pipe.execute()
+    return len(user_ids)
+
+
+def rebuild(user_id):
+    """Materialize ``user_id``'s timeline from the follow graph (push authors only)."""
+    author_ids = list(
+        FollowModel.objects.filter(
+            follower_id=user_id, following__is_active=True, following__is_pull_author=False
+        ).values_list('following_id', flat=True)
+    )
+    author_ids.append(user_id)
+    rows = (
+        PostModel.objects.filter(author_id__in=author_ids)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:TIMELINE_MAX_LENGTH]
+    )
+    entries = {post_id: score_for(created_at) for post_id, created_at in rows}
+    if entries:
+        pipe = _redis().pipeline()
+        _add(pipe, user_id, entries)
+        pipe.execute()
+    return len(entries)
+
+
+def backfill(follower_id, author_id):
+    """Merge ``author_id``'s recent posts into a timeline after a follow."""
+    redis = _redis()
+    if not redis.exists(timeline_key(follower_id)):
+        return 0
+    if UserModel.objects.filter(pk=author_id, is_pull_author=True).exists():
+        return 0
+    rows = (
+        PostModel.objects.filter(author_id=author_id)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:BACKFILL_SIZE]
+    )
+    entries = {post_id: score_for(created_at) for post_id, created_at in rows}
+    if entries:
+        pipe = redis.pipeline()
+        _add(pipe, follower_id, entries)
+        pipe.execute()
+    return len(entries)
+
+
+def prune(follower_id, author_id):
+    """Drop ``author_id``'s posts from a timeline after an unfollow."""
+    redis = _redis()
+    key = timeline_key(follower_id)
+    members = [int(m) for m in redis.zrange(key, 0, -1)]
+    if not members:
+        return 0
+    stale = list(
+        PostModel.objects.filter(id__in=members, author_id=author_id)
+        .values_list('id', flat=True)
+    )
+    if stale:
+        redis.zrem(key, *stale)
+    return len(stale)
+
+
+def _pull(user_id, size, position):
+    """Newest posts by the pull authors ``user_id`` follows, in feed order."""
+    author_ids = list(
+        FollowModel.objects.filter(
+            follower_id=user_id, following__is_active=True, following__is_pull_author=True
+        ).values_list('following_id', flat=True)
+    )
+    if not author_ids:
+        return []
+    posts = queries.posts(PostModel.objects.filter(author_id__in=author_ids))
+    if position:
+        created_at, pk = position
+        posts = posts.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return list(posts.order_by('-created_at', '-id')[:size + 1])
+
+
+def merge(*streams):
+    """K-way merge of post streams already sorted newest first, dropping duplicates.
+
+    Yields:
+        tuple: ``(stream_index, post)``
+    """
+    def tag(index, stream):
+        for post in stream:
+            yield index, post
+
+    tagged = [tag(index, stream) for index, stream in enumerate(streams)]
+    seen = set()
+    for index, post in heapq.merge(*tagged, key=lambda item: (item[1].created_at, item[1].id), reverse=True):
+        if post.id not in seen:
+            seen.add(post.id)
+            yield index, post
+
+
+def read(user_id, size, cursor=None):
+    """Return one page of ``user_id``'s home timeline.
+
+    Returns:
+        tuple: ``(posts, next_cursor, sources)``; ``next_cursor`` is ``None``
+        on the last page and ``sources`` reports, for the ``timeline`` (push)
+        and ``pull`` sides, how many candidates were fetched and how many made
+        it into the page.
+    """
+    key = timeline_key(user_id)
+    position = decode_cursor(cursor) if cursor else None
+    max_score = score_for(position[0]) if position else '+inf'
+
+    def fetch(start, num):
+        pipe = _redis().pipeline(transaction=False)
+        pipe.exists(key)
+        pipe.zrevrangebyscore(key, max_score, '-inf', start=start, num=num, withscores=True)
+        pipe.expire(key, TIMELINE_TTL)
+        exists, rows, _ = pipe.execute()
+        return exists, rows
+
+    # +2: the cursor row itself comes back because the score bound is inclusive
+    num = size + 2
+    exists, rows = fetch(0, num)
+    if not exists and rebuild(user_id):
+        exists, rows = fetch(0, num)
+
+    bound = (score_for(position[0]), position[1]) if position else None
+    pushed = []
+    start = 0
+    while True:
+        candidates = [(int(score), int(member)) for member, score in rows]
+        if bound:
+            candidates = [c for c in candidates if c < bound]
+        ids = [post_id for _, post_id in candidates]
+        # deleted posts and inactive authors drop out here; keep reading
+        # until the page and one more are filled or the timeline runs out
+        pushed.extend(queries.posts(PostModel.objects.filter(id__in=ids, author__is_active=True)))
+        if len(pushed) > size or len(rows) < num:
+            break
+        start += num
+        num *= 2
+        _, rows = fetch(start, num)
+    pushed.sort(key=lambda post: (post.created_at, post.id), reverse=True)
+    pulled = _pull(user_id, size, position)
+
+    merged = []
+    used = [0, 0]
+    for index, post in merge(pushed, pulled):
+        if len(merged) == size + 1:
+            break
+        merged.append((index, post))
+
+    page = []
+    for index, post in merged[:size]:
+        used[index] += 1
+        page.append(post)
+
+    next_cursor = None
+    if len(merged) > size:
+        last = page[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    sources = {
+        'timeline': {'candidates': len(pushed), 'used': used[0]},
+        'pull': {'candidates': len(pulled), 'used': used[1]},
+    }
+    return page, next_cursor, sources
@@ -0,0 +1,355 @@
+"""Resumable chunked uploads for post images and profile photos.
+
+A client that cannot count on one long request finishing sends a file in
+numbered chunks:
+
+1. ``POST /api/uploads/`` with ``filename``, ``size``, ``purpose`` (``post`` or
+   ``profile``) and optionally ``content_type``. The response has the
+   ``upload_id``, the ``chunk_size`` to cut the file into and the number of
+   ``chunks``.
+2. ``PUT /api/uploads/<id>/chunks/<index>/`` once per chunk (0-based). The raw
+   bytes are the body. Every chunk is ``chunk_size`` bytes long except the
+   last one. A chunk can be sent again, and chunks may arrive in any order or
+   in parallel.
+3. ``GET /api/uploads/<id>/`` lists the chunks received and the ones still
+   ``missing``. After a dropped connection, send only those.
+4. ``POST /api/uploads/<id>/complete/`` assembles the chunks, checks the
+   image header (``api.validators.validate_image``), hands the file to the
+   media storage backend (``api.storage.store``) and returns its URL.
+5. Attach it with ``upload_id`` instead of a file: ``image`` on post create and
+   update, ``photo`` on ``POST /api/users/me/photo/``.
+
+The session is a Redis hash, ``uploads:<id>``, and the received chunk indexes
+are a set, ``uploads:<id>:received``. Both expire ``UPLOADS['TTL']`` seconds
+after the last chunk. Chunks are written to ``UPLOADS['SPOOL_DIR']/<id>/``.
+With several web servers, the spool must be shared storage, because chunks
+of one upload may reach different servers. ``purge_stale_uploads`` (Celery
+beat) removes spool directories whose session has expired.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+from rest_framework import serializers
+
+from . import storage
+from .errors import ErrorCode
+from .validators import image_config, validate_image
+
+logger = logging.getLogger("api")
+
+DEFAULTS = {
+    'CHUNK_SIZE': 4 * 1024 * 1024,
+    'MAX_SIZE': 50 * 1024 * 1024,
+    'TTL': 24 * 3600,
+    'SPOOL_DIR': None,
+}
+
+# purpose -> storage folder; ``post_images`` is PostModel.image's upload_to
+PURPOSES = {'post': 'post_images', 'profile': 'profiles'}
+
+OPEN, COMPLETE = 'open', 'complete'
+
+# bytes read from the request body per write
+_READ_SIZE = 64 * 1024
+
+# seconds the completion lock and a chunk write's claim outlive a crashed worker
+LOCK_TIMEOUT = 300
+
+# Claims a chunk write unless the session is no longer open or a completion
+# holds the lock; the lock is only taken while no write is claimed, so the
+# chunks never change under the assembly.
+BEGIN_WRITE_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'state') ~= ARGV[1] then return 0 end
+if redis.call('EXISTS', KEYS[2]) == 1 then return -1 end
+-- a claim that outlived its expiry may have been released below zero
+if redis.call('INCR', KEYS[3]) < 1 then redis.call('SET', KEYS[3], 1) end
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+return 1
+"""
+
+
+class UploadError(Exception):
+    """A request the upload session cannot accept; carries the API error and HTTP status."""
+
+    def __init__(self, message, error=ErrorCode.VALIDATION_FAILED, status=400):
+        super().__init__(message)
+        self.error = error
+        self.status = status
+
+
+def config(name):
+    return getattr(settings, 'UPLOADS', {}).get(name, DEFAULTS[name])
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _key(upload_id):
+    return f"uploads:{upload_id}"
+
+
+def _received_key(upload_id):
+    return f"uploads:{upload_id}:received"
+
+
+def _lock_key(upload_id):
+    return f"uploads:{upload_id}:lock"
+
+
+def _writers_key(upload_id):
+    return f"uploads:{upload_id}:writers"
+
+
+def spool_dir(upload_id=None):
+    directory = config('SPOOL_DIR') or os.path.join(settings.MEDIA_ROOT, 'upload-chunks')
+    return os.path.join(directory, upload_id) if upload_id else directory
+
+
+def _chunk_path(upload_id, index):
+    return os.path.join(spool_dir(upload_id), f"{index}.part")
+
+
+def _decode(raw):
+    session = {key.decode(): value.decode() for key, value in raw.items()}
+    for field in ('user_id', 'size', 'chunk_size', 'chunks'):
+        session[field] = int(session[field])
+    return session
+
+
+def create(user_id, purpose, filename, size, content_type=None):
+    """Open an upload session; returns it as ``status()`` does."""
+    if purpose not in PURPOSES:
+        raise UploadError(f"purpose must be one of {', '.join(PURPOSES)}")
+    # uploads are images, so the image byte cap applies too
+    max_size = min(config('MAX_SIZE'), image_config('MAX_BYTES'))
+    if size > max_size:
+        raise UploadError(f"File is larger than {max_size} bytes", status=413)
+
+    chunk_size = config('CHUNK_SIZE')
+    session = {
+        'id': uuid.uuid4().hex,
+        'user_id': user_id,
+        'purpose': purpose,
+        'filename': os.path.basename(filename),
+        'content_type': content_type or '',
+        'size': size,
+        'chunk_size': chunk_size,
+        'chunks': -(-size // chunk_size),
+        'state': OPEN,
+        'name': '',
+    }
+    with _redis().pipeline() as pipe:
+        pipe.hset(_key(session['id']), mapping=session)
+        pipe.expire(_key(session['id']), config('TTL'))
+        pipe.execute()
+    return status(session, received=set())
+
+
+def get(upload_id, user_id):
+    """The session, if it exists and belongs to ``user_id``; other users' sessions are not found."""
+    raw = _redis().hgetall(_key(upload_id))
+    if not raw:
+        raise UploadError("Upload not found or expired", ErrorCode.UPLOAD_NOT_FOUND, 404)
+    session = _decode(raw)
+    if session['user_id'] != user_id:
+        raise UploadError("Upload not found or expired", ErrorCode.UPLOAD_NOT_FOUND, 404)
+    return session
+
+
+def _received(upload_id):
+    return {int(index) for index in _redis().smembers(_received_key(upload_id))}
+
+
+def chunk_length(session, index):
+    if not 0 <= index < session['chunks']:
+        raise UploadError(f"Chunk index must be between 0 and {session['chunks'] - 1}")
+    if index == session['chunks'] - 1:
+        return session['size'] - index * session['chunk_size']
+    return session['chunk_size']
+
+
+def write_chunk(session, index, stream, content_length):
+    """Spool chunk ``index`` from ``stream``, which must hold exactly its length.
+
+    Rejected on the ``Content-Length`` alone before any byte is read when the
+    length is wrong. The chunk is written to a temporary file and renamed,
+    so a retried or parallel PUT of the same chunk never leaves a torn file.
+    Refused with 409 while ``complete()`` is assembling the upload.
+    """
+    if session['state'] != OPEN:
+        raise UploadError("Upload is already complete", status=409)
+    expected = chunk_length(session, index)
+    if content_length != expected:
+        raise UploadError(f"Chunk {index} must be {expected} bytes, got {content_length}")
+
+    redis = _redis()
+    claimed = redis.register_script(BEGIN_WRITE_SCRIPT)(
+        keys=[_key(session['id']), _lock_key(session['id']), _writers_key(session['id'])],
+        args=[OPEN, LOCK_TIMEOUT],
+    )
+    if claimed == 0:
+        raise UploadError("Upload is already complete", status=409)
+    if claimed < 0:
+        raise UploadError("Upload is being completed", ErrorCode.UPLOAD_IN_PROGRESS, 409)
+    try:
+        _write_claimed(session, index, stream, expected)
+    finally:
+        redis.decr(_writers_key(session['id']))
+
+
+def _write_claimed(session, index, stream, expected):
+    directory = spool_dir(session['id'])
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{index}-")
+    try:
+        written = 0
+        with os.fdopen(fd, 'wb') as out:
+            while written <= expected:
+                data = stream.read(min(_READ_SIZE, expected + 1 - written))
+                if not data:
+                    break
+                out.write(data)
+                written += len(data)
+        if written != expected:
+            raise UploadError(f"Chunk {index} must be {expected} bytes, received {written}")
+        os.replace(tmp, _chunk_path(session['id'], index))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    ttl = config('TTL')
+    with _redis().pipeline() as pipe:
+        pipe.sadd(_received_key(session['id']), index)
+        pipe.expire(_received_key(session['id']), ttl)
+        pipe.expire(_key(session['id']), ttl)
+        pipe.execute()
+
+
+def status(session, received=None):
+    if received is None:
+        received = _received(session['id']) if session['state'] == OPEN else set(range(session['chunks']))
+    data = {
+        'upload_id': session['id'],
+        'purpose': session['purpose'],
+        'state': session['state'],
+        'size': session['size'],
+        'chunk_size': session['chunk_size'],
+        'chunks': session['chunks'],
+        'received': sorted(received),
+        'missing': [index for index in range(session['chunks']) if index not in received],
+    }
+    if session['state'] == COMPLETE:
+        data['url'] = storage.public_url(session['name'])
+    return data
+
+
+def _assemble(session, path):
+    with open(path, 'wb') as out:
+        for index in range(session['chunks']):
+            with open(_chunk_path(session['id'], index), 'rb') as part:
+                shutil.copyfileobj(part, out, _READ_SIZE)
+
+
+def complete(session):
+    """Assemble the chunks and store the file; returns the finished session.
+
+    Safe to call again: a complete session is returned unchanged. Only one
+    call assembles at a time: a call made while another holds the Redis lock,
+    or while a chunk is being written, is refused with 409 at once rather than
+    holding the worker.
+    """
+    if session['state'] == COMPLETE:
+        return session
+    redis = _redis()
+    lock = redis.lock(_lock_key(session['id']), timeout=LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        raise UploadError("Completion of this upload is already in progress; try again later",
+                          ErrorCode.UPLOAD_IN_PROGRESS, 409)
+    try:
+        if int(redis.get(_writers_key(session['id'])) or 0) > 0:
+            raise UploadError("Chunks of this upload are still being written; try again later",
+                              ErrorCode.UPLOAD_IN_PROGRESS, 409)
+        session = _complete_locked(session)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            # held longer than its timeout; the work it guarded is done
+            logger.warning(f"Upload {session['id']} completion lock expired before release")
+    return session
+
+
+def _complete_locked(session):
+    session = get(session['id'], session['user_id'])
+    if session['state'] == COMPLETE:
+        return session
+    missing = set(range(session['chunks'])) - _received(session['id'])
+    if missing:
+        raise UploadError(f"{len(missing)} chunk(s) missing: {sorted(missing)[:20]}",
+                          ErrorCode.UPLOAD_INCOMPLETE, 409)
+
+    assembled = os.path.join(spool_dir(session['id']), 'assembled')
+    _assemble(session, assembled)
+    with open(assembled, 'rb') as f:
+        file = File(f, name=session['filename'])
+        try:
+            validate_image(file)
+        except serializers.ValidationError as e:
+            # the content itself is wrong: sending it again cannot help
+            discard(session['id'])
+            raise UploadError(str(e.detail[0]))
+        name = storage.store(file, PURPOSES[session['purpose']])
+
+    session.update(state=COMPLETE, name=name)
+    with _redis().pipeline() as pipe:
+        pipe.hset(_key(session['id']), mapping={'state': COMPLETE, 'name': name})
+        pipe.delete(_received_key(session['id']), _writers_key(session['id']))
+        pipe.execute()
+    shutil.rmtree(spool_dir(session['id']), ignore_errors=True)
+    logger.info(f"Upload {session['id']} complete: {session['size']} bytes -> {name}")
+    return session
+
+
+def attach(upload_id, user_id, purpose):
+    """The storage name of a complete upload of ``user_id`` made for ``purpose``."""
+    session = get(upload_id, user_id)
+    if session['purpose'] != purpose:
+        raise UploadError(f"Upload was made for purpose {session['purpose']!r}, not {purpose!r}")
+    if session['state'] != COMPLETE:
+        raise UploadError("Upload is not complete", ErrorCode.UPLOAD_INCOMPLETE, 409)
+    return session['name']
+
+
+def discard(upload_id):
+    _redis().delete(_key(upload_id), _received_key(upload_id), _writers_key(upload_id))
+    shutil.rmtree(spool_dir(upload_id), ignore_errors=True)
+
+
+def purge_stale(min_age=None):
+    """Remove spool directories of sessions that expired; returns how many were removed.
+
+    Directories younger than ``min_age`` seconds (default: ``TTL``) are kept,
+    since their session may still be in the middle of being created.
+    """
+    directory = spool_dir()
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - (config('TTL') if min_age is None else min_age)
+    removed = 0
+    for entry in os.scandir(directory):
+        if not entry.is_dir() or entry.stat().st_mtime > cutoff:
+            continue
+        if not _redis().exists(_key(entry.name)):
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
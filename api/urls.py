@@ -7,6 +7,7 @@ from .views import (
     CurrentUserView,
     UpdateProfileView,
     UserDetailView,
+    UserStatsView,
     PostListCreateView,
     PostDetailView,
     PostUpdateView,
@@ -23,6 +24,13 @@ from .views import (
     MyPostsView,
     GetLikeCountView,
     UploadProfilePhotoView,
+    HomeFeedView,
+    LikeStatusView,
+    ProfileDownloadView,
+    UploadCreateView,
+    UploadStatusView,
+    UploadChunkView,
+    UploadCompleteView,
 )
 
 urlpatterns = [
@@ -36,6 +44,7 @@ urlpatterns = [
     path('users/me/', CurrentUserView.as_view(), name='current-user'),
     path('users/update/', UpdateProfileView.as_view(), name='update-profile'),
     path('users/<int:user_id>/', UserDetailView.as_view(), name='user-detail'),
+    path('users/<int:user_id>/stats/', UserStatsView.as_view(), name='user-stats'),
     path('users/<int:user_id>/posts/', UserPostsView.as_view(), name='user-posts'),
     path("users/me/photo/", UploadProfilePhotoView.as_view(), name="upload-profile-photo"),
 
@@ -49,6 +58,7 @@ urlpatterns = [
     
     # Like 
     path('likes/toggle/', LikeToggleView.as_view(), name='like-toggle'),
+    path('likes/status/', LikeStatusView.as_view(), name='like-status'),
     path('posts/<int:post_id>/likes/', PostLikesView.as_view(), name='post-likes'),
     path('posts/<int:post_id>/likes/count/', GetLikeCountView.as_view(), name='get-like-count'),
     
@@ -61,4 +71,16 @@ urlpatterns = [
     path('users/<int:user_id>/follow/', FollowToggleView.as_view(), name='follow-toggle'),
     path('users/<int:user_id>/followers/', UserFollowersView.as_view(), name='user-followers'),
     path('users/<int:user_id>/following/', UserFollowingView.as_view(), name='user-following'),
+
+    # Feed
+    path('feed/home/', HomeFeedView.as_view(), name='home-feed'),
+
+    # Chunked uploads
+    path('uploads/', UploadCreateView.as_view(), name='upload-create'),
+    path('uploads/<slug:upload_id>/', UploadStatusView.as_view(), name='upload-status'),
+    path('uploads/<slug:upload_id>/chunks/<int:index>/', UploadChunkView.as_view(), name='upload-chunk'),
+    path('uploads/<slug:upload_id>/complete/', UploadCompleteView.as_view(), name='upload-complete'),
+
+    # Profiling
+    path('profiles/<slug:profile_id>/', ProfileDownloadView.as_view(), name='profile-download'),
 ]
@@ -0,0 +1,40 @@
+"""Cached snapshots of ``UserModel`` rows for request authentication.
+
+A snapshot is a plain tuple of ``SNAPSHOT_FIELDS`` (no password hash) stored
+under ``user:v2:<id>``. ``user_from_snapshot`` turns it back into a
+``UserModel`` instance whose other fields are deferred, so touching them
+lazily loads from the database and ``save()`` only writes the loaded columns.
+
+``UserModel.save`` and ``UserModel.set_password`` invalidate the snapshot,
+which covers ``soft_delete``, ``ban``, ``restore`` and profile/photo updates.
+Snapshots live in the two-tier ``hot_cache``, so invalidation also reaches the
+in-process tier of every worker.
+"""
+from .cache import hot_cache
+
+# Must follow the model's field declaration order (see Model.from_db)
+SNAPSHOT_FIELDS = ('id', 'username', 'email', 'profile_info', 'photo_url', 'is_active', 'is_staff')
+SNAPSHOT_TTL = 300
+
+
+def snapshot_key(user_id):
+    # bump the version whenever SNAPSHOT_FIELDS changes
+    return f"user:v2:{user_id}"
+
+
+def make_snapshot(user):
+    return tuple(getattr(user, field) for field in SNAPSHOT_FIELDS)
+
+
+def user_from_snapshot(snapshot):
+    from .models import UserModel
+
+    return UserModel.from_db('default', SNAPSHOT_FIELDS, snapshot)
+
+
+def store_user_snapshot(user):
+    hot_cache.set(snapshot_key(user.pk), make_snapshot(user), SNAPSHOT_TTL)
+
+
+def invalidate_user_snapshot(user_id):
+    hot_cache.delete(snapshot_key(user_id))
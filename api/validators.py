@@ -1,6 +1,24 @@
+import io
 import re
+import struct
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from PIL import Image, UnidentifiedImageError
 from rest_framework import serializers
 
+IMAGE_DEFAULTS = {
+    'MAX_BYTES': 20 * 1024 * 1024,
+    'MAX_MEGAPIXELS': 40,
+    'FORMATS': ('JPEG', 'PNG', 'WEBP', 'GIF'),
+    # how much of a streaming upload is buffered to find the image header;
+    # JPEG EXIF blocks before the frame header can reach 64 KiB
+    'HEADER_BYTES': 256 * 1024,
+}
+
+ImageHeader = namedtuple('ImageHeader', 'format width height')
+
 
 def validate_password_strength(password: str, username: str = None, email: str = None):
     """Validate password strength according to recommended rules.
@@ -48,3 +66,124 @@ def validate_password_strength(password: str, username: str = None, email: str =
         raise serializers.ValidationError(errors)
 
     return True
+
+
+def image_config(name):
+    return getattr(settings, 'IMAGE_UPLOADS', {}).get(name, IMAGE_DEFAULTS[name])
+
+
+def _open_header(file):
+    """``ImageHeader`` of ``file``, or None when it holds no image of an allowed format (yet).
+
+    Pillow's ``Image.open`` is lazy: it parses the header and stops before the
+    pixel data. Only the plugins of ``IMAGE_UPLOADS['FORMATS']`` are tried.
+    """
+    try:
+        with Image.open(file, formats=image_config('FORMATS')) as image:
+            return ImageHeader(image.format, image.width, image.height)
+    except Image.DecompressionBombError:
+        raise serializers.ValidationError("Image dimensions are too large.")
+    except (UnidentifiedImageError, SyntaxError, OSError, ValueError, struct.error):
+        return None
+    finally:
+        file.seek(0)
+
+
+def _check_dimensions(header):
+    megapixels = image_config('MAX_MEGAPIXELS')
+    if header.width * header.height > megapixels * 1_000_000:
+        raise serializers.ValidationError(
+            f"Image is {header.width}x{header.height}; at most {megapixels} megapixels are allowed."
+        )
+
+
+def _invalid_image_message():
+    return f"Upload a valid image ({', '.join(image_config('FORMATS'))})."
+
+
+def _too_large_message():
+    return f"Image is larger than {image_config('MAX_BYTES') / 2 ** 20:.3g} MB."
+
+
+def read_image_header(file):
+    """Format and dimensions of the image in ``file``, from its header alone.
+
+    Raises:
+        serializers.ValidationError: not an image of an allowed format, or
+            dimensions above ``IMAGE_UPLOADS['MAX_MEGAPIXELS']``
+    """
+    header = _open_header(file)
+    if header is None:
+        raise serializers.ValidationError(_invalid_image_message())
+    _check_dimensions(header)
+    return header
+
+
+def validate_image(file):
+    """Byte cap, then header checks, for an uploaded image; nothing is decoded.
+
+    Returns:
+        ImageHeader
+    """
+    if file.size > image_config('MAX_BYTES'):
+        raise serializers.ValidationError(_too_large_message())
+    return read_image_header(file)
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Checks image files while a multipart body streams in.
+
+    The handler goes first in ``request.upload_handlers``. It buffers the
+    first ``HEADER_BYTES`` of each file and checks the header as soon as it can
+    be parsed. A file is dropped with ``SkipFile`` as soon as it fails the
+    header checks or grows past ``MAX_BYTES``. The rest of it is then read from
+    the connection, but not stored or decoded. The reasons are kept in
+    ``errors`` (field name to messages) for the view to report.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.errors = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = bytearray()
+        self.checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > image_config('MAX_BYTES'):
+            self.reject(_too_large_message())
+        if not self.checked:
+            limit = image_config('HEADER_BYTES')
+            self.header += raw_data[:limit - len(self.header)]
+            self.check(final=len(self.header) >= limit)
+        return raw_data
+
+    def file_complete(self, file_size):
+        # SkipFile cannot be raised from here; the recorded error is enough
+        if not self.checked:
+            try:
+                self.check(final=True)
+            except SkipFile:
+                pass
+        return None
+
+    def check(self, final):
+        try:
+            header = _open_header(io.BytesIO(self.header))
+            if header is None:
+                # a header cut short does not parse either: wait for more bytes
+                if final:
+                    self.reject(_invalid_image_message())
+                return
+            _check_dimensions(header)
+        except serializers.ValidationError as e:
+            self.reject(e.detail[0])
+        self.checked = True
+
+    def reject(self, message):
+        self.errors.setdefault(self.field_name, []).append(str(message))
+        self.checked = True
+        raise SkipFile()
@@ -1,22 +1,75 @@
+import logging
+
 from httpx import request
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.pagination import PageNumberPagination
 from django.contrib.auth.hashers import check_password
+from django.db import transaction
+from django.core.files.uploadedfile import UploadedFile
+from django.http import HttpResponse
 
-from api.storage import upload_image
 from .models import UserModel, PostModel, CommentModel, LikeModel, FollowModel
-from .serializers import UploadPhotoSerializer, UserSerializer, PublicUserSerializer, PostSerializer, CommentSerializer, LikeSerializer, FollowSerializer, ApiResponseSerializer, RegisterSerializer
+from .serializers import UploadPhotoSerializer, UploadSessionSerializer, UserSerializer, PublicUserSerializer, PostSerializer, CommentSerializer, LikeSerializer, FollowSerializer, ApiResponseSerializer, RegisterSerializer
 from .jwt_provider import generate_tokens, get_user_from_token, refresh_access_token, decode_token, blacklist_token
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 from rest_framework.parsers import FormParser, MultiPartParser, JSONParser
-from .serializers import LoginSerializer, UserSerializer
-from .tasks import send_confirmation_email
+from .serializers import LoginSerializer, UserSerializer, LikeStatusSerializer, UserStatsSerializer
+from .tasks import send_confirmation_email, fan_out_post, retract_post, backfill_home_timeline, prune_home_timeline, process_post_image, upload_profile_photo
 from .utils import api_response
 from .errors import ErrorCode
+from .pagination import KeysetPagination
+from .exceptions import RequestTooLarge
+from .validators import ImageUploadHandler, image_config, validate_image
+from . import timeline, likes, queries, flamegraph, storage, uploads
+
+logger = logging.getLogger("api")
+
+
+KEYSET_PARAMETERS = [
+    OpenApiParameter('cursor', OpenApiTypes.STR, description='Opaque `next` token from the previous page'),
+    OpenApiParameter('size', OpenApiTypes.INT, description='Page size (default 20, capped by KEYSET_MAX_PAGE_SIZE)'),
+]
+COUNT_PARAMETER = OpenApiParameter('count', OpenApiTypes.BOOL, description='Include the total `count` (default true)')
+
+
+def enqueue_image_processing(post):
+    """Render the image variants in the background; the response does not wait for them."""
+    try:
+        process_post_image.delay(post.id)
+    except Exception as e:
+        # the post is served with its original image until the variants exist
+        logger.warning(f"Could not queue image processing for post {post.id}: {e}")
+
+
+class ImageUploadMixin:
+    """Checks image files while the request body streams in (``validators.ImageUploadHandler``).
+
+    A body whose ``Content-Length`` already exceeds ``IMAGE_UPLOADS['MAX_BYTES']``
+    is refused before any of it is read.
+    """
+    # room for the multipart boundaries and the other form fields
+    FORM_OVERHEAD = 64 * 1024
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > image_config('MAX_BYTES') + self.FORM_OVERHEAD:
+            raise RequestTooLarge()
+        self.image_upload_handler = ImageUploadHandler(request._request)
+        request.upload_handlers.insert(0, self.image_upload_handler)
+
+    def check_image_uploads(self):
+        """Parse the body and raise ``ValidationError`` for files the handler refused."""
+        self.request.data
+        if self.image_upload_handler.errors:
+            raise serializers.ValidationError(self.image_upload_handler.errors)
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -151,6 +204,22 @@ class UserDetailView(APIView):
         
 
 
+class UserStatsView(APIView):
+    permission_classes = [AllowAny]
+
+    @extend_schema(responses={200: UserStatsSerializer, 404: OpenApiTypes.OBJECT}, operation_id='user_stats')
+    def get(self, request, user_id):
+        try:
+            # counters are denormalized on the user row, so this is a single primary key lookup
+            user = UserModel.objects.only(*UserStatsSerializer.Meta.fields).get(id=user_id, is_active=True)
+            serializer = UserStatsSerializer(user)
+            return api_response(ErrorCode.SUCCESS, request=request, message="User stats", data={'stats': serializer.data}, status_code=status.HTTP_200_OK)
+        except UserModel.DoesNotExist:
+            return api_response(ErrorCode.USER_NOT_FOUND, request=request, message="User not found", status_code=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_400_BAD_REQUEST)
+
+
 class CurrentUserView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -192,12 +261,16 @@ class UpdateProfileView(APIView):
             
             # Update user fields
             user.profile_info = request.data.get('profile_info', user.profile_info)
+            changed = ['profile_info']
             if 'password' in request.data:
                 # validate password before setting
                 from .validators import validate_password_strength
                 validate_password_strength(request.data['password'], username=user.username, email=user.email)
                 user.set_password(request.data['password'])
-            user.save()
+                changed.append('password')
+            # only the edited columns: request.user may be a stale copy whose
+            # counters would overwrite concurrent F() updates
+            user.save(update_fields=changed)
             
             serializer = UserSerializer(user)
             return api_response(ErrorCode.SUCCESS, request=request, message='Profile updated successfully', data={}, status_code=status.HTTP_200_OK)
@@ -205,7 +278,7 @@ class UpdateProfileView(APIView):
             return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_400_BAD_REQUEST)
 
 
-class PostListCreateView(APIView):
+class PostListCreateView(ImageUploadMixin, APIView):
     # Provide a serializer_class so schema generators can infer request/response
     serializer_class = PostSerializer
     
@@ -214,12 +287,20 @@ class PostListCreateView(APIView):
             return [AllowAny()]
         return [IsAuthenticated()]
     
+    @extend_schema(
+        parameters=KEYSET_PARAMETERS,
+        responses={200: OpenApiTypes.OBJECT},
+        operation_id='posts_feed',
+    )
     def get(self, request):
         try:
-            posts = PostModel.objects.filter(author__is_active=True).order_by('-created_at')
-            serializer = PostSerializer(posts, many=True)
+            posts = queries.posts(PostModel.objects.filter(author__is_active=True))
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(posts, request)
+            serializer = PostSerializer(page, many=True, context={'viewer': request.user})
             return Response({
-                'posts': serializer.data
+                'posts': serializer.data,
+                'next': paginator.next_cursor
             }, status=status.HTTP_200_OK)
         except Exception as e:
             return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_400_BAD_REQUEST)
@@ -235,19 +316,38 @@ class PostListCreateView(APIView):
                     status_code=status.HTTP_403_FORBIDDEN
                 )
 
+            self.check_image_uploads()
             content = request.data.get('content', '')
             image = request.data.get('image', None)
+            if isinstance(image, UploadedFile):
+                validate_image(image)
+            if request.data.get('upload_id'):
+                # a finished chunked upload (api/uploads.py) is already in storage
+                image = uploads.attach(request.data['upload_id'], user.id, 'post')
             
-            post = PostModel.objects.create(
-                author=user,
-                content=content,
-                image=image
-            )
-            serializer = PostSerializer(post)
+            with transaction.atomic():
+                post = PostModel.objects.create(
+                    author=user,
+                    content=content,
+                    image=image
+                )
+                UserModel.adjust_counter(user.id, 'posts_count', 1)
+            # push into followers' home timelines (best-effort)
+            try:
+                fan_out_post.delay(post.id)
+            except Exception:
+                pass
+            if post.image:
+                enqueue_image_processing(post)
+            serializer = PostSerializer(post, context={'viewer': request.user})
             return Response({
                 'message': 'Post created successfully',
                 'post': serializer.data
             }, status=status.HTTP_201_CREATED)
+        except serializers.ValidationError as e:
+            return api_response(ErrorCode.VALIDATION_FAILED, request=request, data=e.detail, status_code=status.HTTP_400_BAD_REQUEST)
+        except uploads.UploadError as e:
+            return api_response(e.error, request=request, message=str(e), status_code=e.status)
         except Exception as e:
             return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_400_BAD_REQUEST)
 
@@ -259,7 +359,7 @@ class PostDetailView(APIView):
     def get(self, request, post_id):
         try:
             post = PostModel.objects.get(id=post_id)
-            serializer = PostSerializer(post)
+            serializer = PostSerializer(post, context={'viewer': request.user})
             return Response({
                 'post': serializer.data
             }, status=status.HTTP_200_OK)
@@ -269,7 +369,7 @@ class PostDetailView(APIView):
             return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_400_BAD_REQUEST)
 
 
-class PostUpdateView(APIView):
+class PostUpdateView(ImageUploadMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(request=PostSerializer, responses={200: PostSerializer, 403: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='posts_update')
@@ -289,18 +389,32 @@ class PostUpdateView(APIView):
             if post.author.id != user.id:
                 return api_response(ErrorCode.GENERIC_ERROR, request=request, message="You don't have permission to update this post", status_code=status.HTTP_403_FORBIDDEN)
             
+            self.check_image_uploads()
+            if isinstance(request.data.get('image'), UploadedFile):
+                validate_image(request.data['image'])
             post.content = request.data.get('content', post.content)
-            if 'image' in request.data:
-                post.image = request.data['image']
+            image_changed = 'image' in request.data or bool(request.data.get('upload_id'))
+            if image_changed:
+                if request.data.get('upload_id'):
+                    post.image = uploads.attach(request.data['upload_id'], user.id, 'post')
+                else:
+                    post.image = request.data['image']
+                post.image_variants = {}
             post.save()
+            if image_changed and post.image:
+                enqueue_image_processing(post)
             
-            serializer = PostSerializer(post)
+            serializer = PostSerializer(post, context={'viewer': request.user})
             return Response({
                 'message': 'Post updated successfully',
                 'post': serializer.data
             }, status=status.HTTP_200_OK)
         except PostModel.DoesNotExist:
             return api_response(ErrorCode.POST_NOT_FOUND, request=request, message="Post not found", status_code=status.HTTP_404_NOT_FOUND)
+        except serializers.ValidationError as e:
+            return api_response(ErrorCode.VALIDATION_FAILED, request=request, data=e.detail, status_code=status.HTTP_400_BAD_REQUEST)
+        except uploads.UploadError as e:
+            return api_response(e.error, request=request, message=str(e), status_code=e.status)
         except Exception as e:
             return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_400_BAD_REQUEST)
 
@@ -325,7 +439,18 @@ class PostDeleteView(APIView):
             if post.author.id != user.id:
                 return api_response(ErrorCode.GENERIC_ERROR, request=request, message="You don't have permission to delete this post", status_code=status.HTTP_403_FORBIDDEN)
             
-            post.delete()
+            with transaction.atomic():
+                deleted, _ = post.delete()
+                # a concurrent delete may have removed the row since get()
+                if not deleted:
+                    raise PostModel.DoesNotExist
+                UserModel.adjust_counter(post.author_id, 'posts_count', -1)
+            likes.forget(post_id)
+            # drop it from home timelines (best-effort; reads skip it anyway)
+            try:
+                retract_post.delay(post_id, post.author_id)
+            except Exception:
+                pass
             return Response({
                 'message': 'Post deleted successfully'
             }, status=status.HTTP_200_OK)
@@ -342,8 +467,8 @@ class UserPostsView(APIView):
     def get(self, request, user_id):
         try:
             user = UserModel.objects.get(id=user_id, is_active=True)
-            posts = PostModel.objects.filter(author=user).order_by('-created_at')
-            serializer = PostSerializer(posts, many=True)
+            posts = queries.posts(PostModel.objects.filter(author=user)).order_by('-created_at')
+            serializer = PostSerializer(posts, many=True, context={'viewer': request.user})
             return Response({
                 'posts': serializer.data
             }, status=status.HTTP_200_OK)
@@ -367,20 +492,18 @@ class LikeToggleView(APIView):
                     status_code=status.HTTP_403_FORBIDDEN
                     )
             
-            post_id = request.data.get('post_id')
-            post = PostModel.objects.get(id=post_id)
-            
-            # Check if like already exists
-            existing_like = LikeModel.objects.filter(post=post, user=user, user__is_active=True).first()
-            
-            if existing_like:
-                existing_like.delete()
+            post_id = int(request.data.get('post_id'))
+            # One Redis round trip; LikeModel is written behind by flush_like_buffer
+            liked = likes.toggle(post_id, user.id)
+            if liked is None:
+                return api_response(ErrorCode.POST_NOT_FOUND, request=request, message="Post not found", status_code=status.HTTP_404_NOT_FOUND)
+
+            if not liked:
                 return Response({
                     'message': 'Post unliked successfully',
                     'liked': False
                 }, status=status.HTTP_200_OK)
             else:
-                like = LikeModel.objects.create(post=post, user=user)
                 return Response({
                     'message': 'Post liked successfully',
                     'liked': True
@@ -391,20 +514,44 @@ class LikeToggleView(APIView):
             return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_400_BAD_REQUEST)
 
 
+class LikeStatusView(APIView):
+    """Which of up to 500 posts the current user has liked, in one query."""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=LikeStatusSerializer, responses={200: ApiResponseSerializer, 400: ApiResponseSerializer}, operation_id='like_status')
+    def post(self, request):
+        serializer = LikeStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return api_response(ErrorCode.VALIDATION_FAILED, request=request, data=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
+
+        post_ids = serializer.validated_data['post_ids']
+        liked = likes.liked_post_ids(request.user.id, post_ids)
+        return api_response(
+            ErrorCode.SUCCESS,
+            request=request,
+            data={'liked': {str(post_id): post_id in liked for post_id in post_ids}},
+            status_code=status.HTTP_200_OK
+        )
+
+
 class PostLikesView(APIView):
     permission_classes = [AllowAny]
 
-    @extend_schema(responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='post_likes_list')
+    @extend_schema(parameters=[*KEYSET_PARAMETERS, COUNT_PARAMETER], responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='post_likes_list')
     def get(self, request, post_id):
         try:
             post = PostModel.objects.get(id=post_id)
-            likes = LikeModel.objects.filter(
-                post=post, user__is_active=True).order_by('-created_at')
-            serializer = LikeSerializer(likes, many=True)
-            return Response({
+            likes = queries.likes(LikeModel.objects.filter(post=post, user__is_active=True))
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(likes, request)
+            serializer = LikeSerializer(page, many=True)
+            data = {
                 'likes': serializer.data,
-                'count': likes.count()
-            }, status=status.HTTP_200_OK)
+                'next': paginator.next_cursor
+            }
+            if paginator.wants_count(request):
+                data['count'] = post.likes_count
+            return Response(data, status=status.HTTP_200_OK)
         except PostModel.DoesNotExist:
             return api_response(ErrorCode.POST_NOT_FOUND, "Post not found", status_code=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -432,12 +579,13 @@ class CommentCreateView(APIView):
                 return api_response(ErrorCode.GENERIC_ERROR, "Comment text is required", status_code=status.HTTP_400_BAD_REQUEST)
             
             post = PostModel.objects.get(id=post_id)
-            comment = CommentModel.objects.create(
-                post=post,
-                author=user,
-                author__is_active=True,
-                text=text
-            )
+            with transaction.atomic():
+                comment = CommentModel.objects.create(
+                    post=post,
+                    author=user,
+                    text=text
+                )
+                PostModel.adjust_counter(post.id, 'comments_count', 1)
             serializer = CommentSerializer(comment)
             return Response({
                 'message': 'Comment created successfully',
@@ -452,16 +600,21 @@ class CommentCreateView(APIView):
 class PostCommentsView(APIView):
     permission_classes = [AllowAny]
 
-    @extend_schema(responses={200: CommentSerializer(many=True), 404: OpenApiTypes.OBJECT}, operation_id='post_comments_list')
+    @extend_schema(parameters=[*KEYSET_PARAMETERS, COUNT_PARAMETER], responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='post_comments_list')
     def get(self, request, post_id):
         try:
             post = PostModel.objects.get(id=post_id)
-            comments = CommentModel.objects.filter(post=post, author__is_active=True).order_by('-created_at')
-            serializer = CommentSerializer(comments, many=True)
-            return Response({
+            comments = queries.comments(CommentModel.objects.filter(post=post, author__is_active=True))
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(comments, request)
+            serializer = CommentSerializer(page, many=True)
+            data = {
                 'comments': serializer.data,
-                'count': comments.count()
-            }, status=status.HTTP_200_OK)
+                'next': paginator.next_cursor
+            }
+            if paginator.wants_count(request):
+                data['count'] = post.comments_count
+            return Response(data, status=status.HTTP_200_OK)
         except PostModel.DoesNotExist:
             return api_response(ErrorCode.POST_NOT_FOUND, "Post not found", status_code=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -483,7 +636,12 @@ class CommentDeleteView(APIView):
                 return Response({"error": "You don't have permission to delete this comment"}, 
                               status=status.HTTP_403_FORBIDDEN)
             
-            comment.delete()
+            with transaction.atomic():
+                deleted, _ = comment.delete()
+                # a concurrent delete may have removed the row since get()
+                if not deleted:
+                    raise CommentModel.DoesNotExist
+                PostModel.adjust_counter(comment.post_id, 'comments_count', -1)
             return Response({
                 'message': 'Comment deleted successfully'
             }, status=status.HTTP_200_OK)
@@ -519,13 +677,29 @@ class FollowToggleView(APIView):
             existing_follow = FollowModel.objects.filter(follower=follower, following=following).first()
             
             if existing_follow:
-                existing_follow.delete()
+                with transaction.atomic():
+                    deleted, _ = existing_follow.delete()
+                    # a concurrent unfollow may already have removed the row
+                    if deleted:
+                        UserModel.adjust_counter(follower.id, 'following_count', -1)
+                        UserModel.adjust_counter(following.id, 'followers_count', -1)
+                try:
+                    prune_home_timeline.delay(follower.id, following.id)
+                except Exception:
+                    pass
                 return Response({
                     'message': f'You unfollowed {following.username}',
                     'is_following': False
                 }, status=status.HTTP_200_OK)
             else:
-                FollowModel.objects.create(follower=follower, following=following)
+                with transaction.atomic():
+                    FollowModel.objects.create(follower=follower, following=following)
+                    UserModel.adjust_counter(follower.id, 'following_count', 1)
+                    UserModel.adjust_counter(following.id, 'followers_count', 1)
+                try:
+                    backfill_home_timeline.delay(follower.id, following.id)
+                except Exception:
+                    pass
                 return Response({
                     'message': f'You are now following {following.username}',
                     'is_following': True
@@ -539,17 +713,22 @@ class FollowToggleView(APIView):
 class UserFollowersView(APIView):
     permission_classes = [AllowAny]
 
-    @extend_schema(responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='user_followers')
+    @extend_schema(parameters=[*KEYSET_PARAMETERS, COUNT_PARAMETER], responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='user_followers')
     def get(self, request, user_id):
         try:
             user = UserModel.objects.get(id=user_id)
-            followers = FollowModel.objects.filter(following=user, follower__is_active=True)
-            serializer = FollowSerializer(followers, many=True)
-            return Response({
+            followers = queries.follows(FollowModel.objects.filter(following=user, follower__is_active=True))
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(followers, request)
+            serializer = FollowSerializer(page, many=True)
+            data = {
                 'user': user.username,
                 'followers': serializer.data,
-                'count': followers.count()
-            }, status=status.HTTP_200_OK)
+                'next': paginator.next_cursor
+            }
+            if paginator.wants_count(request):
+                data['count'] = user.followers_count
+            return Response(data, status=status.HTTP_200_OK)
         except UserModel.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -559,17 +738,22 @@ class UserFollowersView(APIView):
 class UserFollowingView(APIView):
     permission_classes = [AllowAny]
 
-    @extend_schema(responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='user_following')
+    @extend_schema(parameters=[*KEYSET_PARAMETERS, COUNT_PARAMETER], responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='user_following')
     def get(self, request, user_id):
         try:
             user = UserModel.objects.get(id=user_id)
-            following = FollowModel.objects.filter(follower=user, following__is_active=True)
-            serializer = FollowSerializer(following, many=True)
-            return Response({
+            following = queries.follows(FollowModel.objects.filter(follower=user, following__is_active=True))
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(following, request)
+            serializer = FollowSerializer(page, many=True)
+            data = {
                 'user': user.username,
                 'following': serializer.data,
-                'count': following.count()
-            }, status=status.HTTP_200_OK)
+                'next': paginator.next_cursor
+            }
+            if paginator.wants_count(request):
+                data['count'] = user.following_count
+            return Response(data, status=status.HTTP_200_OK)
         except UserModel.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -591,14 +775,14 @@ class MyPostsView(APIView):
             page = int(request.GET.get('page', 0))
             size = int(request.GET.get('size', 10))
             
-            posts = PostModel.objects.filter(author=user).order_by('-created_at')
+            posts = queries.posts(PostModel.objects.filter(author=user)).order_by('-created_at')
             
             # Paginate
             paginator = StandardResultsSetPagination()
             paginator.page_size = size
             paginated_posts = paginator.paginate_queryset(posts, request)
             
-            serializer = PostSerializer(paginated_posts, many=True)
+            serializer = PostSerializer(paginated_posts, many=True, context={'viewer': request.user})
             
             return Response({
                 'posts': serializer.data,
@@ -610,6 +794,31 @@ class MyPostsView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+# ==================== HOME FEED ====================
+
+class HomeFeedView(APIView):
+    """Posts from the people the current user follows (plus their own), newest first."""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=KEYSET_PARAMETERS,
+        responses={200: OpenApiTypes.OBJECT},
+        operation_id='home_feed',
+    )
+    def get(self, request):
+        try:
+            size = KeysetPagination().get_page_size(request)
+            posts, next_cursor, sources = timeline.read(request.user.id, size, request.query_params.get('cursor'))
+            serializer = PostSerializer(posts, many=True, context={'viewer': request.user})
+            return Response({
+                'posts': serializer.data,
+                'next': next_cursor,
+                'sources': sources
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_400_BAD_REQUEST)
+
+
 # ==================== GET LIKE COUNT ====================
 
 class GetLikeCountView(APIView):
@@ -618,8 +827,9 @@ class GetLikeCountView(APIView):
     @extend_schema(responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='get_like_count')
     def get(self, request, post_id):
         try:
-            post = PostModel.objects.get(id=post_id)
-            like_count = LikeModel.objects.filter(post=post, user__is_active=True).count()
+            like_count = likes.get_count(post_id)
+            if like_count is None:
+                return api_response(ErrorCode.POST_NOT_FOUND, request=request, message="Post not found", status_code=status.HTTP_404_NOT_FOUND)
             return Response({
                 'post_id': post_id,
                 'like_count': like_count
@@ -630,17 +840,27 @@ class GetLikeCountView(APIView):
             return api_response(ErrorCode.GENERIC_ERROR, str(e), status_code=status.HTTP_400_BAD_REQUEST)
         
 # ==================== UPLOAD PROFILE PHOTO ====================
-class UploadProfilePhotoView(APIView):
+class UploadProfilePhotoView(ImageUploadMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        self.check_image_uploads()
+        if request.data.get('upload_id'):
+            return self.post_upload(request, request.data['upload_id'])
+
         serializer = UploadPhotoSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         photo = serializer.validated_data["photo"]
 
-        # Upload to Supabase
-        photo_url = upload_image(photo, folder="profiles")
+        if storage.config('ASYNC_PROFILE_PHOTOS'):
+            return self.post_async(request, photo)
+
+        # Stream to Supabase
+        try:
+            photo_url = storage.upload_image(photo, folder="profiles")
+        except storage.StorageError as e:
+            return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_502_BAD_GATEWAY)
 
         # Save URL
         request.user.photo_url = photo_url
@@ -653,4 +873,141 @@ class UploadProfilePhotoView(APIView):
                 "photo_url": photo_url
             },
             status_code=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+    def post_upload(self, request, upload_id):
+        """Use a finished chunked upload (``api.uploads``); its file is already in storage."""
+        try:
+            name = uploads.attach(upload_id, request.user.id, 'profile')
+        except uploads.UploadError as e:
+            return api_response(e.error, request=request, message=str(e), status_code=e.status)
+
+        photo_url = storage.public_url(name)
+        request.user.photo_url = photo_url
+        request.user.save(update_fields=["photo_url"])
+        return api_response(ErrorCode.SUCCESS, request=request, data={"photo_url": photo_url}, status_code=status.HTTP_200_OK)
+
+    def post_async(self, request, photo):
+        """Accept the photo and let ``upload_profile_photo`` stream it from the spool."""
+        name = storage.content_name(photo, folder="profiles")
+        photo_url = storage.public_url(name)
+        previous_url = request.user.photo_url
+
+        # the URL is final, so it is saved now; it serves the photo once the upload lands
+        request.user.photo_url = photo_url
+        request.user.save(update_fields=["photo_url"])
+
+        try:
+            stored = storage.get_backend().exists(name)
+        except storage.StorageError:
+            stored = False
+        if stored:
+            # the same image was uploaded before: nothing to transfer
+            return api_response(ErrorCode.SUCCESS, request=request, data={"photo_url": photo_url}, status_code=status.HTTP_200_OK)
+
+        spool_path = storage.spool(photo, name)
+
+        try:
+            upload_profile_photo.delay(request.user.id, spool_path, name, photo.content_type, photo_url, previous_url)
+        except Exception as e:
+            logger.warning(f"Could not queue profile photo upload, uploading inline: {e}")
+            try:
+                storage.upload_spooled(spool_path, name, photo.content_type)
+            except storage.StorageError as e:
+                storage.discard_spooled(spool_path)
+                request.user.photo_url = previous_url
+                request.user.save(update_fields=["photo_url"])
+                return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_502_BAD_GATEWAY)
+            return api_response(ErrorCode.SUCCESS, request=request, data={"photo_url": photo_url}, status_code=status.HTTP_200_OK)
+
+        return api_response(
+            ErrorCode.SUCCESS,
+            request=request,
+            data={
+                "photo_url": photo_url,
+                "upload": "pending"
+            },
+            status_code=status.HTTP_202_ACCEPTED
+        )
+
+
+# ==================== CHUNKED UPLOADS ====================
+
+class UploadCreateView(APIView):
+    """Open a resumable upload session; the protocol is described in ``api/uploads.py``."""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=UploadSessionSerializer, responses={201: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT, 413: OpenApiTypes.OBJECT}, operation_id='upload_create')
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return api_response(ErrorCode.VALIDATION_FAILED, request=request, data=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
+        try:
+            session = uploads.create(request.user.id, **serializer.validated_data)
+        except uploads.UploadError as e:
+            return api_response(e.error, request=request, message=str(e), status_code=e.status)
+        return api_response(ErrorCode.SUCCESS, request=request, data=session, status_code=status.HTTP_201_CREATED)
+
+
+class UploadStatusView(APIView):
+    """Which chunks of an upload have arrived; a resuming client sends the ``missing`` ones."""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='upload_status')
+    def get(self, request, upload_id):
+        try:
+            session = uploads.get(upload_id, request.user.id)
+        except uploads.UploadError as e:
+            return api_response(e.error, request=request, message=str(e), status_code=e.status)
+        return api_response(ErrorCode.SUCCESS, request=request, data=uploads.status(session), status_code=status.HTTP_200_OK)
+
+
+class UploadChunkView(APIView):
+    """One chunk of an upload as the raw request body; sending a chunk again replaces it."""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request={'application/octet-stream': OpenApiTypes.BINARY}, responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT, 409: OpenApiTypes.OBJECT}, operation_id='upload_chunk')
+    def put(self, request, upload_id, index):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        try:
+            session = uploads.get(upload_id, request.user.id)
+            # the body is streamed to the spool, never read into request.data
+            uploads.write_chunk(session, index, request.stream, content_length)
+        except uploads.UploadError as e:
+            return api_response(e.error, request=request, message=str(e), status_code=e.status)
+        return api_response(ErrorCode.SUCCESS, request=request, data={"upload_id": upload_id, "index": index}, status_code=status.HTTP_200_OK)
+
+
+class UploadCompleteView(APIView):
+    """Assemble the chunks and store the file; attach it afterwards with ``upload_id``."""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=None, responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT, 409: OpenApiTypes.OBJECT, 502: OpenApiTypes.OBJECT}, operation_id='upload_complete')
+    def post(self, request, upload_id):
+        try:
+            session = uploads.complete(uploads.get(upload_id, request.user.id))
+        except uploads.UploadError as e:
+            return api_response(e.error, request=request, message=str(e), status_code=e.status)
+        except storage.StorageError as e:
+            # the chunks are kept: completing again retries the upload
+            return api_response(ErrorCode.GENERIC_ERROR, request=request, message=str(e), status_code=status.HTTP_502_BAD_GATEWAY)
+        return api_response(ErrorCode.SUCCESS, request=request, data=uploads.status(session), status_code=status.HTTP_200_OK)
+
+
+# ==================== REQUEST PROFILES ====================
+
+class ProfileDownloadView(APIView):
+    """A flame graph recorded for an ``X-Profile`` request, as a speedscope file."""
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}, operation_id='profile_download')
+    def get(self, request, profile_id):
+        document = flamegraph.load(profile_id)
+        if document is None:
+            return api_response(ErrorCode.PROFILE_NOT_FOUND, request=request, message="Profile not found or expired", status_code=status.HTTP_404_NOT_FOUND)
+        response = HttpResponse(document, content_type='application/json')
+        response['Content-Disposition'] = f'attachment; filename="{profile_id}.speedscope.json"'
+        return response
@@ -61,6 +61,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "api.middleware.RequestLogMiddleware",
+    "api.middleware.ProfilingMiddleware",
     
 ]
 
@@ -145,6 +146,10 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Keyset (cursor) pagination used by the feed and list endpoints
+KEYSET_PAGE_SIZE = 20
+KEYSET_MAX_PAGE_SIZE = 100
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -168,6 +173,43 @@ CACHES = {
     }
 }
 
+# In-process tier in front of the Redis cache (api/cache.py), used for the
+# token blacklist and authenticated user snapshots
+HOT_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'LOCAL_TTL': 30,
+    'NEGATIVE_TTL': 5,
+    'PUBSUB': True,
+}
+
+# Home timelines (api/timeline.py): capped Redis sorted sets, fan-out on write
+HOME_TIMELINE_MAX_LENGTH = 800
+HOME_TIMELINE_TTL = 7 * 24 * 3600
+HOME_TIMELINE_BACKFILL_SIZE = 50
+# Authors with this many followers are read-time "pull" authors instead
+HOME_TIMELINE_PULL_THRESHOLD = 10000
+
+# Prometheus metrics at /metrics (api/metrics.py). With several worker
+# processes, point METRICS_MULTIPROC_DIR at a shared, initially empty directory.
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Per-request SQL profiler (api/profiling.py), for staff users sending the header
+SQL_PROFILER = {
+    'HEADER': 'X-Profile-SQL',
+    'SLOW_QUERY_MS': 100,       # SELECTs at least this slow are logged with EXPLAIN
+    'SUMMARY_SIZE': 10,         # fingerprints listed in the per-request summary
+}
+
+# Flame graphs of single /api/ requests for staff (api/flamegraph.py)
+REQUEST_PROFILER = {
+    'HEADER': 'X-Profile',
+    'INTERVAL_MS': 1,           # stack sampling period
+    'MAX_SECONDS': 30,          # sampling stops after this long
+    'TTL': 3600,                # seconds a profile stays downloadable
+}
+
 # drf-spectacular settings (OpenAPI)
 SPECTACULAR_SETTINGS = {
     'TITLE': 'SM Backend API',
@@ -188,6 +230,13 @@ SPECTACULAR_SETTINGS = {
 }
 
 
+# Request-path logging only enqueues records (api/log_handlers.py); a
+# background thread writes them to the console and file sinks.
+LOG_QUEUE_MAXSIZE = int(os.environ.get('LOG_QUEUE_MAXSIZE', 10000))
+# Share of fast (< LOG_SLOW_REQUEST_MS), successful request lines to keep
+LOG_SUCCESS_SAMPLE_RATE = float(os.environ.get('LOG_SUCCESS_SAMPLE_RATE', 1.0))
+LOG_SLOW_REQUEST_MS = 500
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -203,6 +252,17 @@ LOGGING = {
             "format": "{levelname} {message}",
             "style": "{",
         },
+        "json": {
+            "()": "api.log_handlers.JSONFormatter",
+        },
+    },
+
+    "filters": {
+        "sample_success": {
+            "()": "api.log_handlers.SuccessSampler",
+            "rate": LOG_SUCCESS_SAMPLE_RATE,
+            "slow_ms": LOG_SLOW_REQUEST_MS,
+        },
     },
 
     "handlers": {
@@ -213,17 +273,23 @@ LOGGING = {
         "file": {
             "class": "logging.FileHandler",
             "filename": os.path.join(BASE_DIR, "backend.log"),
-            "formatter": "verbose",
+            "formatter": "json",
+        },
+        "queue": {
+            "()": "api.log_handlers.QueuedHandler",
+            "handlers": ["console", "file"],
+            "maxsize": LOG_QUEUE_MAXSIZE,
+            "filters": ["sample_success"],
         },
     },
 
     "loggers": {
         "django": {
-            "handlers": ["console", "file"],
+            "handlers": ["queue"],
             "level": "INFO",
         },
         "api": {
-            "handlers": ["console", "file"],
+            "handlers": ["queue"],
             "level": "INFO",
             "propagate": False,
         },
@@ -235,6 +301,21 @@ LOGGING = {
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
 
+# Like toggles are buffered in Redis and written to the database in batches
+# (api/likes.py); this is the maximum SQL lag
+LIKES_FLUSH_INTERVAL = 5.0
+
+CELERY_BEAT_SCHEDULE = {
+    'flush-like-buffer': {
+        'task': 'api.tasks.flush_like_buffer',
+        'schedule': LIKES_FLUSH_INTERVAL,
+    },
+    'purge-stale-uploads': {
+        'task': 'api.tasks.purge_stale_uploads',
+        'schedule': 3600,
+    },
+}
+
 # Email settings (example). Configure for your SMTP provider in production.
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.example.com')
@@ -247,6 +328,22 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'no-reply@example.com'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resized copies of post images, rendered by a Celery task (api/images.py)
+IMAGE_VARIANTS = {
+    'SIZES': {'thumb': 320, 'feed': 1080, 'full': 2048},   # longest edge in pixels
+    'WEBP_QUALITY': 80,
+    'JPEG_QUALITY': 85,
+}
+
+# Checks on uploaded images (api/validators.py), made on the header alone
+# before anything is decoded; they apply to profile photos, post images and
+# chunked uploads
+IMAGE_UPLOADS = {
+    'MAX_BYTES': 20 * 1024 * 1024,
+    'MAX_MEGAPIXELS': 40,
+    'FORMATS': ('JPEG', 'PNG', 'WEBP', 'GIF'),
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
@@ -254,3 +351,40 @@ SESSION_CACHE_ALIAS = "default"
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 SUPABASE_PUBLIC_BUCKET = os.getenv("SUPABASE_PUBLIC_BUCKET", "avatars")
+
+# Streaming uploads to Supabase Storage (api/storage.py)
+SUPABASE_STORAGE = {
+    'BUCKET': 'media',
+    'CHUNK_SIZE': 256 * 1024,       # bytes read from the upload per write
+    'TIMEOUT': 30,
+    'MAX_CONNECTIONS': 20,          # pooled connections per process
+    # accept profile photos into SPOOL_DIR and upload them from Celery;
+    # SPOOL_DIR must be shared with the workers
+    'ASYNC_PROFILE_PHOTOS': os.getenv("ASYNC_PROFILE_PHOTOS") == "1",
+    'SPOOL_DIR': os.getenv("UPLOAD_SPOOL_DIR", str(BASE_DIR / 'media' / 'upload-spool')),
+}
+
+# Where uploaded media lives (api/storage.py): api.storage.SupabaseBackend,
+# LocalBackend (MEDIA_ROOT) or InMemoryBackend. Names are content hashes.
+MEDIA_STORAGE = {
+    'BACKEND': os.getenv(
+        "MEDIA_STORAGE_BACKEND",
+        'api.storage.SupabaseBackend' if SUPABASE_URL else 'api.storage.LocalBackend',
+    ),
+    'OPTIONS': {},
+}
+
+STORAGES = {
+    # ImageField files go through the same backend
+    'default': {'BACKEND': 'api.storage.MediaStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Resumable chunked uploads (api/uploads.py); sessions live in Redis, chunks in
+# SPOOL_DIR, which must be shared by every web server
+UPLOADS = {
+    'CHUNK_SIZE': 4 * 1024 * 1024,
+    'MAX_SIZE': 50 * 1024 * 1024,
+    'TTL': 24 * 3600,               # seconds a session survives without a new chunk
+    'SPOOL_DIR': os.getenv("UPLOAD_CHUNK_DIR", str(BASE_DIR / 'media' / 'upload-chunks')),
+}